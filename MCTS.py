@@ -1,5 +1,11 @@
 import numpy as np
+import math
+import sys
+import time
+import threading
+from collections import deque
 from gameEnv import gameEnv
+from vecGameEnv import VecGameEnv
 from agent import Agent
 
 #### Parameters ######################################################
@@ -16,6 +22,9 @@ class Node:
     '''
         Implements Nodes for trees used in Monte Carlo Tree Search
     '''
+    #Nodes do not have a __dict__, which reduces the memory used by large trees
+    __slots__ = ('total_trials', 'player', 'reward', 'children', 'is_leaf', 'terminal_state', 'key', 'size', 'height', 'proven',
+                 'amaf_trials', 'amaf_reward', 'prior')
 
     def __init__(self):
         self.total_trials = 0   
@@ -24,45 +33,399 @@ class Node:
         self.children = dict()          #Stores edges as dictionary: key->action, value->node reached by the action
         self.is_leaf = True             #Boolean value to store if node is a leaf
         self.terminal_state = 0         #Terminal States: 0: Not a terminal state, 1: Terminal victory, -1: Stalemate
+        self.key = None                 #Key of the board of the node (only stored when transpositions are shared)
+        self.size = 1                   #Number of nodes in the subtree rooted at the node
+        self.height = 1                 #Depth of the subtree rooted at the node
+        self.proven = 0                 #Proven result for the player that moved into the node: 1: Win, -1: Loss, 0: Unknown
+        self.amaf_trials = 0            #All-moves-as-first statistics of the action that leads to the node (RAVE)
+        self.amaf_reward = 0
+        self.prior = 1.0                #Prior weight of the action that leads to the node (PUCT), normalized over the siblings
+
+#Estimated memory of a node, and of the entry of a child in the children dictionary of its parent
+NODE_BYTES = sys.getsizeof(Node())
+CHILD_BYTES = sys.getsizeof({a: None for a in range(1, 8)})/7
 
 class MCTS_agent(Agent):
     '''
         Contains implementation of Monte Carlo Tree Search algorithm to play the game Connect4
     '''
 
-    def __init__(self, player, playouts = 20, C = 1):
+    def __init__(self, player, playouts = 20, C = 1, use_symmetry = False, batch_size = 1, transpositions = False, max_table_size = 200000,
+                 time_budget = None, node_budget = None, ponder = False, max_nodes = None, solver = False,
+                 rollout_policy = 'random', rave = False, rave_k = 250, early_stop = False, stop_confidence = None,
+                 prior_agent = None, prior_scale = 100, prior_temperature = 0.25, prior_visits = 0, opening_book = None,
+                 ponder_nodes = 100000):
+        '''
+            Arguments:
+                player: player id of the agent
+                playouts: maximum number of playouts performed for every decision (None: no limit)
+                C: exploration parameter of UCB1
+                use_symmetry: if True, only one of two mirrored actions is expanded on symmetric boards
+                batch_size: number of leaves selected per iteration. If greater than 1, the random
+                            playouts of the leaves are simulated together on a VecGameEnv
+                transpositions: if True, nodes are shared between the move orders that reach the same board,
+                                the search tree becomes a directed acyclic graph
+                max_table_size: maximum number of nodes stored in the transposition table
+                time_budget: maximum time spent on every decision in milliseconds (None: no limit)
+                node_budget: maximum number of nodes created on every decision (None: no limit), 
+                             a playout that creates no node counts as one node
+                ponder: if True, the agent keeps searching in a background thread while the opponent is thinking
+                max_nodes: maximum number of nodes kept in the tree, the least visited subtrees are pruned 
+                           when the tree grows larger (None: no limit). With transpositions, a node shared by 
+                           several parents is counted once per parent, so the limit is approximate
+                solver: if True, proven wins and losses are propagated up the tree (MCTS-Solver), solved
+                        subtrees are not searched and the search stops when the root node is solved
+                rollout_policy: policy of the moves played during the simulations:
+                                'random': uniformly random moves
+                                'heavy': immediate wins, then blocks of the opponent's immediate wins, else random moves
+                                'centre': like 'heavy', but the other moves prefer the central columns
+                                The simulations of batch_size > 1 are always random
+                rave: if True, all-moves-as-first statistics of the playouts are blended into UCB1 (RAVE).
+                      Only used by the sequential playouts (batch_size = 1)
+                rave_k: equivalence parameter of RAVE, the AMAF value gets the weight sqrt(k/(3n+k)) 
+                        for a child with n trials
+                early_stop: if True, the search stops as soon as the most visited child of the root node cannot be
+                            overtaken by the runner-up within the remaining playouts (estimated from the playout
+                            rate when only a time budget is set). The chosen move is the same as with the full budget
+                stop_confidence: if not None (e.g. 0.95), the search also stops when the mean reward of the most visited
+                                 child is better than the one of the runner-up with this confidence (Hoeffding bounds).
+                                 This criterion can change the chosen move
+                prior_agent: agent whose get_action_value gives the prior values of the moves (e.g. a Q_learn_agent).
+                             If set, the children are selected with PUCT instead of UCB1, and the priors of the 
+                             children of the nodes where prior_agent.player is the player to move are the softmax 
+                             of the action values (uniform priors for the other nodes). It can not be combined with rave
+                prior_scale: action values are divided by prior_scale to lie in [-1, 1] (100 for the Q-tables)
+                prior_temperature: temperature of the softmax of the scaled action values
+                prior_visits: new children are seeded with prior_visits trials of their scaled action value
+                opening_book: OpeningBook (see opening_book.py). The statistics of the positions found in the book 
+                              are added to the children of the root node before the search
+                ponder_nodes: pondering stops when the tree reaches ponder_nodes nodes, so that the tree does not grow
+                              without limit while the opponent is thinking
+        '''
+        if rollout_policy not in ('random', 'heavy', 'centre'):
+            raise ValueError(f"Unknown rollout policy {rollout_policy}")
+        if rave and (prior_agent is not None):
+            #UCB1 selects with RAVE_UCB1 when rave is set, which has no prior term
+            raise ValueError("MCTS_agent can not use RAVE and PUCT priors together")
         super().__init__(player)
         self.playouts = playouts
         self.C = C 
+        self.use_symmetry = use_symmetry
+        self.batch_size = batch_size
+        self.vec_env = None                 #VecGameEnv used for batched simulations
+        self.transpositions = transpositions
+        self.max_table_size = max_table_size
+        self.transposition_table = {}       #Maps the key of a board to its node
+        self.time_budget = time_budget
+        self.node_budget = node_budget
+        self.deadline = None                #perf_counter time at which the current decision has to stop
+        self.node_limit = None              #Node budget of the current decision
+        self.nodes_created = 0              #Nodes created during the current decision
+        self.last_playouts = 0              #Playouts performed during the last decision
+        self.ponder = ponder
+        self.ponder_env = None              #Copy of the board of the root node, used by the pondering thread
+        self.ponder_thread = None
+        self.ponder_stop = threading.Event()
+        self.ponder_playouts = 0            #Playouts performed by the last pondering
+        self.ponder_nodes = ponder_nodes
+        self.ponder_rng = np.random.default_rng()   #Random number generator of the pondering thread
+        self.rng = np.random                #Random number generator of the search, ponder_rng while pondering
+        self.max_nodes = max_nodes
+        self.solver = solver
+        self.rollout_policy = rollout_policy
+        self.rave = rave
+        self.rave_k = rave_k
+        self.early_stop = early_stop
+        self.stop_confidence = stop_confidence
+        self.search_start = None            #perf_counter time at which the current decision started
+        self.playouts_saved = 0             #Playouts of the budget saved by early stopping during the last decision
+        self.prior_agent = prior_agent
+        self.prior_scale = prior_scale
+        self.prior_temperature = prior_temperature
+        self.prior_visits = prior_visits
+        self.opening_book = opening_book
+        self.book_root = None               #Last root node warm-started from the opening book
         self.root_node = Node()
         self.first_move = False             #Boolean value that stores if the first action has been performed
 
-    def get_next_action(self, game_env):
+    def get_next_action(self, game_env, time_budget = None, node_budget = None):
         '''
-            Performs Monte Carlo Tree Search and returns the next best action
+            Performs Monte Carlo Tree Search and returns the next best action.
+            The search stops as soon as one of the playout, time or node budgets is exhausted
             Arguments:
                 game_env -> game environment
+                time_budget -> time budget of this decision in milliseconds (overrides the agent's time_budget)
+                node_budget -> node budget of this decision (overrides the agent's node_budget)
             Returns:
                 next_move -> best move according to the agent
         '''
+        if time_budget is None:
+            time_budget = self.time_budget
+        if node_budget is None:
+            node_budget = self.node_budget
+        if (self.playouts is None) and (time_budget is None) and (node_budget is None):
+            raise ValueError("MCTS_agent needs a playout, time or node budget")
 
-        for p in range(self.playouts):
-            simulation_env = gameEnv(game_env)
-            top_node = self.root_node
+        self.stop_pondering()
+        self.search_start = time.perf_counter()
+        self.deadline = None if time_budget is None else self.search_start + time_budget/1000
+        self.node_limit = node_budget
+        self.nodes_created = 0
+        self.playouts_saved = 0
 
-            top_node,path = self.selection(top_node, simulation_env)
-            child = self.expand_node(top_node, path, simulation_env)
+        if self.opening_book is not None:
+            self.warm_start(game_env)
 
-            result = self.simulate(child, simulation_env)
-            self.backpropagate(path, result)
+        if self.batch_size > 1:
+            self.last_playouts = self.batched_playouts(game_env)
+        else:
+            playouts = 0
+            while not self.search_finished(playouts):
+                self.playout(game_env)
+                playouts += 1
+            self.last_playouts = playouts
 
         if not self.first_move:                     #If first move has not been performed, perform the first move
             self.first_move = True
 
+        if self.ponder:
+            self.ponder_env = type(game_env)(env_copy=game_env)
+
         next_move = self.next_best_move(self.root_node, game_env)
     
         return next_move
 
+    def warm_start(self, game_env):
+        '''
+            Adds the statistics of the opening book to the children of the root node (once per root node)
+            Arguments:
+                game_env -> game environment
+        '''
+        if self.book_root is self.root_node:
+            return
+        stats = self.opening_book.lookup(game_env)
+        if not stats:
+            return
+
+        node = self.root_node
+        self.book_root = node
+        if node.is_leaf and node.terminal_state==0:
+            self.add_children(node, game_env)
+            node.is_leaf = False
+            self.update_tree_counters([node])
+
+        for action,(visits, reward) in stats.items():
+            child = node.children.get(action)
+            if child is not None:
+                child.total_trials += visits
+                child.reward += reward
+                node.total_trials += visits
+        pass
+
+    def start_pondering(self):
+        '''
+            Starts searching from the current root node in a background thread, until stop_pondering is called
+        '''
+        self.ponder_stop.clear()
+        self.ponder_playouts = 0
+        #The pondering thread does not draw from the global NumPy random state, which the main thread keeps using
+        self.rng = self.ponder_rng
+        self.ponder_thread = threading.Thread(target=self.ponder_search, daemon=True)
+        self.ponder_thread.start()
+        pass
+
+    def ponder_search(self):
+        '''
+            Performs playouts on the board of the root node until the pondering is stopped, the tree reaches 
+            ponder_nodes nodes, the root node is solved or a playout adds no node to the tree
+        '''
+        while (not self.ponder_stop.is_set()) and (self.root_node.size < self.ponder_nodes) and (self.root_node.proven == 0):
+            expanded = self.playout(self.ponder_env)
+            self.ponder_playouts += 1
+            if not expanded:
+                break
+        pass
+
+    def stop_pondering(self):
+        '''
+            Stops the pondering thread (if running) and waits for its last playout to finish
+        '''
+        if self.ponder_thread is not None:
+            self.ponder_stop.set()
+            self.ponder_thread.join()
+            self.ponder_thread = None
+            self.rng = np.random
+        pass
+
+    def search_finished(self, playouts):
+        '''
+            Checks if one of the budgets of the current decision is exhausted
+            Arguments:
+                playouts: playouts performed so far during the decision
+            Returns:
+                finished: True if the search has to stop
+        '''
+        if (self.playouts is not None) and (playouts >= self.playouts):
+            return True
+        if self.root_node.proven != 0:
+            return True
+        if (self.node_limit is not None) and (self.nodes_created >= self.node_limit):
+            return True
+        if (self.deadline is not None) and (time.perf_counter() >= self.deadline):
+            return True
+        if (self.early_stop or self.stop_confidence is not None) and self.can_stop_early(playouts):
+            return True
+        return False
+
+    def can_stop_early(self, playouts):
+        '''
+            Checks if more playouts cannot change the most visited child of the root node, or (with stop_confidence)
+            if the most visited child is better than the runner-up with the required confidence.
+            When the search can stop, playouts_saved is set to the remaining playouts
+            Arguments:
+                playouts: playouts performed so far during the decision
+            Returns:
+                stop: True if the search can stop
+        '''
+        children = self.root_node.children
+        if len(children) < 2:
+            return False
+        first, second = sorted(children.values(), key=lambda child: child.total_trials, reverse=True)[:2]
+
+        #Remaining playouts of the playout budget, and estimated remaining playouts of the time budget
+        remaining = None
+        if self.playouts is not None:
+            remaining = self.playouts - playouts
+        if (self.deadline is not None) and (playouts > 0):
+            now = time.perf_counter()
+            estimate = int(playouts*(self.deadline - now)/(now - self.search_start)) + 1
+            remaining = estimate if remaining is None else min(remaining, estimate)
+        if remaining is None:
+            return False
+
+        stop = False
+        if self.early_stop and (first.total_trials - second.total_trials > remaining):
+            stop = True
+        elif (self.stop_confidence is not None) and (second.total_trials > 0):
+            #Hoeffding bounds of the mean rewards, which lie in [-1, 1]
+            bound = math.sqrt(2*math.log(2/(1-self.stop_confidence)))
+            lower = first.reward/first.total_trials - bound/math.sqrt(first.total_trials)
+            upper = second.reward/second.total_trials + bound/math.sqrt(second.total_trials)
+            stop = lower > upper
+
+        if stop:
+            self.playouts_saved = remaining
+        return stop
+
+    def playout(self, game_env):
+        '''
+            Performs a single playout (selection, expansion, simulation and backpropagation) from the root node.
+            The playout is performed in place on game_env, which is restored at the end
+            Arguments:
+                game_env -> game environment
+            Returns:
+                expanded -> False if the playout added no node to the tree
+        '''
+        start_moves = game_env.moves
+        nodes_created = self.nodes_created
+
+        top_node,path = self.selection(self.root_node, game_env)
+        child = self.expand_node(top_node, path, game_env)
+
+        #A playout that ends on a terminal or proven node adds no node, it counts as one node against the node budget, 
+        #so that the search ends when the tree of an endgame is fully expanded
+        expanded = self.nodes_created > nodes_created
+        if not expanded:
+            self.nodes_created += 1
+
+        result = self.simulate(child, game_env)
+        if self.rave:
+            self.update_amaf(path, game_env.move_stack[start_moves:], result)
+        self.backpropagate(path, result)
+        game_env.undo_until(start_moves)
+
+        self.limit_tree_size()
+        return expanded
+
+    def batched_playouts(self, game_env):
+        '''
+            Performs the playouts in batches: 'batch_size' leaves are selected using virtual losses so that 
+            the leaves differ, their random playouts are simulated together on a VecGameEnv and the 
+            results are backpropagated
+            Arguments:
+                game_env -> game environment
+            Returns:
+                playouts -> number of playouts performed
+        '''
+        start_moves = game_env.moves
+        if (self.vec_env is None) or (self.vec_env.h, self.vec_env.w, self.vec_env.win_streak) != (game_env.h, game_env.w, game_env.win_streak):
+            self.vec_env = VecGameEnv(self.batch_size, game_env.h, game_env.w, game_env.win_streak, auto_reset=False)
+
+        playouts = 0
+        while not self.search_finished(playouts):
+            batch = self.batch_size if self.playouts is None else min(self.batch_size, self.playouts - playouts)
+            paths = []
+            results = [0]*batch
+            rollout_ids = []            #Indices of the leaves that need a random playout
+
+            for i in range(batch):
+                nodes_created = self.nodes_created
+                top_node,path = self.selection(self.root_node, game_env)
+                child = self.expand_node(top_node, path, game_env)
+                if self.nodes_created == nodes_created:
+                    self.nodes_created += 1         #Same node budget accounting as playout
+
+                #Same results as simulate for the proven and terminal leaves, only the other leaves are rolled out
+                if not(child.proven == 0):
+                    results[i] = child.player*child.proven
+                elif (child.terminal_state == 0):
+                    self.vec_env.set_board(len(rollout_ids), game_env, self.get_player_val(child.player))
+                    rollout_ids.append(i)
+                else:
+                    results[i] = child.player*child.terminal_state
+
+                self.add_virtual_loss(path)
+                paths.append(path)
+                game_env.undo_until(start_moves)
+
+            if rollout_ids:
+                status, last_player = self.vec_env.random_rollout(np.arange(len(rollout_ids)))
+                for j,i in enumerate(rollout_ids):
+                    #Same convention as simulate: the value of the player that did not perform the last move
+                    player = -1 if last_player[j] == self.player else 1
+                    results[i] = player*int(status[j])
+
+            for path,result in zip(paths, results):
+                self.remove_virtual_loss(path)
+                self.backpropagate(path, result)
+            playouts += batch
+
+            self.limit_tree_size()
+        return playouts
+
+    def add_virtual_loss(self, path):
+        '''
+            Adds a virtual lost trial to the nodes of the path, so that the next selections of the batch
+            prefer other paths
+            Argument:
+                path: array containing the nodes visited
+        '''
+        for node in path:
+            node.total_trials += 1
+            node.reward -= 1
+        pass
+
+    def remove_virtual_loss(self, path):
+        '''
+            Removes the virtual lost trial added by add_virtual_loss
+            Argument:
+                path: array containing the nodes visited
+        '''
+        for node in path:
+            node.total_trials -= 1
+            node.reward += 1
+        pass
+
     def print_tree_details(self):
         '''
             Prints debugging details regarding the tree constructed
@@ -84,23 +447,158 @@ class MCTS_agent(Agent):
                 next_action: action that leads to child node with the best UCB value
                 next_node: child node with the best UCB value 
         '''
+        if self.rave:
+            return self.RAVE_UCB1(node)
+        if self.prior_agent is not None:
+            return self.PUCT(node)
+
         max_val = - np.inf
         next_node = None
         next_action = None
+        log_trials = math.log(node.total_trials) if node.total_trials > 0 else 0
 
         for action,child in node.children.items():
 
+            #Solved children are not searched anymore
+            if child.proven != 0:
+                continue
+
             if child.total_trials == 0:
                 return action,child
             
-            val = child.reward/child.total_trials + self.C* np.sqrt( np.log(node.total_trials)/ child.total_trials)
+            val = child.reward/child.total_trials + self.C* math.sqrt( log_trials/ child.total_trials)
             if(val > max_val):
                 max_val = val
                 next_node = child
                 next_action = action
+
+        if next_node is None:
+            #All the children are solved, but the node is not (a transposition solved through another parent)
+            next_action, next_node = max(node.children.items(), key=lambda item: item[1].proven)
         
         return next_action, next_node
 
+    def RAVE_UCB1(self, node):
+        '''
+            Returns the child node with the best UCB1 value, where the mean reward of a child is blended with 
+            its AMAF mean reward with the weight beta = sqrt(k/(3n+k)). Unvisited children are tried first, 
+            in the order of their AMAF values
+            Arguments:
+                node: parent node whose child has to be selected
+            Returns:
+                next_action: action that leads to child node with the best value
+                next_node: child node with the best value
+        '''
+        max_val = - np.inf
+        next_node = None
+        next_action = None
+        unvisited = False
+        log_trials = math.log(node.total_trials) if node.total_trials > 0 else 0
+
+        for action,child in node.children.items():
+            if child.proven != 0:
+                continue
+
+            amaf = child.amaf_reward/child.amaf_trials if child.amaf_trials > 0 else 0
+            if child.total_trials == 0:
+                if (not unvisited) or (amaf > max_val):
+                    unvisited = True
+                    max_val = amaf
+                    next_node = child
+                    next_action = action
+                continue
+            if unvisited:
+                continue
+
+            beta = math.sqrt(self.rave_k/(3*child.total_trials + self.rave_k))
+            val = (1-beta)*child.reward/child.total_trials + beta*amaf + self.C*math.sqrt(log_trials/child.total_trials)
+            if(val > max_val):
+                max_val = val
+                next_node = child
+                next_action = action
+
+        if next_node is None:
+            next_action, next_node = max(node.children.items(), key=lambda item: item[1].proven)
+
+        return next_action, next_node
+
+    def PUCT(self, node):
+        '''
+            Returns the child node with the best PUCT value Q + C*P*sqrt(N)/(1+n), where P is the normalized 
+            prior of the child, N the trials of the node and n the trials of the child (Q = 0 for unvisited children)
+            Arguments:
+                node: parent node whose child has to be selected
+            Returns:
+                next_action: action that leads to child node with the best value
+                next_node: child node with the best value
+        '''
+        max_val = - np.inf
+        next_node = None
+        next_action = None
+        total_prior = sum(child.prior for child in node.children.values())
+        exploration = self.C*math.sqrt(node.total_trials)/total_prior
+
+        for action,child in node.children.items():
+            if child.proven != 0:
+                continue
+
+            q = child.reward/child.total_trials if child.total_trials > 0 else 0
+            val = q + exploration*child.prior/(1 + child.total_trials)
+            if(val > max_val):
+                max_val = val
+                next_node = child
+                next_action = action
+
+        if next_node is None:
+            next_action, next_node = max(node.children.items(), key=lambda item: item[1].proven)
+
+        return next_action, next_node
+
+    def set_priors(self, node, env):
+        '''
+            Sets the priors of the children of a node that has just been expanded, from the action values 
+            of the prior agent. The other nodes keep uniform priors
+            Arguments:
+                node: expanded node, env is the board of the node
+                env: game environment
+        '''
+        if self.get_player_val(node.player) != self.prior_agent.player:
+            return
+
+        values = {a: max(-1, min(1, self.prior_agent.get_action_value(env, a)/self.prior_scale)) for a in node.children}
+        best = max(values.values())
+        weights = {a: math.exp((value-best)/self.prior_temperature) for a,value in values.items()}
+        total = sum(weights.values())
+        for a,child in node.children.items():
+            child.prior = weights[a]/total
+            if (self.prior_visits > 0) and (child.total_trials == 0):
+                #The reward of a child is from the point of view of the player to move at the node
+                child.total_trials = self.prior_visits
+                child.reward = self.prior_visits*values[a]
+        pass
+
+    def update_amaf(self, path, moves, result):
+        '''
+            Updates the all-moves-as-first statistics of the children of the nodes of the path: every action 
+            played later in the playout by the player to move at a node counts as a trial of the child of 
+            the node reached by that action
+            Arguments:
+                path: array containing the nodes visited
+                moves: actions performed during the playout, starting at the root node
+                result: final reward of the game
+        '''
+        for i,node in enumerate(path):
+            if not node.children:
+                break
+            #The player to move at the node performs the moves i, i+2, i+4...
+            for action in set(moves[i::2]):
+                child = node.children.get(action)
+                if child is not None:
+                    child.amaf_trials += 1
+                    if result==1 or result==-1:
+                        child.amaf_reward += result*child.player
+        pass
+
     def selection(self,node, env):
         '''
             Performs selection for MCTS algorithm using UCB based policy
@@ -113,7 +611,7 @@ class MCTS_agent(Agent):
         '''
         path = []
         path.append(node)
-        while (not node.is_leaf ) and (node.terminal_state==0):
+        while (not node.is_leaf ) and (node.terminal_state==0) and (node.proven==0):
             action, child = self.UCB1(node)
             path.append(child)
             child.terminal_state = env.make_move(action, self.get_player_val(node.player))
@@ -135,21 +633,199 @@ class MCTS_agent(Agent):
             Returns:
                 node: Random child of the leaf node after expansion 
         '''
-        if not(node.terminal_state==0):
+        if not(node.terminal_state==0) or not(node.proven==0):
             return node
 
-        action_space = env.get_action_space()
-        for a in action_space:
-            node.children[a] = Node()
-            node.children[a].player = -1*node.player
-
+        action_space = self.add_children(node, env)
         node.is_leaf = False
-        next_action = np.random.choice(action_space)
+        self.update_tree_counters(path)
+        if self.prior_agent is not None:
+            self.set_priors(node, env)
+
+        next_action = self.rng.choice(action_space)
         node = node.children[next_action]
         path.append(node)
         node.terminal_state = env.make_move(next_action, self.get_player_val(-1*node.player))
         return node
 
+    def add_children(self, node, env):
+        '''
+            Creates the children of a node
+            Arguments:
+                node: node whose children are created, env is the board of the node
+                env: Game environment
+            Returns:
+                action_space: actions of the children
+        '''
+        action_space = env.get_action_space()
+        if self.use_symmetry and env.is_symmetric():
+            #Mirrored actions lead to equivalent boards, only the left half of the board is explored
+            action_space = [a for a in action_space if a <= env.mirror_action(a)]
+        for a in action_space:
+            if self.transpositions:
+                node.children[a] = self.get_transposition(env.key_after(a, self.get_player_val(node.player)), -1*node.player)
+            else:
+                node.children[a] = Node()
+                node.children[a].player = -1*node.player
+                self.nodes_created += 1
+        return action_space
+
+    def update_tree_counters(self, path):
+        '''
+            Updates the size and height of the nodes of the path after its last node has been expanded.
+            With transpositions the tree is a directed acyclic graph: only the nodes of the path are updated,
+            the other parents of a shared node keep stale counts, and a shared node is counted once per parent,
+            so the counts are approximate (recount_tree makes them consistent again)
+            Argument:
+                path: array containing the nodes visited, the last one is the expanded node
+        '''
+        node = path[-1]
+        old_size = node.size
+        old_height = node.height
+        node.size = 1 + sum(child.size for child in node.children.values())
+        node.height = 1 + max(child.height for child in node.children.values())
+        size = node.size - old_size
+
+        for parent in reversed(path[:-1]):
+            parent.size += size
+            if node.height < old_height:
+                #The node replaced a deeper subtree (nodes expanded again after the first move)
+                old_height = parent.height
+                parent.height = 1 + max(child.height for child in parent.children.values())
+            else:
+                old_height = parent.height
+                parent.height = max(parent.height, node.height + 1)
+            node = parent
+        pass
+
+    def limit_tree_size(self):
+        '''
+            Prunes the tree to 3/4 of max_nodes nodes when it has more than max_nodes nodes. With transpositions, 
+            the size of the root node is recounted before pruning, since update_tree_counters leaves stale counts
+        '''
+        if (self.max_nodes is None) or (self.root_node.size <= self.max_nodes):
+            return
+        if self.transpositions:
+            self.recount_tree(self.root_node)
+            if self.root_node.size <= self.max_nodes:
+                return
+        self.prune_tree(3*self.max_nodes//4)
+        pass
+
+    def prune_tree(self, size):
+        '''
+            Collapses the least visited subtrees into leaves until the tree has at most 'size' nodes.
+            The collapsed nodes keep their statistics, and they are expanded again if they are selected
+            Arguments:
+                size: number of nodes kept in the tree
+        '''
+        root = self.root_node
+        parents = {id(root): None}
+        internal = []
+        queue = deque([root])
+        while queue:
+            node = queue.popleft()
+            for child in node.children.values():
+                if (id(child) not in parents) and child.children:
+                    parents[id(child)] = node
+                    internal.append(child)
+                    queue.append(child)
+
+        internal.sort(key=lambda node: node.total_trials)
+        for node in internal:
+            if root.size <= size:
+                break
+
+            #Nodes inside a subtree that has already been collapsed are skipped
+            ancestors = []
+            parent = parents[id(node)]
+            while (parent is not None) and not parent.is_leaf:
+                ancestors.append(parent)
+                parent = parents[id(parent)]
+            if parent is not None:
+                continue
+
+            pruned = node.size - 1
+            node.children = {}
+            node.is_leaf = True
+            for ancestor in ancestors:
+                ancestor.size -= pruned
+
+        self.recount_tree(root)
+        if self.transpositions:
+            #Removes the pruned nodes from the table
+            self.prune_transposition_table(self.max_table_size)
+        pass
+
+    def recount_tree(self, node, seen = None):
+        '''
+            Recomputes the size and height of all the nodes of the tree rooted at the input node
+            Argument:
+                node: Root node of the tree
+                seen: ids of the nodes already recounted (nodes shared by transpositions are recounted once)
+        '''
+        if seen is None:
+            seen = set()
+        seen.add(id(node))
+        node.size = 1
+        node.height = 1
+        for child in node.children.values():
+            if id(child) not in seen:
+                self.recount_tree(child, seen)
+            node.size += child.size
+            node.height = max(node.height, child.height + 1)
+        pass
+
+    def memory_usage(self):
+        '''
+            Estimates the memory used by the tree rooted at the root node in bytes, in constant time
+            Returns:
+                memory: estimated memory of the nodes and their children dictionaries
+        '''
+        return self.root_node.size*NODE_BYTES + (self.root_node.size - 1)*CHILD_BYTES
+
+    def get_transposition(self, key, player):
+        '''
+            Returns the node of a board from the transposition table, the node is created if the board has not been seen.
+            When the table is full, it is pruned down to half of its maximum size
+            Arguments:
+                key: key of the board
+                player: player of the node (1: player, -1: Adversary)
+            Returns:
+                node: node of the board
+        '''
+        node = self.transposition_table.get(key)
+        if node is not None:
+            return node
+
+        node = Node()
+        node.player = player
+        node.key = key
+        self.nodes_created += 1
+
+        if len(self.transposition_table) >= self.max_table_size:
+            self.prune_transposition_table(self.max_table_size//2)
+        self.transposition_table[key] = node
+        return node
+
+    def prune_transposition_table(self, size):
+        '''
+            Rebuilds the transposition table with the nodes reachable from the root node that are closest to it.
+            The nodes removed from the table stay in the tree, but they are not shared anymore
+            Arguments:
+                size: maximum number of nodes kept in the table
+        '''
+        table = {}
+        queue = deque([self.root_node])
+        while queue and len(table) < size:
+            node = queue.popleft()
+            for child in node.children.values():
+                if (child.key is not None) and (child.key not in table) and len(table) < size:
+                    table[child.key] = child
+                    queue.append(child)
+        self.transposition_table = table
+        pass
+
     def simulate(self,node,env):
         '''
             Performs the simulation algorithm by playing out the game on the input node by randomly sampling actions
@@ -160,6 +836,8 @@ class MCTS_agent(Agent):
             Returns:
                 reward: final reward from the game
         '''
+        if not(node.proven==0):
+            return node.player*node.proven
         if not(node.terminal_state==0):
             return node.player*node.terminal_state
 
@@ -167,19 +845,57 @@ class MCTS_agent(Agent):
         reward = node.terminal_state
         
         while reward==0:
-            next_action = np.random.choice(env.get_action_space())
+            if self.rollout_policy == 'random':
+                next_action = self.rng.choice(env.get_action_space())
+            else:
+                next_action = self.rollout_action(env, self.get_player_val(player))
             reward = env.make_move(next_action, self.get_player_val(player))
             player *=-1
 
         return player*reward
 
+    def rollout_action(self, env, player):
+        '''
+            Chooses the move of a heavy playout: an immediate win if there is one, else a block of an
+            immediate win of the opponent, else a random move (weighted towards the centre with the 'centre' policy)
+            Arguments:
+                env: game environment
+                player: player id of the player to move
+            Returns:
+                action: action to be performed
+        '''
+        actions = env.winning_moves(player)
+        if actions:
+            return actions[0]
+        actions = env.winning_moves(3-player)
+        if actions:
+            return actions[0]
+
+        action_space = env.get_action_space()
+        if self.rollout_policy == 'centre':
+            #Column a has weight min(a, w+1-a)
+            weights = [min(a, env.w+1-a) for a in action_space]
+            x = self.rng.random()*sum(weights)
+            for a,weight in zip(action_space, weights):
+                x -= weight
+                if x < 0:
+                    return a
+        return self.rng.choice(action_space)
+
     def backpropagate(self, path, result):
         '''
-            Backpropagates the reward over the tree path taken and updates all the nodes in the path
+            Backpropagates the reward over the tree path taken and updates all the nodes in the path.
+            With transpositions, the statistics are stored in the shared nodes: only the nodes of the path
+            taken are updated, and the other parents of a shared node see the new statistics through it.
+            With the solver, proven results are propagated: a node is a proven loss if one of its children 
+            is a proven win for the opponent, and a proven win if all its children are proven losses
             Argument:
                 path: array containing the nodes visited
                 result: final reward of the game
         '''
+        if self.solver:
+            self.propagate_proven(path)
+
         for node in reversed(path):
             if result==1:
                 if node.player==1:
@@ -194,6 +910,28 @@ class MCTS_agent(Agent):
             node.total_trials+=1
         pass
 
+    def propagate_proven(self, path):
+        '''
+            Marks the nodes of the path whose result is proven by the last node of the path
+            Argument:
+                path: array containing the nodes visited
+        '''
+        child = path[-1]
+        if child.terminal_state==1:
+            child.proven = 1
+
+        for node in reversed(path[:-1]):
+            if (child.proven==0) or not(node.proven==0):
+                break
+            if child.proven==1:
+                #The player to move at the node can win
+                node.proven = -1
+            elif all(c.proven==-1 for c in node.children.values()):
+                #All the moves of the player to move at the node lose
+                node.proven = 1
+            child = node
+        pass
+
     def next_best_move(self,node,game_env):
         '''
             Returns the next best action according to the MCTS algorithm after a single evaluation
@@ -201,30 +939,42 @@ class MCTS_agent(Agent):
                 node: root node from which action has to be chosen
                 game_env: Game Environment
             Return:
-                best_action: action that leads to the most visited child node (best action according to MCTS)
+                best_action: action that leads to the most visited child node (best action according to MCTS).
+                             Proven wins are always chosen and proven losses are avoided if possible
         '''
         best_action = None
-        moves = 0
+        moves = -1
         
         #If the node has no children, randomly sample an action from the action space
         if not node.children:
             return np.random.choice(game_env.get_action_space())
         
         for action,child in node.children.items():
+            if (child.terminal_state==1) or (child.proven==1):
+                return action
+            if (child.proven==-1):
+                continue
             if (moves < child.total_trials):
                 moves = child.total_trials
                 best_action = action
-            if (child.terminal_state==1):
-                return action
+
+        if best_action is None:
+            #All the moves are proven losses
+            best_action = max(node.children, key=lambda action: node.children[action].total_trials)
         
         return best_action
 
     def update_agent_state(self,action):
         '''
-            Updates the root node of the Monte Carlo Tree based on the action taken
+            Updates the root node of the Monte Carlo Tree based on the action taken.
+            When pondering, the child keeps the statistics accumulated while the opponent was thinking
             Arguments:
                 action: Action taken
         '''
+        self.stop_pondering()
+        if self.ponder_env is not None:
+            if self.ponder_env.make_move(action, self.get_player_val(self.root_node.player)) != 0:
+                self.ponder_env = None                  #Terminal state, nothing to ponder
 
         #If the root node does not have any children or has no child node associated with that action
         if not(self.root_node.children and (action in self.root_node.children)):
@@ -232,33 +982,32 @@ class MCTS_agent(Agent):
             return
 
         self.root_node = self.root_node.children[action]
+
+        #Ponder while the opponent has to move
+        if self.ponder and (self.ponder_env is not None) and (self.root_node.player == -1):
+            self.start_pondering()
         pass
 
     def size_of_tree(self,node):
         '''
-            Calculates the total size of the tree rooted at the input node
+            Returns the total size of the tree rooted at the input node, the size is updated 
+            incrementally during the search. With transpositions, a shared node is counted once per parent
             Argument:
                 node: Root node of the tree to be evaluated
             Returns:
                 total_size: Total number of nodes in the tree rooted at input node
         '''
-        total_size = 1
-        for child in node.children.values():
-            total_size+= self.size_of_tree(child)
-        return total_size 
+        return node.size
 
     def depth_of_tree(self,node):
         '''
-            Calculates the depth of tree
+            Returns the depth of tree, the depth is updated incrementally during the search
             Argument:
                 node: Root node from which depth is measured
             Returns:
                 depth: depth of the tree rooted at the input node 
         '''
-        depth = 1
-        for child in node.children.values():
-            depth = max(depth,self.depth_of_tree(child)+1)
-        return depth 
+        return node.height
 
     def get_player_val(self,player):
         '''
@@ -293,8 +1042,12 @@ class MCTS_agent(Agent):
         '''
             Resets the MCTS agent for a new game
         '''
+        self.stop_pondering()
+        self.ponder_env = None
+        self.book_root = None
         self.root_node = Node()
         self.first_move = False
+        self.transposition_table = {}
 
 if __name__=='__main__':
 
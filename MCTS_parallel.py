@@ -0,0 +1,370 @@
+import numpy as np
+import multiprocessing as mp
+import threading
+import time
+from gameEnv import gameEnv
+from MCTS import MCTS_agent, Node
+from agent import Agent
+
+def root_parallel_worker(conn, player, seed, agent_args, env_class, height, width, win_streak):
+    '''
+        Worker process of MCTS_root_parallel_agent. It keeps its own MCTS_agent and game environment
+        between decisions and answers the commands received on 'conn':
+            ('search', (key, player)): searches the board encoded by 'key' for 'player' and sends back the root statistics
+            ('update', action): updates the root of the agent with the action taken
+            ('reset', None): resets the agent for a new game
+            ('stop', None): stops the worker
+        Arguments:
+            conn: end of the pipe connected to the main process
+            player: player id of the agent
+            seed: seed of the random number generator of the worker
+            agent_args: dictionary of keyword arguments of the MCTS_agent
+            env_class: environment class on which the game is played
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+    '''
+    np.random.seed(seed)
+    agent = MCTS_agent(player, **agent_args)
+    game = env_class(height=height, width=width, win_streak=win_streak)
+
+    while True:
+        command, arg = conn.recv()
+        if command == 'search':
+            key, agent.player = arg
+            game.load_key(key)
+            agent.get_next_action(game)
+            stats = {action: (child.total_trials, child.reward, 1 if child.terminal_state==1 else child.proven) for action,child in agent.root_node.children.items()}
+            conn.send((stats, agent.last_playouts))
+        elif command == 'update':
+            agent.update_agent_state(arg)
+        elif command == 'reset':
+            agent.reset_agent()
+        elif command == 'stop':
+            break
+    conn.close()
+
+
+class MCTS_root_parallel_agent(Agent):
+    '''
+        Root-parallel Monte Carlo Tree Search: independent MCTS_agent searches of the same board run in
+        persistent worker processes with different seeds, and the move is chosen from the merged
+        visit and reward counts of the root children
+    '''
+
+    def __init__(self, player, workers = 4, seed = 0, **agent_args):
+        '''
+            Arguments:
+                player: player id of the agent
+                workers: number of worker processes
+                seed: seed of the first worker, worker i uses seed+i
+                agent_args: keyword arguments of the MCTS_agent of every worker (playouts, C, time_budget...)
+        '''
+        super().__init__(player)
+        self.workers = workers
+        self.seed = seed
+        self.agent_args = agent_args
+        self.processes = []
+        self.connections = []
+        self.root_stats = {}                #Merged statistics of the root children: action -> [trials, reward, proven]
+        self.last_playouts = 0              #Total playouts performed by the workers during the last decision
+
+    def start_workers(self, game_env):
+        '''
+            Starts the worker processes, they are kept alive until close is called
+            Arguments:
+                game_env: game environment, used to create the environments of the workers
+        '''
+        for i in range(self.workers):
+            parent_conn, child_conn = mp.Pipe()
+            process = mp.Process(target=root_parallel_worker, daemon=True,
+                                 args=(child_conn, self.player, self.seed+i, self.agent_args, type(game_env), game_env.h, game_env.w, game_env.win_streak))
+            process.start()
+            child_conn.close()
+            self.processes.append(process)
+            self.connections.append(parent_conn)
+        pass
+
+    def send_all(self, command, arg = None):
+        '''
+            Sends a command to all the workers
+        '''
+        for conn in self.connections:
+            conn.send((command, arg))
+        pass
+
+    def get_next_action(self, game_env):
+        '''
+            Runs the searches in the workers and returns the most visited action of the merged statistics
+            Arguments:
+                game_env -> game environment
+            Returns:
+                next_move -> best move according to the agent
+        '''
+        if not self.processes:
+            self.start_workers(game_env)
+
+        #Only the key of the board is sent to the workers
+        self.send_all('search', (game_env.key, self.player))
+
+        self.root_stats = {}
+        self.last_playouts = 0
+        for conn in self.connections:
+            stats, playouts = conn.recv()
+            self.last_playouts += playouts
+            for action, (trials, reward, proven) in stats.items():
+                merged = self.root_stats.setdefault(action, [0, 0, 0])
+                merged[0] += trials
+                merged[1] += reward
+                #A result proven by one of the workers holds for all of them
+                merged[2] = merged[2] or proven
+
+        if not self.root_stats:
+            return np.random.choice(game_env.get_action_space())
+
+        for action, (trials, reward, proven) in self.root_stats.items():
+            if proven == 1:
+                return action
+        #Proven losses are avoided if possible
+        return max(self.root_stats, key=lambda action: (self.root_stats[action][2] != -1, self.root_stats[action][0]))
+
+    def update_agent_state(self, action):
+        '''
+            Updates the root node of the trees of all the workers based on the action taken
+            Arguments:
+                action: Action taken
+        '''
+        self.send_all('update', action)
+        pass
+
+    def get_action_value(self, game_env, action):
+        '''
+            Gets the value of an action from the merged statistics of the last decision
+        '''
+        trials, reward, proven = self.root_stats.get(action, (0, 0, 0))
+        return reward/trials if trials > 0 else 0
+
+    def reset_agent(self):
+        '''
+            Resets the agents of all the workers for a new game
+        '''
+        self.send_all('reset')
+        pass
+
+    def close(self):
+        '''
+            Stops the worker processes
+        '''
+        self.send_all('stop')
+        for process in self.processes:
+            process.join()
+        self.processes = []
+        self.connections = []
+        pass
+
+
+class MCTS_threaded_agent(MCTS_agent):
+    '''
+        Tree-parallel Monte Carlo Tree Search: several threads perform playouts on one shared tree.
+        Every thread simulates on its own copy of the board with its own random number generator, 
+        virtual losses spread the threads over different paths, and the node statistics are updated 
+        under striped locks. The search is correct on regular CPython and scales on a free-threaded build
+    '''
+
+    def __init__(self, player, threads = 4, seed = 0, lock_stripes = 64, **agent_args):
+        '''
+            Arguments:
+                player: player id of the agent
+                threads: number of search threads
+                seed: seed of the first thread, thread i uses seed+i
+                lock_stripes: number of locks shared by the nodes (a node uses the lock id(node) % lock_stripes)
+                agent_args: keyword arguments of MCTS_agent (playouts, C, time_budget...). The threads expand plain nodes 
+                            and simulate random rollouts, the options that change the expansion, the simulation or 
+                            the selection are not supported
+        '''
+        super().__init__(player, **agent_args)
+
+        unsupported = {'use_symmetry': self.use_symmetry, 'batch_size': self.batch_size > 1, 'transpositions': self.transpositions,
+                       'ponder': self.ponder, 'rollout_policy': self.rollout_policy != 'random', 'rave': self.rave,
+                       'prior_agent': self.prior_agent is not None, 'opening_book': self.opening_book is not None}
+        options = [name for name, used in unsupported.items() if used]
+        if options:
+            raise ValueError(f"MCTS_threaded_agent does not support the options: {', '.join(options)}")
+        self.threads = threads
+        self.rngs = [np.random.default_rng(seed+i) for i in range(threads)]
+        self.locks = [threading.Lock() for i in range(lock_stripes)]
+        self.budget_lock = threading.Lock()         #Protects the playout and node counters
+        self.started_playouts = 0
+
+    def node_lock(self, node):
+        '''
+            Returns the lock that protects the statistics and the children of a node
+        '''
+        return self.locks[(id(node) >> 4) % len(self.locks)]
+
+    def get_next_action(self, game_env, time_budget = None, node_budget = None):
+        '''
+            Performs the Monte Carlo Tree Search with all the threads and returns the next best action
+            Arguments:
+                game_env -> game environment
+                time_budget -> time budget of this decision in milliseconds (overrides the agent's time_budget)
+                node_budget -> node budget of this decision (overrides the agent's node_budget)
+            Returns:
+                next_move -> best move according to the agent
+        '''
+        if time_budget is None:
+            time_budget = self.time_budget
+        if node_budget is None:
+            node_budget = self.node_budget
+        if (self.playouts is None) and (time_budget is None) and (node_budget is None):
+            raise ValueError("MCTS_agent needs a playout, time or node budget")
+
+        self.search_start = time.perf_counter()
+        self.deadline = None if time_budget is None else self.search_start + time_budget/1000
+        self.node_limit = node_budget
+        self.nodes_created = 0
+        self.playouts_saved = 0
+        self.started_playouts = 0
+
+        workers = []
+        for i in range(self.threads):
+            #Every thread simulates on its own copy of the board
+            env = type(game_env)(env_copy=game_env)
+            worker = threading.Thread(target=self.search_thread, args=(env, self.rngs[i]))
+            worker.start()
+            workers.append(worker)
+        for worker in workers:
+            worker.join()
+        self.last_playouts = self.started_playouts
+
+        #The tree is only pruned when no thread is searching it
+        self.limit_tree_size()
+
+        if not self.first_move:
+            self.first_move = True
+
+        return self.next_best_move(self.root_node, game_env)
+
+    def search_thread(self, env, rng):
+        '''
+            Performs playouts until one of the budgets of the decision is exhausted
+            Arguments:
+                env: game environment of the thread
+                rng: random number generator of the thread
+        '''
+        while True:
+            with self.budget_lock:
+                if self.search_finished(self.started_playouts):
+                    break
+                self.started_playouts += 1
+            self.threaded_playout(env, rng)
+        pass
+
+    def threaded_playout(self, env, rng):
+        '''
+            Performs a single playout on the shared tree. A virtual loss is added to every node of the path
+            during the selection, and it is replaced by the result of the simulation during the backpropagation
+            Arguments:
+                env: game environment of the thread
+                rng: random number generator of the thread
+        '''
+        start_moves = env.moves
+        node = self.root_node
+        path = [node]
+        self.add_virtual_loss_locked(node)
+
+        #Selection
+        while (not node.is_leaf) and (node.terminal_state==0) and (node.proven==0):
+            action, child = self.UCB1(node)
+            path.append(child)
+            self.add_virtual_loss_locked(child)
+            child.terminal_state = env.make_move(action, self.get_player_val(node.player))
+            node = child
+
+            #To limit the path to depth 4 during the first run
+            if (not self.first_move) and (len(path)==5):
+                break
+
+        #Expansion
+        expanded = False
+        if (node.terminal_state==0) and (node.proven==0):
+            with self.node_lock(node):
+                if node.is_leaf:
+                    expanded = True
+                    children = {}
+                    for a in env.get_action_space():
+                        children[a] = Node()
+                        children[a].player = -1*node.player
+                    #The children are published before the node stops being a leaf
+                    node.children = children
+                    node.is_leaf = False
+                    with self.budget_lock:
+                        self.nodes_created += len(children)
+                        self.update_tree_counters(path)
+                actions = list(node.children.keys())
+            next_action = actions[rng.integers(len(actions))]
+            node = node.children[next_action]
+            path.append(node)
+            self.add_virtual_loss_locked(node)
+            node.terminal_state = env.make_move(next_action, self.get_player_val(-1*node.player))
+
+        #A playout that creates no node counts as one node against the node budget (see MCTS_agent.playout)
+        if not expanded:
+            with self.budget_lock:
+                self.nodes_created += 1
+
+        #Simulation
+        if not(node.proven==0):
+            result = node.player*node.proven
+        elif not(node.terminal_state==0):
+            result = node.player*node.terminal_state
+        else:
+            player = node.player
+            reward = 0
+            while reward==0:
+                action_space = env.get_action_space()
+                reward = env.make_move(action_space[rng.integers(len(action_space))], self.get_player_val(player))
+                player *= -1
+            result = player*reward
+
+        #Backpropagation
+        if self.solver:
+            with self.budget_lock:
+                self.propagate_proven(path)
+        self.backpropagate_locked(path, result)
+        env.undo_until(start_moves)
+        pass
+
+    def add_virtual_loss_locked(self, node):
+        '''
+            Adds a virtual lost trial to a node, under the lock of the node
+        '''
+        with self.node_lock(node):
+            node.total_trials += 1
+            node.reward -= 1
+        pass
+
+    def backpropagate_locked(self, path, result):
+        '''
+            Backpropagates the reward over the tree path taken, every node is updated under its lock.
+            The virtual lost trial of the node becomes the real trial
+            Argument:
+                path: array containing the nodes visited
+                result: final reward of the game
+        '''
+        for node in reversed(path):
+            with self.node_lock(node):
+                node.reward += 1
+                if result==1 or result==-1:
+                    node.reward += result if node.player==1 else -result
+        pass
+
+
+if __name__=='__main__':
+
+    game = gameEnv(height=6, width=5, win_streak=4)
+    agent = MCTS_root_parallel_agent(player=1, workers=4, playouts=200, C=1)
+    action = agent.get_next_action(game)
+    print(f"Action selected {action} with {agent.last_playouts} playouts")
+    print({action: stats[:2] for action,stats in agent.root_stats.items()})
+    agent.close()
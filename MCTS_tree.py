@@ -0,0 +1,393 @@
+import numpy as np
+from MCTS import MCTS_agent
+
+class ArrayTree:
+    '''
+        Implements a Monte Carlo search tree stored as a structure of NumPy arrays.
+        Node i is described by the i-th entry of every array, and children[i][a-1] is the index
+        of the child reached by the action a (-1 if the child does not exist).
+        The arrays are preallocated and doubled in size when they are full.
+    '''
+
+    def __init__(self, width, capacity = 1024):
+        '''
+            Arguments:
+                width: Number of columns in the Connect 4 board (maximum number of children of a node)
+                capacity: Number of nodes that are preallocated
+        '''
+        self.w = width
+        self.size = 0                                                   #Number of nodes in the tree
+        self.total_trials = np.zeros(capacity, dtype=np.int64)
+        self.reward = np.zeros(capacity, dtype=np.float64)
+        self.player = np.zeros(capacity, dtype=np.int8)                 #1: player, -1: Adversary
+        self.terminal_state = np.zeros(capacity, dtype=np.int8)         #0: Not a terminal state, 1: Terminal victory, 2: Stalemate
+        self.is_leaf = np.ones(capacity, dtype=bool)
+        self.children = np.full((capacity, width), -1, dtype=np.int32)
+
+    def capacity(self):
+        '''
+            Returns the number of nodes that can be stored without growing the arrays
+        '''
+        return len(self.total_trials)
+
+    def grow(self):
+        '''
+            Doubles the capacity of the tree
+        '''
+        capacity = self.capacity()
+        self.total_trials = np.concatenate((self.total_trials, np.zeros(capacity, dtype=np.int64)))
+        self.reward = np.concatenate((self.reward, np.zeros(capacity, dtype=np.float64)))
+        self.player = np.concatenate((self.player, np.zeros(capacity, dtype=np.int8)))
+        self.terminal_state = np.concatenate((self.terminal_state, np.zeros(capacity, dtype=np.int8)))
+        self.is_leaf = np.concatenate((self.is_leaf, np.ones(capacity, dtype=bool)))
+        self.children = np.concatenate((self.children, np.full((capacity, self.w), -1, dtype=np.int32)))
+
+    def new_node(self, player):
+        '''
+            Allocates a new leaf node
+            Arguments:
+                player: player of the node (1: player, -1: Adversary)
+            Returns:
+                node: index of the new node
+        '''
+        if self.size == self.capacity():
+            self.grow()
+        node = self.size
+        self.size += 1
+        self.player[node] = player
+        return node
+
+    def reset_node(self, node, player):
+        '''
+            Resets the statistics and the children of a node, so that it can be reused as a new leaf node
+            Arguments:
+                node: index of the node
+                player: player of the node (1: player, -1: Adversary)
+        '''
+        self.total_trials[node] = 0
+        self.reward[node] = 0
+        self.player[node] = player
+        self.terminal_state[node] = 0
+        self.is_leaf[node] = True
+        self.children[node] = -1
+
+    def clear(self):
+        '''
+            Removes all the nodes of the tree, the memory is kept for the next nodes
+        '''
+        self.total_trials[:self.size] = 0
+        self.reward[:self.size] = 0
+        self.player[:self.size] = 0
+        self.terminal_state[:self.size] = 0
+        self.is_leaf[:self.size] = True
+        self.children[:self.size] = -1
+        self.size = 0
+
+    def compact(self, root):
+        '''
+            Moves the subtree rooted at a node to the first indices of the arrays and frees all the other nodes.
+            The nodes keep their breadth-first order, so the new root node is 0
+            Arguments:
+                root: index of the root node of the subtree that is kept
+        '''
+        order = [np.array([root])]
+        while len(order[-1]):
+            children = self.children[order[-1]]
+            order.append(children[children >= 0])
+        order = np.concatenate(order)
+        n = len(order)
+
+        #Old index -> new index of the kept nodes
+        index = np.full(self.size, -1, dtype=np.int32)
+        index[order] = np.arange(n, dtype=np.int32)
+        children = self.children[order]
+        children = np.where(children >= 0, index[children], -1)
+
+        self.total_trials[:n] = self.total_trials[order]
+        self.reward[:n] = self.reward[order]
+        self.player[:n] = self.player[order]
+        self.terminal_state[:n] = self.terminal_state[order]
+        self.is_leaf[:n] = self.is_leaf[order]
+        self.children[:n] = children
+
+        self.total_trials[n:self.size] = 0
+        self.reward[n:self.size] = 0
+        self.player[n:self.size] = 0
+        self.terminal_state[n:self.size] = 0
+        self.is_leaf[n:self.size] = True
+        self.children[n:self.size] = -1
+        self.size = n
+        pass
+
+    def nbytes(self):
+        '''
+            Returns the memory used by the arrays of the tree in bytes
+        '''
+        return (self.total_trials.nbytes + self.reward.nbytes + self.player.nbytes + self.terminal_state.nbytes
+                + self.is_leaf.nbytes + self.children.nbytes)
+
+    def UCB1(self, node, C):
+        '''
+            Returns the child node with the best UCB1 value, computed over all the children at once
+            Arguments:
+                node: index of the parent node
+                C: exploration parameter
+            Returns:
+                next_action: action that leads to child node with the best UCB value
+                next_node: index of the child node with the best UCB value
+        '''
+        actions = np.flatnonzero(self.children[node] >= 0)
+        children = self.children[node, actions]
+        trials = self.total_trials[children]
+
+        unvisited = np.flatnonzero(trials == 0)
+        if len(unvisited):
+            return actions[unvisited[0]]+1, children[unvisited[0]]
+
+        val = self.reward[children]/trials + C*np.sqrt(np.log(self.total_trials[node])/trials)
+        best = np.argmax(val)
+        return actions[best]+1, children[best]
+
+
+class MCTS_array_agent(MCTS_agent):
+    '''
+        Monte Carlo Tree Search agent that stores its tree in an ArrayTree instead of Node objects.
+        Only the playout budget of MCTS_agent is supported
+    '''
+
+    def __init__(self, player, playouts = 20, C = 1, capacity = 1024):
+        '''
+            Arguments:
+                player: player id of the agent
+                playouts: number of playouts performed for every decision
+                C: exploration parameter of UCB1
+                capacity: Number of nodes that are preallocated in the tree
+        '''
+        if playouts is None:
+            raise ValueError("MCTS_array_agent needs a playout budget")
+        super().__init__(player, playouts, C)
+        self.tree = None
+        self.capacity = capacity
+        self.root_node = 0
+
+    def get_next_action(self, game_env):
+        '''
+            Performs Monte Carlo Tree Search and returns the next best action
+            Arguments:
+                game_env -> game environment
+            Returns:
+                next_move -> best move according to the agent
+        '''
+        if self.tree is None:
+            self.tree = ArrayTree(game_env.w, self.capacity)
+            self.root_node = self.tree.new_node(1)
+
+        start_moves = game_env.moves
+        for p in range(self.playouts):
+            top_node,path = self.selection(self.root_node, game_env)
+            child = self.expand_node(top_node, path, game_env)
+
+            result = self.simulate(child, game_env)
+            self.backpropagate(path, result)
+            game_env.undo_until(start_moves)
+
+        if not self.first_move:
+            self.first_move = True
+
+        return self.next_best_move(self.root_node, game_env)
+
+    def print_tree_details(self):
+        '''
+            Prints debugging details regarding the tree constructed
+        '''
+        tree = self.tree
+        print(f"Total Size of the tree is: {self.size_of_tree(self.root_node)}")
+        print(f"Total depth of the tree is: {self.depth_of_tree(self.root_node)}")
+        print(f"Average rewards for each future action")
+        for a in range(tree.w):
+            child = tree.children[self.root_node, a]
+            if child >= 0:
+                print(f"{a+1}: {tree.reward[child]}/{tree.total_trials[child]}", end = "\t")
+        print()
+        pass
+
+    def selection(self, node, env):
+        '''
+            Performs selection for MCTS algorithm using UCB based policy
+            Arguments:
+                node: index of the node from which the selection process starts
+                env: environment over which game is played
+            Returns:
+                node: leaf node selected by the selection algorithm
+                path: Array containing the indices of all the nodes in the tree path taken
+        '''
+        tree = self.tree
+        path = [node]
+        while (not tree.is_leaf[node]) and (tree.terminal_state[node]==0):
+            action, child = tree.UCB1(node, self.C)
+            path.append(child)
+            tree.terminal_state[child] = env.make_move(action, self.get_player_val(tree.player[node]))
+            node = child
+
+            #To limit the path to depth 4 during the first run
+            if (not self.first_move) and (len(path)==5):
+                break
+
+        return node,path
+
+    def expand_node(self, node, path, env):
+        '''
+            Expands the input leaf node and selects a random child of it to perform the playout on
+            Arguments:
+                node: index of the leaf node that is expanded
+                path: tree path taken by the MCTS algo
+                env: Game environment
+            Returns:
+                node: Random child of the leaf node after expansion
+        '''
+        tree = self.tree
+        if not(tree.terminal_state[node]==0):
+            return node
+
+        action_space = env.get_action_space()
+        player = -1*tree.player[node]
+        for a in action_space:
+            child = tree.children[node, a-1]
+            if child < 0:
+                tree.children[node, a-1] = tree.new_node(player)
+            else:
+                #Nodes at the depth limit of the first move are expanded again, like MCTS_agent 
+                #the children are replaced by new nodes, the old ones are reused
+                tree.reset_node(child, player)
+
+        tree.is_leaf[node] = False
+        next_action = np.random.choice(action_space)
+        node = tree.children[node, next_action-1]
+        path.append(node)
+        tree.terminal_state[node] = env.make_move(next_action, self.get_player_val(-1*player))
+        return node
+
+    def simulate(self, node, env):
+        '''
+            Performs the simulation algorithm by playing out the game on the input node by randomly sampling actions
+            from the action space until it reaches a terminal state
+            Arguments:
+                node: index of the leaf node on which simulation is performed
+                env: game environment
+            Returns:
+                reward: final reward from the game
+        '''
+        tree = self.tree
+        player = int(tree.player[node])
+        reward = int(tree.terminal_state[node])
+        if not(reward==0):
+            return player*reward
+
+        while reward==0:
+            next_action = np.random.choice(env.get_action_space())
+            reward = env.make_move(next_action, self.get_player_val(player))
+            player *=-1
+
+        return player*reward
+
+    def backpropagate(self, path, result):
+        '''
+            Backpropagates the reward over the tree path taken and updates all the nodes in the path
+            Argument:
+                path: array containing the indices of the nodes visited
+                result: final reward of the game
+        '''
+        tree = self.tree
+        path = np.array(path)
+        tree.total_trials[path] += 1
+        if result==1 or result==-1:
+            #Nodes of the player get +result, nodes of the adversary get -result
+            tree.reward[path] += result*tree.player[path]
+        pass
+
+    def next_best_move(self, node, game_env):
+        '''
+            Returns the next best action according to the MCTS algorithm after a single evaluation
+            Argument:
+                node: index of the root node from which action has to be chosen
+                game_env: Game Environment
+            Return:
+                best_action: action that leads to the most visited child node (best action according to MCTS)
+        '''
+        tree = self.tree
+        actions = np.flatnonzero(tree.children[node] >= 0)
+
+        #If the node has no children, randomly sample an action from the action space
+        if len(actions)==0:
+            return np.random.choice(game_env.get_action_space())
+
+        children = tree.children[node, actions]
+        winning = np.flatnonzero(tree.terminal_state[children]==1)
+        if len(winning):
+            return actions[winning[0]]+1
+
+        return actions[np.argmax(tree.total_trials[children])]+1
+
+    def update_agent_state(self, action):
+        '''
+            Updates the root node of the Monte Carlo Tree based on the action taken.
+            The subtree of the new root node is compacted, the nodes outside of it are freed
+            Arguments:
+                action: Action taken
+        '''
+        if self.tree is None:
+            return
+
+        child = self.tree.children[self.root_node, action-1]
+        if child < 0:
+            self.tree.clear()
+            self.root_node = self.tree.new_node(1)
+            return
+
+        self.tree.compact(child)
+        self.root_node = 0
+        pass
+
+    def size_of_tree(self, node):
+        '''
+            Calculates the total size of the tree rooted at the input node
+        '''
+        children = self.tree.children[node]
+        return 1 + sum(self.size_of_tree(child) for child in children[children >= 0])
+
+    def depth_of_tree(self, node):
+        '''
+            Calculates the depth of tree rooted at the input node
+        '''
+        children = self.tree.children[node]
+        return 1 + max((self.depth_of_tree(child) for child in children[children >= 0]), default=0)
+
+    def get_action_value(self, game_env, action):
+        '''
+            Gets the value associated with the input action over the game
+            Arguments:
+                game_env: Game environment
+                action: Action to be evaluated
+            Returns:
+                value: Value associated with the input action
+        '''
+        tree = self.tree
+        value = 0
+        if (tree is None) or not (1 <= action <= tree.children.shape[1]):
+            return value
+
+        #-1 marks an action that has not been expanded or is not valid
+        child = tree.children[self.root_node, action-1]
+        if (child >= 0) and (tree.total_trials[child] > 0):
+            value = tree.reward[child] / tree.total_trials[child]
+
+        return value
+
+    def reset_agent(self):
+        '''
+            Resets the MCTS agent for a new game
+        '''
+        if self.tree is not None:
+            self.tree.clear()
+            self.root_node = self.tree.new_node(1)
+        self.first_move = False
@@ -1,10 +1,12 @@
 from os import stat
 import numpy as np
-from gameEnv import gameEnv
+from gameEnv import gameEnv, grid_key, mirror_key
 import gzip
 import json
+import re
 from MCTS import MCTS_agent
 from agent import Agent
+from Q_table import MmapQTable, write_Q_table_file, check_board_size
 import os
 
 #### Parameters ##################################################
@@ -14,18 +16,98 @@ TERMINAL_STATE_REWARD = 100
 STALEMATE_REWARD = -50
 TRANSIENT_STATE_REWARD = 0
 
+#Directory of the saved Q-tables
+Q_TABLE_DIR = "Q_learn_dat"
+
 ##################################################################
 
+def legacy_key_to_key(legacy_key):
+    '''
+        Converts a key generated by the old gameEnv.generate_string (every row of the grid repeated
+        'width' times) into the exact integer key used by the current Q-tables (gameEnv.key)
+        Arguments:
+            legacy_key: string key of the old Q-tables
+        Returns:
+            key: integer key of the same board
+    '''
+    rows = re.findall(r'\[([^\]]*)\]', legacy_key)
+    width = len(rows[0].split())
+    grid = np.array([[int(cell) for cell in row.split()] for row in rows[::width]], dtype=int)
+    return grid_key(grid)
+
+def convert_legacy_Q_table(filename, new_filename):
+    '''
+        Re-keys a Q-table file saved with the old string keys to the integer keys, 
+        both files are in the directory Q_learn_dat
+        Arguments:
+            filename: file name of the old compressed Q-table
+            new_filename: file name of the converted compressed Q-table
+    '''
+    agent = Q_learn_agent(player=2)
+    agent.load_Q_table(filename)            #Legacy keys are converted while loading
+    agent.save_Q_table(new_filename)
+    return agent.get_Q_table_size()
+
+def convert_Q_table_to_binary(filename, new_filename):
+    '''
+        Converts a .gzip compressed Q-table file (with integer or legacy string keys) to the binary
+        format that is memory-mapped by load_Q_table, both files are in the directory Q_learn_dat
+        Arguments:
+            filename: file name of the compressed Q-table
+            new_filename: file name of the binary Q-table, ending with '.bin'
+        Returns:
+            size: number of entries of the Q-table
+    '''
+    agent = Q_learn_agent(player=2)
+    agent.load_Q_table(filename)
+    write_Q_table_file(os.path.join(Q_TABLE_DIR, new_filename), agent.Q_table)
+    return agent.get_Q_table_size()
+
 class Q_learn_agent(Agent):
     '''
         Implements an agent that uses Q-Learning Reinforcement Learning Algorithm to 
         learn to play the Connect4 game
     '''
 
-    def __init__(self, player, initial_Q_value=0):
+    def __init__(self, player, initial_Q_value=0, symmetric=False, Q_table_class=dict, frozen=False):
+        '''
+            Arguments:
+                player: player id of the agent
+                initial_Q_value: Q-value of the after-states seen for the first time
+                symmetric: if True, a board and its left-right reflection share the same Q-value
+                           (the Q-table is keyed by gameEnv.canonical_key)
+                Q_table_class: class of the Q-table, dict or HashQTable (compact NumPy hash table with float32 Q-values,
+                               limited to boards with (height+1)*width <= 64)
+                frozen: if True, the agent is in inference mode: the Q-table is never modified 
+                        and unseen after-states are not inserted (see freeze)
+        '''
         super().__init__(player)
-        self.Q_table = {}
+        self.Q_table_class = Q_table_class
+        self.Q_table = Q_table_class()
         self.initial_Q_value = initial_Q_value
+        self.symmetric = symmetric
+        self.frozen = frozen
+        self.lookup_hits = 0                #After-states looked up that were in the Q-table
+        self.lookup_misses = 0              #After-states looked up that were not in the Q-table
+
+    def get_key(self, state):
+        '''
+            Returns the key used to store the Q-value of the after-state 'state' in the Q-table
+        '''
+        if self.symmetric:
+            return state.canonical_key()
+        return state.key
+
+    def check_board(self, state):
+        '''
+            Checks that the keys of the board fit in the Q-table, the NumPy Q-tables (HashQTable, MmapQTable) 
+            store 64-bit keys. Raises a ValueError otherwise
+            Arguments:
+                state: board whose after-states are looked up
+        '''
+        if not isinstance(self.Q_table, dict):
+            check_board_size(state.h, state.w)
+        pass
 
     def get_Qvalue(self, state, action, player):
         '''
@@ -41,9 +123,8 @@ class Q_learn_agent(Agent):
                 Q_value: Q(state,action) value of the state
         '''
 
-        temp_game = gameEnv(env_copy=state)       #Perform the action
-        temp_game.make_move(action, player)
-        return self.get_Qvalue_afterstate(temp_game)
+        with state.try_move(action, player):         #Perform the action in place, it is undone on exit
+            return self.get_Qvalue_afterstate(state)
     
     def get_Qvalue_afterstate(self,state):
         '''
@@ -54,17 +135,70 @@ class Q_learn_agent(Agent):
                 Q_value: Q_value of the afterstate 
         '''
 
-        #Generate the key used to store the Q-value in the Q-value lookup dictionary
-        key = state.generate_string()       
+        self.check_board(state)
+        #Key used to store the Q-value in the Q-value lookup dictionary
+        key = self.get_key(state)
 
-        if (key in self.Q_table):
-            return self.Q_table[key]
+        Q_value = self.Q_table.get(key)
+        if Q_value is not None:
+            self.lookup_hits += 1
+            return Q_value
         else:         
             #If after-state is not present in the dictionary/ seen for the first time by the agent
-            self.Q_table[key] = self.initial_Q_value
+            self.lookup_misses += 1
+            if not self.frozen:
+                self.Q_table[key] = self.initial_Q_value
             
             return self.initial_Q_value
     
+    def get_afterstate_Qvalues(self, state, player):
+        '''
+            Gets the Q-values of the after-states of all the valid actions with one vectorized lookup
+            when the Q-table supports it (HashQTable, MmapQTable). The keys are computed from the key of
+            the board without performing the moves. As in get_Qvalue_afterstate, the unseen after-states
+            are inserted with the initial Q-value unless the agent is frozen
+            Arguments:
+                state: state parameter
+                player: player id that performs the actions
+            Returns:
+                actions: tuple containing the valid actions
+                Q_values: NumPy array of the Q-values of the after-states, in the order of the actions
+        '''
+        self.check_board(state)
+        actions, keys = state.afterstate_keys(player, self.symmetric)
+
+        #Missing after-states are marked with NaN
+        if hasattr(self.Q_table, 'get_many'):
+            Q_values = self.Q_table.get_many(np.array(keys, dtype=np.uint64), default=np.nan).astype(float)
+        else:
+            Q_values = np.array([self.Q_table.get(key, np.nan) for key in keys], dtype=float)
+
+        missing = np.isnan(Q_values)
+        misses = int(np.count_nonzero(missing))
+        self.lookup_hits += len(keys) - misses
+        self.lookup_misses += misses
+        if misses:
+            Q_values[missing] = self.initial_Q_value
+            if not self.frozen:
+                for i in np.flatnonzero(missing):
+                    self.Q_table[keys[i]] = self.initial_Q_value
+
+        return actions, Q_values
+
+    def get_best_action(self, state, player):
+        '''
+            Gets the action with the highest Q-value, ties are broken towards the leftmost column
+            Arguments:
+                state: state parameter
+                player: player id that performs the action
+            Returns:
+                best_action: action with the highest Q-value
+                best_q_val: Q-value of the best action
+        '''
+        actions, Q_values = self.get_afterstate_Qvalues(state, player)
+        i = int(np.argmax(Q_values))            #First maximum, the actions are in increasing order
+        return actions[i], Q_values[i]
+
     def set_Qvalue(self,state, action, player, value):
         '''
             Sets the Q(s,a) value in the Q-table dictionary
@@ -75,50 +209,130 @@ class Q_learn_agent(Agent):
                 value: Q(s,a) value to be set
         '''
 
-        temp_game = gameEnv(env_copy=state)
-        temp_game.make_move(action,player)
-        key = temp_game.generate_string()
+        if self.frozen:
+            raise ValueError("The Q-table of a frozen Q_learn_agent can not be modified")
+
+        with state.try_move(action, player):
+            key = self.get_key(state)
 
         self.Q_table[key] = value
         pass
+
+    def freeze(self, filename = None):
+        '''
+            Switches the agent to the inference mode, in which the Q-table is never modified.
+            If a file name is given, the Q-table is saved in the binary format and memory-mapped read-only,
+            so that the processes that load the same file share its pages instead of copying the table.
+            The file is replaced atomically (see write_Q_table_file), the processes that map it keep reading the old table
+            Arguments:
+                filename: file name of the binary Q-table ('.bin') in the directory Q_learn_dat
+        '''
+        if filename is not None:
+            self.save_Q_table(filename)
+            self.load_Q_table(filename)
+        self.frozen = True
+        pass
+
+    def get_lookup_stats(self):
+        '''
+            Returns the number of after-states found and not found in the Q-table since the last reset_lookup_stats
+            Returns:
+                hits: after-states looked up that were in the Q-table
+                misses: after-states looked up that were not in the Q-table
+        '''
+        return self.lookup_hits, self.lookup_misses
+
+    def reset_lookup_stats(self):
+        '''
+            Resets the lookup hit and miss counters
+        '''
+        self.lookup_hits = 0
+        self.lookup_misses = 0
+        pass
     
     def save_Q_table(self, file_name):
         '''
-            Saves the Q-table dictionary in a .gzip compressed file
-            in the directory Q_learn_dat
+            Saves the Q-table in the directory Q_learn_dat, in a .gzip compressed JSON file
+            or, if the file name ends with '.bin', in a binary file that load_Q_table memory-maps.
+            Both are written to a temporary file that replaces the previous file, which stays intact if the save fails
             Arguments:
                 file_name: file_name of the compressed file
         '''
         
-        curr_path = os.getcwd()
-        os.chdir(os.path.join(curr_path,"Q_learn_dat",""))
-
-        with gzip.open(file_name,'w') as fout:
-            fout.write(json.dumps(self.Q_table).encode('utf-8'))
-        
-        os.chdir(curr_path)
+        path = os.path.join(Q_TABLE_DIR, file_name)
+
+        if file_name.endswith('.bin'):
+            write_Q_table_file(path, self.Q_table)
+        else:
+            temp_path = f"{path}.{os.getpid()}.tmp"
+            with gzip.open(temp_path,'w') as fout:
+                fout.write(json.dumps(dict(self.Q_table.items())).encode('utf-8'))
+            os.replace(temp_path, path)
         pass
 
 
     def load_Q_table(self, filename):
         '''
-            Decompresses and loads the Q-table from a .gzip compressed file
-            in the directory Q_learn_dat
+            Loads the Q-table from a file in the directory Q_learn_dat. Binary '.bin' files are memory-mapped
+            (MmapQTable, the entries are read lazily), .gzip compressed JSON files are decompressed and parsed, 
+            and tables saved with the old string keys are re-keyed
             Arguments:
                 filename: file name of the compressed file
         '''
         
-        curr_path = os.getcwd()
-        os.chdir(os.path.join(curr_path,"Q_learn_dat",""))
+        path = os.path.join(Q_TABLE_DIR, filename)
 
-        with gzip.open(filename,'r') as fin:
-            self.Q_table = json.loads(fin.read().decode('utf-8'))
+        if filename.endswith('.bin'):
+            self.Q_table = MmapQTable(path)
+            return
+
+        with gzip.open(path,'r') as fin:
+            Q_table = json.loads(fin.read().decode('utf-8'))
         
-        os.chdir(curr_path)
+        #JSON stores the integer keys as strings, tables saved before the integer keys use the grid strings as keys
+        self.Q_table = {}
+        for key, value in Q_table.items():
+            if key.startswith('['):
+                self.Q_table[legacy_key_to_key(key)] = value
+            else:
+                self.Q_table[int(key)] = value
+        self.Q_table = self.make_Q_table(self.Q_table)
 
         pass
 
     
+    def canonicalize_Q_table(self, height, width):
+        '''
+            Re-keys the Q-table by the canonical keys of the boards and switches the agent to the symmetric mode.
+            If both a board and its reflection are present in the table, their Q-values are averaged
+            Arguments:
+                height: Number of rows of the board the Q-table was trained on
+                width: Number of columns of the board the Q-table was trained on
+        '''
+        Q_table = {}
+        for key, value in self.Q_table.items():
+            canonical_key = min(key, mirror_key(key, height, width))
+            if canonical_key in Q_table:
+                Q_table[canonical_key] = (Q_table[canonical_key] + value)/2
+            else:
+                Q_table[canonical_key] = value
+        
+        self.Q_table = self.make_Q_table(Q_table)
+        self.symmetric = True
+        pass
+
+    def make_Q_table(self, Q_table):
+        '''
+            Converts a dictionary Q-table to the Q-table class of the agent
+            Arguments:
+                Q_table: dictionary key -> Q-value
+            Returns:
+                Q_table: Q-table of the class of the agent
+        '''
+        if self.Q_table_class is dict:
+            return Q_table
+        return self.Q_table_class.from_dict(Q_table)
+
     def get_reward(self,state, player):
         '''
             Gets the reward associated with the state of the game
@@ -163,6 +377,8 @@ class Q_learn_agent(Agent):
                 total_losses: total losses by the agent
                 total_stalemates: total stalemates by the agent
         '''
+        if self.frozen:
+            raise ValueError("A frozen Q_learn_agent can not be trained")
 
         wins = 0
         stalemates = 0 
@@ -192,20 +408,13 @@ class Q_learn_agent(Agent):
                 if (np.random.random() < greedy_prob):
                     move1 = np.random.choice(action_space)
                 else:
-                    best_action = None
-                    best_q_val = - np.inf
-                    for a in action_space:
-                        q_val = self.get_Qvalue(game,a,2)
-                        if(q_val > best_q_val):
-                            best_q_val = q_val
-                            best_action = a
-                    move1 = best_action
+                    move1 = self.get_best_action(game, 2)[0]
                 
                 #Q_learn agent performing move 1
                 state1 = game.make_move(move1,2)
                 agent.update_agent_state(move1)            #Agent updating it's state
                 move1_reward = self.get_reward(state1,1)
-                key = game.generate_string()
+                key = self.get_key(game)
                 old_q_value = self.get_Qvalue_afterstate(game)
 
                 #External agent performing move2
@@ -228,11 +437,7 @@ class Q_learn_agent(Agent):
                 best_q_val = - np.inf
 
                 if (state2==0):
-                    action_space = game.get_action_space()
-                    for a in action_space:
-                        q_val = self.get_Qvalue(game,a,2)
-                        if( q_val > best_q_val):
-                            best_q_val = q_val
+                    best_q_val = self.get_best_action(game, 2)[1]
                 else:
                     best_q_val = 0
                     if(state2==1):
@@ -271,6 +476,92 @@ class Q_learn_agent(Agent):
 
 
 
+    def generate_episode(self, agent = None, game = None, greedy_prob=0.1):
+        '''
+            Plays one training game against an adversary with the e-greedy policy of train, without updating the Q-table.
+            The transitions are returned so that the Q-learning updates can be applied by another process (see update_Qvalue)
+            Arguments:
+                agent: adversary Agent object, it plays first as player 1
+                game: game environment in which the game is played (it is reset at the end of the episode)
+                greedy_prob: Q_learn parameter (Probability with which the agent chooses a random move)
+            Returns:
+                transitions: list of (key, reward, next_keys) tuples, with the key of the after-state of every move
+                             of the agent, the total reward until the next move of the agent, and the keys of the
+                             after-states of the next move (empty if the game ended)
+                outcome: 1 if the agent won, -1 if it lost, 0 for a stalemate
+        '''
+        transitions = []
+
+        #External Agent makes the first move
+        move1 = agent.get_next_action(game)
+        game.make_move(move1,1)
+        agent.update_agent_state(move1)
+
+        while True:
+
+            state2 = -1
+
+            #Action selection using e-greedy policy
+            action_space = game.get_action_space()
+            if (np.random.random() < greedy_prob):
+                move1 = np.random.choice(action_space)
+            else:
+                move1 = self.get_best_action(game, 2)[0]
+
+            #Q_learn agent performing move 1
+            state1 = game.make_move(move1,2)
+            agent.update_agent_state(move1)
+            key = self.get_key(game)
+            total_reward = self.get_reward(state1,1)
+
+            #External agent performing move2
+            if (state1==0):
+                move2 = agent.get_next_action(game)
+                state2 = game.make_move(move2,1)
+                total_reward += self.get_reward(state2,-1)
+                agent.update_agent_state(move2)
+
+            next_keys = []
+            if (state2==0):
+                next_keys = game.afterstate_keys(2, self.symmetric)[1]
+            transitions.append((key, total_reward, next_keys))
+
+            if (not (state1 == 0)) or (not (state2 ==0)):
+                break
+
+        if (state1==1):
+            outcome = 1
+        elif (state2==1):
+            outcome = -1
+        else:
+            outcome = 0
+
+        #Reset agents
+        game.reset_game()
+        agent.reset_agent()
+
+        return transitions, outcome
+
+    def update_Qvalue(self, key, reward, next_keys, alpha = 0.1, gamma = 0.99):
+        '''
+            Applies the Q-learning update of one transition generated by generate_episode
+            Arguments:
+                key: key of the after-state of the move of the agent
+                reward: total reward until the next move of the agent
+                next_keys: keys of the after-states of the next move (empty if the game ended)
+                alpha: Q_learn parameter (Learning rate of the agent)
+                gamma: Q_learn parameter (Discount rate of rewards)
+        '''
+        if self.frozen:
+            raise ValueError("The Q-table of a frozen Q_learn_agent can not be modified")
+
+        old_q_value = self.Q_table.get(key, self.initial_Q_value)
+        best_q_val = 0
+        if next_keys:
+            best_q_val = max(self.Q_table.get(k, self.initial_Q_value) for k in next_keys)
+        self.Q_table[key] = old_q_value + alpha*(reward + gamma*best_q_val - old_q_value)
+        pass
+
     def test(self, epoch=100, agent = None, game = None, verbose=False):
         '''
             Function to evaluate the agent by playing greedingly according to the Q-values
@@ -288,40 +579,47 @@ class Q_learn_agent(Agent):
         losses = 0
         total_plays = 0
         stalemates = 0
-        
-        for e in range(epoch):
 
-            game.reset_game()
-            agent.reset_agent()
+        #The evaluation games do not grow the Q-table, the agent is unfrozen again even if a game fails
+        frozen = self.frozen
+        self.frozen = True
+        self.reset_lookup_stats()
+        try:
+            for e in range(epoch):
 
-            player_turn = 1
-            total_plays+=1
+                game.reset_game()
+                agent.reset_agent()
 
-            while True:
+                player_turn = 1
+                total_plays+=1
+
+                while True:
                 
-                if (player_turn==1):
-                    move = agent.get_next_action(game)
-                else:
-                    move = self.get_next_action(game)
+                    if (player_turn==1):
+                        move = agent.get_next_action(game)
+                    else:
+                        move = self.get_next_action(game)
                 
-                state = game.make_move(move,player_turn)
-                agent.update_agent_state(move)
-
-                if not(state == 0):
-                    if (state == 1):
-                        if (player_turn==1):
-                            losses+=1
+                    state = game.make_move(move,player_turn)
+                    agent.update_agent_state(move)
+
+                    if not(state == 0):
+                        if (state == 1):
+                            if (player_turn==1):
+                                losses+=1
+                            else:
+                                wins+=1
                         else:
-                            wins+=1
-                    else:
-                        stalemates+=1
-                    break
+                            stalemates+=1
+                        break
 
-                player_turn = 2 - (player_turn+1)%2
-            
+                    player_turn = 2 - (player_turn+1)%2
+        finally:
+            self.frozen = frozen
         
         if verbose:
             print(f"Test run: Wins: {wins}/{total_plays}\t losses: {losses}/{total_plays}\t Stalemates: {stalemates}/{total_plays}")
+            print(f"Q-table lookups: {self.lookup_hits} hits, {self.lookup_misses} misses")
         
         return wins,losses,stalemates
 
@@ -333,7 +631,9 @@ class Q_learn_agent(Agent):
             Returns:
                 value: Value of the (state,action)
         '''
-        value = self.get_Qvalue(game_env,action,self.player)
+        #The Q-table is not modified, unseen after-states get the initial Q-value
+        with game_env.try_move(action, self.player):
+            value = self.Q_table.get(self.get_key(game_env), self.initial_Q_value)
         return value
 
 
@@ -346,16 +646,7 @@ class Q_learn_agent(Agent):
                 best_action: best action according to the Q algorithm
         '''
 
-        action_space = game_env.get_action_space()
-        best_q_val = -np.inf
-        best_action = None
-        for a in action_space:
-            q_val = self.get_Qvalue(game_env,a,self.player)
-            if (q_val > best_q_val):
-                best_q_val = q_val
-                best_action = a
-        
-        return best_action
+        return self.get_best_action(game_env, self.player)[0]
 
 
 if __name__=='__main__':
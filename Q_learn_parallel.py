@@ -0,0 +1,156 @@
+'''
+    Parallel actor/learner training of the Q-learn agent on one machine.
+
+    Actor processes play episodes against MCTS_agent adversaries with a read-only, memory-mapped snapshot
+    of the Q-table (Q_table.MmapQTable) and send the transitions of every episode to the learner. The learner
+    (the process that calls train_parallel) applies the Q-learning updates to its Q-table, publishes a new
+    snapshot every 'sync_episodes' episodes and saves a checkpoint every 'checkpoint_episodes' episodes.
+
+    The snapshots and the checkpoints are written to a temporary file that replaces the previous file with os.replace
+    (see write_Q_table_file and Q_learn_agent.save_Q_table), so the actors never read a partially written table and
+    an interrupted checkpoint leaves the previous one intact. A shared version counter tells the actors to reopen the snapshot.
+'''
+
+import numpy as np
+import multiprocessing as mp
+import queue
+import os
+import time
+from gameEnv import gameEnv
+from MCTS import MCTS_agent
+from Q_learn import Q_learn_agent, Q_TABLE_DIR
+from Q_table import MmapQTable, write_Q_table_file
+
+def actor_worker(seed, snapshot_file, version, transitions, stop, height, width, win_streak,
+                 n_min, n_max, batch_episodes, greedy_prob, symmetric, initial_Q_value):
+    '''
+        Actor process of train_parallel. It plays episodes with a frozen Q_learn_agent that reads the latest
+        snapshot of the Q-table, and puts (transitions, outcome) of every episode in the 'transitions' queue
+        Arguments:
+            seed: seed of the random number generator of the actor
+            snapshot_file: path of the snapshot file of the Q-table
+            version: shared counter, incremented by the learner every time the snapshot file is replaced
+            transitions: queue of the episodes sent to the learner
+            stop: event set by the learner when the training is over
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+            n_min: minimum number of playouts of the MCTS adversary
+            n_max: maximum number of playouts of the MCTS adversary
+            batch_episodes: episodes played against the same MCTS adversary
+            greedy_prob: Q_learn parameter (Probability with which the agent chooses a random move)
+            symmetric: if True, a board and its left-right reflection share the same Q-value
+            initial_Q_value: Q-value of the after-states that are not in the Q-table
+    '''
+    np.random.seed(seed)
+    Q_agent = Q_learn_agent(player=2, initial_Q_value=initial_Q_value, symmetric=symmetric, frozen=True)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    snapshot_version = -1
+
+    while not stop.is_set():
+        n = np.random.randint(n_min, n_max+1)
+        MCTS_player = MCTS_agent(playouts=n, player=1, C=1)
+
+        for e in range(batch_episodes):
+            #The snapshot is reopened when the learner has published a new one
+            if version.value != snapshot_version:
+                snapshot_version = version.value
+                Q_agent.Q_table = MmapQTable(snapshot_file)
+
+            episode = Q_agent.generate_episode(agent=MCTS_player, game=game, greedy_prob=greedy_prob)
+            while not stop.is_set():
+                try:
+                    transitions.put(episode, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            if stop.is_set():
+                break
+    pass
+
+
+def train_parallel(Q_agent, episodes, actors = 4, height = 4, width = 5, win_streak = 4, n_min = 0, n_max = 25,
+                   batch_episodes = 10, alpha = 0.1, gamma = 0.99, greedy_prob = 0.1, sync_episodes = 100,
+                   checkpoint_episodes = 1000, checkpoint_file = None, seed = 0, verbose = False):
+    '''
+        Trains a Q-learn agent with parallel actor processes, the calling process is the learner
+        Arguments:
+            Q_agent: Q_learn_agent trained by the learner (player 2)
+            episodes: number of training episodes
+            actors: number of actor processes
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+            n_min: minimum number of playouts of the MCTS adversaries
+            n_max: maximum number of playouts of the MCTS adversaries
+            batch_episodes: episodes played by an actor against the same MCTS adversary
+            alpha: Q_learn parameter (Learning rate of the agent)
+            gamma: Q_learn parameter (Discount rate of rewards)
+            greedy_prob: Q_learn parameter (Probability with which the agent chooses a random move)
+            sync_episodes: the snapshot read by the actors is replaced every sync_episodes episodes
+            checkpoint_episodes: the Q-table is saved every checkpoint_episodes episodes
+            checkpoint_file: file name of the checkpoints in the directory Q_learn_dat, None to disable them
+            seed: seed of the first actor, actor i uses seed+i
+            verbose: if True, prints the progress at every checkpoint
+        Returns:
+            outcomes: outcome of every episode in the order they were learnt (1 win, -1 loss, 0 stalemate)
+            episodes_per_hour: training episodes per hour
+    '''
+    snapshot_file = os.path.join(Q_TABLE_DIR, f"snapshot_{os.getpid()}.bin")
+    write_Q_table_file(snapshot_file, Q_agent.Q_table)
+
+    version = mp.Value('i', 0)
+    transitions = mp.Queue(maxsize=4*actors)
+    stop = mp.Event()
+    processes = []
+    for i in range(actors):
+        process = mp.Process(target=actor_worker, daemon=True,
+                             args=(seed+i, snapshot_file, version, transitions, stop, height, width, win_streak,
+                                   n_min, n_max, batch_episodes, greedy_prob, Q_agent.symmetric, Q_agent.initial_Q_value))
+        process.start()
+        processes.append(process)
+
+    outcomes = []
+    start = time.perf_counter()
+    while len(outcomes) < episodes:
+        episode, outcome = transitions.get()
+        for key, reward, next_keys in episode:
+            Q_agent.update_Qvalue(key, reward, next_keys, alpha, gamma)
+        outcomes.append(outcome)
+
+        if (len(outcomes) % sync_episodes == 0):
+            write_Q_table_file(snapshot_file, Q_agent.Q_table)
+            with version.get_lock():
+                version.value += 1
+
+        if (checkpoint_file is not None) and (len(outcomes) % checkpoint_episodes == 0):
+            Q_agent.save_Q_table(checkpoint_file)
+            if verbose:
+                last = np.array(outcomes[-checkpoint_episodes:])
+                print(f"Episode {len(outcomes)}: Wins: {np.sum(last==1)}\t Losses: {np.sum(last==-1)}\t Stalemates: {np.sum(last==0)}\t Q_table size: {Q_agent.get_Q_table_size()}")
+    episodes_per_hour = len(outcomes)/(time.perf_counter() - start)*3600
+
+    #The actors blocked on the full queue are released before they are joined
+    stop.set()
+    while any(process.is_alive() for process in processes):
+        try:
+            transitions.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    for process in processes:
+        process.join()
+    os.remove(snapshot_file)
+
+    if checkpoint_file is not None:
+        Q_agent.save_Q_table(checkpoint_file)
+
+    return outcomes, episodes_per_hour
+
+
+if __name__=='__main__':
+
+    Q_agent = Q_learn_agent(player=2, initial_Q_value=0)
+    outcomes, episodes_per_hour = train_parallel(Q_agent, episodes=400, actors=4, sync_episodes=50)
+    outcomes = np.array(outcomes)
+    print(f"{len(outcomes)} episodes ({episodes_per_hour:.0f} episodes/hour): Wins: {np.sum(outcomes==1)}\t Losses: {np.sum(outcomes==-1)}\t Stalemates: {np.sum(outcomes==0)}")
+    print(f"Size of Q-table {Q_agent.get_Q_table_size()}")
@@ -5,6 +5,8 @@
 from gameEnv import gameEnv
 from MCTS import MCTS_agent
 from Q_learn import Q_learn_agent
+from Q_table import HashQTable
+from Q_learn_parallel import train_parallel
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -23,6 +25,9 @@ n_min_test = 0
 n_max_test = 25
 batch_epochs = 10
 load_file = True
+symmetric = False           #If True, mirrored boards share their Q-values
+compact_Q_table = False     #If True, the Q-table is stored in a HashQTable instead of a dictionary
+parallel_actors = 0         #If > 0, the episodes are played by parallel actor processes (see Q_learn_parallel.py)
 
 #########################################################
 
@@ -34,38 +39,54 @@ if __name__=='__main__':
     stalemates_arr = []
     
     
-    Q_agent = Q_learn_agent(player=2, initial_Q_value=0)
+    Q_agent = Q_learn_agent(player=2, initial_Q_value=0, symmetric=symmetric, Q_table_class=HashQTable if compact_Q_table else dict)
     game = gameEnv(height=board_rows, width=board_cols, win_streak=4)
     if (load_file):
         Q_agent.load_Q_table(gzip_file_name)
+        if (symmetric):
+            Q_agent.canonicalize_Q_table(board_rows, board_cols)
     
 
     wins = 0
     losses = 0
     stalemates=0
     
-    for e in range(train_epochs):
-        n = np.random.randint(n_min_train, n_max_train+1)
-        MCTS_player = MCTS_agent(playouts=n, player=1, C=1)
-        w,l,s = Q_agent.train(epoch=batch_epochs, agent= MCTS_player, game = game, alpha=0.07, gamma=0.7, greedy_prob=0.05)
-        wins+=w
-        losses+=l
-        stalemates+=s
+    if (parallel_actors > 0):
+        #The learner checkpoints the Q-table every 100 batches
+        outcomes, episodes_per_hour = train_parallel(Q_agent, train_epochs*batch_epochs, parallel_actors, board_rows, board_cols, 4,
+                                                     n_min_train, n_max_train, batch_epochs, alpha=0.07, gamma=0.7, greedy_prob=0.05,
+                                                     checkpoint_episodes=100*batch_epochs, checkpoint_file=gzip_file_name, verbose=True)
+        print(f"{episodes_per_hour:.0f} episodes/hour with {parallel_actors} actors")
+        outcomes = np.array(outcomes)
+        for e in range(10*batch_epochs, len(outcomes)+1, 10*batch_epochs):
+            last = outcomes[e-10*batch_epochs:e]
+            epoch_arr.append(e//batch_epochs)
+            wins_arr.append(np.mean(last==1)*100)
+            losses_arr.append(np.mean(last==-1)*100)
+            stalemates_arr.append(np.mean(last==0)*100)
+    else:
+        for e in range(train_epochs):
+            n = np.random.randint(n_min_train, n_max_train+1)
+            MCTS_player = MCTS_agent(playouts=n, player=1, C=1)
+            w,l,s = Q_agent.train(epoch=batch_epochs, agent= MCTS_player, game = game, alpha=0.07, gamma=0.7, greedy_prob=0.05)
+            wins+=w
+            losses+=l
+            stalemates+=s
 
-        if ((e+1)%10 == 0):
-            print(f"Epoch {e+1} train performance")
-            print(f"Wins: {wins}\t Losses: {losses}\t Stalemates: {stalemates}")
-            print(f"Size of Q-table {Q_agent.get_Q_table_size()}")
+            if ((e+1)%10 == 0):
+                print(f"Epoch {e+1} train performance")
+                print(f"Wins: {wins}\t Losses: {losses}\t Stalemates: {stalemates}")
+                print(f"Size of Q-table {Q_agent.get_Q_table_size()}")
 
-            total = wins + losses + stalemates
-            epoch_arr.append(e+1)
-            wins_arr.append(wins/total*100)
-            losses_arr.append(losses/total*100)
-            stalemates_arr.append(stalemates/total*100)
+                total = wins + losses + stalemates
+                epoch_arr.append(e+1)
+                wins_arr.append(wins/total*100)
+                losses_arr.append(losses/total*100)
+                stalemates_arr.append(stalemates/total*100)
 
-            wins=0
-            losses=0
-            stalemates=0
+                wins=0
+                losses=0
+                stalemates=0
 
     Q_agent.save_Q_table(gzip_file_name)
 
@@ -0,0 +1,390 @@
+import numpy as np
+import struct
+import os
+
+#Multiplier of the Fibonacci hashing of the keys (2^64 / golden ratio)
+HASH_MULTIPLIER = 0x9E3779B97F4A7C15
+MASK64 = (1 << 64) - 1
+
+#Bits of the keys stored by the NumPy Q-tables: a board key has (height+1)*width bits (one marker bit per column)
+KEY_BITS = 64
+
+#Batches of at most SMALL_BATCH keys are looked up one by one, the NumPy overhead of vectorized probing is larger
+SMALL_BATCH = 16
+
+#Binary Q-table files: header (magic, version, number of entries n), sorted uint64 keys[n], float32 values[n]
+Q_TABLE_MAGIC = b'C4QT'
+Q_TABLE_VERSION = 1
+Q_TABLE_HEADER = struct.Struct('<4sIQ')
+
+def check_board_size(height, width):
+    '''
+        Raises a ValueError if the keys of a board do not fit in the uint64 keys of HashQTable and MmapQTable
+        Arguments:
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+    '''
+    if (height+1)*width > KEY_BITS:
+        raise ValueError(f"The keys of a {height}x{width} board have {(height+1)*width} bits, "
+                         f"HashQTable and MmapQTable only store keys of up to {KEY_BITS} bits (use a dict Q-table)")
+    pass
+
+
+class HashQTable:
+    '''
+        Implements a Q-table as an open-addressing hash table stored in NumPy arrays, with linear probing.
+        The keys are the integer board keys (gameEnv.key), stored as uint64, and the Q-values are stored as float32.
+        The key 0 marks an empty slot, it is never the key of a board (the keys contain a marker bit per column).
+        The keys of boards with (height+1)*width > 64 do not fit in a uint64, see check_board_size.
+
+        The table supports the dictionary operations used by Q_learn_agent (in, [], []=, get, len, items),
+        so it can replace the dictionary Q-table
+    '''
+
+    def __init__(self, capacity = 1024, max_load = 0.5, track_visits = False):
+        '''
+            Arguments:
+                capacity: initial number of slots, rounded up to a power of 2
+                max_load: maximum fraction of used slots, the table doubles in size above it
+                track_visits: if True, the number of times every Q-value has been set is counted
+        '''
+        bits = max(1, int(capacity-1).bit_length())
+        self.max_load = max_load
+        self.track_visits = track_visits
+        self.size = 0
+        self.allocate(bits)
+
+    def allocate(self, bits):
+        '''
+            Allocates empty arrays with 2^bits slots
+        '''
+        self.bits = bits
+        self.mask = (1 << bits) - 1
+        self.shift = 64 - bits
+        self.keys = np.zeros(1 << bits, dtype=np.uint64)
+        self.values = np.zeros(1 << bits, dtype=np.float32)
+        self.visits = np.zeros(1 << bits, dtype=np.uint32) if self.track_visits else None
+
+    @classmethod
+    def from_dict(cls, Q_table, max_load = 0.5, track_visits = False):
+        '''
+            Builds a table from a dictionary Q-table
+            Arguments:
+                Q_table: dictionary key -> Q-value
+                max_load: maximum fraction of used slots
+                track_visits: if True, the number of times every Q-value has been set is counted
+            Returns:
+                table: HashQTable with the same entries
+        '''
+        table = cls(int(len(Q_table)/max_load) + 1, max_load, track_visits)
+        table.set_many(np.fromiter(Q_table.keys(), dtype=np.uint64, count=len(Q_table)),
+                       np.fromiter(Q_table.values(), dtype=np.float32, count=len(Q_table)))
+        return table
+
+    def slot(self, key):
+        '''
+            Returns the first slot probed for a key
+        '''
+        return ((key*HASH_MULTIPLIER) & MASK64) >> self.shift
+
+    def find(self, key):
+        '''
+            Returns the slot of a key, or the empty slot where it would be inserted
+        '''
+        item = self.keys.item
+        i = self.slot(key)
+        while True:
+            k = item(i)
+            if k == key or k == 0:
+                return i
+            i = (i+1) & self.mask
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.keys.item(self.find(key)) != 0
+
+    def __getitem__(self, key):
+        i = self.find(key)
+        if self.keys.item(i) == 0:
+            raise KeyError(key)
+        return self.values.item(i)
+
+    def get(self, key, default = None):
+        i = self.find(key)
+        if self.keys.item(i) == 0:
+            return default
+        return self.values.item(i)
+
+    def __setitem__(self, key, value):
+        i = self.find(key)
+        if self.keys.item(i) == 0:
+            if (self.size+1) > self.max_load*len(self.keys):
+                self.grow()
+                i = self.find(key)
+            self.keys[i] = key
+            self.size += 1
+        self.values[i] = value
+        if self.track_visits:
+            self.visits[i] += 1
+
+    def visit_count(self, key):
+        '''
+            Returns the number of times the Q-value of a key has been set (0 if visits are not tracked)
+        '''
+        i = self.find(key)
+        if (not self.track_visits) or self.keys.item(i) == 0:
+            return 0
+        return int(self.visits[i])
+
+    def keys_array(self):
+        '''
+            Returns the stored keys as a uint64 array
+        '''
+        return self.keys[self.keys != 0]
+
+    def items(self):
+        '''
+            Iterates over the (key, Q-value) pairs, as Python int and float
+        '''
+        used = np.flatnonzero(self.keys)
+        for key, value in zip(self.keys[used].tolist(), self.values[used].tolist()):
+            yield key, value
+
+    def __iter__(self):
+        return iter(self.keys_array().tolist())
+
+    def probe(self, keys):
+        '''
+            Finds the slots of many keys at once
+            Arguments:
+                keys: uint64 array of keys
+            Returns:
+                slots: slot of every key, or the empty slot where it would be inserted
+        '''
+        keys = np.asarray(keys, dtype=np.uint64)
+        slots = (keys*np.uint64(HASH_MULTIPLIER)) >> np.uint64(self.shift)
+        pending = np.arange(len(keys))
+        while len(pending):
+            stored = self.keys[slots[pending]]
+            done = (stored == keys[pending]) | (stored == 0)
+            pending = pending[~done]
+            slots[pending] = (slots[pending] + np.uint64(1)) & np.uint64(self.mask)
+        return slots
+
+    def get_many(self, keys, default = 0):
+        '''
+            Looks up the Q-values of many keys with vectorized probing
+            Arguments:
+                keys: uint64 array of keys
+                default: Q-value of the keys that are not in the table
+            Returns:
+                values: float32 array of the Q-values
+        '''
+        if len(keys) <= SMALL_BATCH:
+            return np.array([self.get(key, default) for key in np.asarray(keys, dtype=np.uint64).tolist()], dtype=np.float32)
+        slots = self.probe(keys)
+        found = self.keys[slots] != 0
+        return np.where(found, self.values[slots], np.float32(default))
+
+    def set_many(self, keys, values):
+        '''
+            Sets the Q-values of many distinct keys with vectorized probing
+            Arguments:
+                keys: uint64 array of distinct keys
+                values: Q-values of the keys
+        '''
+        keys = np.asarray(keys, dtype=np.uint64)
+        values = np.asarray(values, dtype=np.float32)
+        while (self.size + len(keys)) > self.max_load*len(self.keys):
+            self.grow()
+
+        slots = (keys*np.uint64(HASH_MULTIPLIER)) >> np.uint64(self.shift)
+        pending = np.arange(len(keys))
+        while len(pending):
+            stored = self.keys[slots[pending]]
+            present = stored == keys[pending]
+            self.values[slots[pending[present]]] = values[pending[present]]
+            if self.track_visits:
+                self.visits[slots[pending[present]]] += 1
+
+            #The first of the keys that probe the same empty slot is inserted, the others keep probing
+            empty = np.flatnonzero(stored == 0)
+            first = np.unique(slots[pending[empty]], return_index=True)[1]
+            inserted = pending[empty[first]]
+            self.keys[slots[inserted]] = keys[inserted]
+            self.values[slots[inserted]] = values[inserted]
+            if self.track_visits:
+                self.visits[slots[inserted]] += 1
+            self.size += len(inserted)
+
+            done = present.copy()
+            done[empty[first]] = True
+            pending = pending[~done]
+            moved = pending[self.keys[slots[pending]] != keys[pending]]
+            slots[moved] = (slots[moved] + np.uint64(1)) & np.uint64(self.mask)
+        pass
+
+    def grow(self):
+        '''
+            Doubles the number of slots and reinserts the entries
+        '''
+        used = np.flatnonzero(self.keys)
+        keys = self.keys[used]
+        values = self.values[used]
+        visits = self.visits[used] if self.track_visits else None
+
+        self.allocate(self.bits + 1)
+        self.size = 0
+        self.set_many(keys, values)
+        if self.track_visits:
+            self.visits[self.probe(keys)] = visits
+        pass
+
+    def nbytes(self):
+        '''
+            Returns the memory used by the arrays of the table in bytes
+        '''
+        return self.keys.nbytes + self.values.nbytes + (self.visits.nbytes if self.track_visits else 0)
+
+
+def write_Q_table_file(filename, Q_table):
+    '''
+        Writes a Q-table to a binary file, that can be opened with MmapQTable. The table is written to a temporary
+        file that replaces the binary file with os.replace: the tables that map the old file keep reading it,
+        and an MmapQTable saved to its own file is reopened on the new one
+        Arguments:
+            filename: path of the binary file
+            Q_table: Q-table (dictionary, HashQTable or MmapQTable)
+    '''
+    items = list(Q_table.items())
+    keys = np.fromiter((key for key,value in items), dtype='<u8', count=len(items))
+    values = np.fromiter((value for key,value in items), dtype='<f4', count=len(items))
+    order = np.argsort(keys, kind='stable')
+    keys = keys[order]
+    values = values[order]
+
+    temp_filename = f"{filename}.{os.getpid()}.tmp"
+    with open(temp_filename, 'wb') as f:
+        f.write(Q_TABLE_HEADER.pack(Q_TABLE_MAGIC, Q_TABLE_VERSION, len(keys)))
+        f.write(keys.tobytes())
+        f.write(values.tobytes())
+    os.replace(temp_filename, filename)
+
+    if isinstance(Q_table, MmapQTable) and os.path.realpath(Q_table.filename) == os.path.realpath(filename):
+        Q_table.reopen()
+    pass
+
+
+class MmapQTable:
+    '''
+        Q-table stored in a binary file (see write_Q_table_file) and memory-mapped: opening the table does not
+        read the entries, and the lookups are binary searches of the sorted keys that only load the pages they touch.
+        The file is never modified, the Q-values that are set are stored in a dictionary overlay on top of it.
+        Like HashQTable, it only stores the keys of boards with (height+1)*width <= 64
+    '''
+
+    def __init__(self, filename):
+        '''
+            Arguments:
+                filename: path of the binary file
+        '''
+        with open(filename, 'rb') as f:
+            magic, version, self.n = Q_TABLE_HEADER.unpack(f.read(Q_TABLE_HEADER.size))
+        if magic != Q_TABLE_MAGIC or version != Q_TABLE_VERSION:
+            raise ValueError(f"{filename} is not a version {Q_TABLE_VERSION} binary Q-table")
+
+        self.filename = filename
+        if self.n > 0:
+            #Plain array views of the maps, the memmap subclass makes every scalar search slower
+            self.keys = np.asarray(np.memmap(filename, dtype='<u8', mode='r', offset=Q_TABLE_HEADER.size, shape=(self.n,)))
+            self.values = np.asarray(np.memmap(filename, dtype='<f4', mode='r', offset=Q_TABLE_HEADER.size + 8*self.n, shape=(self.n,)))
+        else:
+            self.keys = np.zeros(0, dtype=np.uint64)
+            self.values = np.zeros(0, dtype=np.float32)
+        self.overlay = {}               #Q-values set after the file was opened
+        self.new_keys = 0               #Keys of the overlay that are not in the file
+
+    def reopen(self):
+        '''
+            Maps the current content of the file again, the Q-values of the overlay are dropped
+        '''
+        self.__init__(self.filename)
+        pass
+
+    def find(self, key):
+        '''
+            Returns the index of a key in the file, -1 if the key is not in the file
+        '''
+        #The key is searched as a uint64, a Python int would convert the whole key array to float64
+        i = int(self.keys.searchsorted(np.uint64(key)))
+        if i < self.n and self.keys.item(i) == key:
+            return i
+        return -1
+
+    def __len__(self):
+        return self.n + self.new_keys
+
+    def __contains__(self, key):
+        return (key in self.overlay) or self.find(key) >= 0
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key, default = None):
+        value = self.overlay.get(key)
+        if value is not None:
+            return value
+        i = self.find(key)
+        if i < 0:
+            return default
+        return self.values.item(i)
+
+    def __setitem__(self, key, value):
+        if (key not in self.overlay) and self.find(key) < 0:
+            self.new_keys += 1
+        self.overlay[key] = value
+
+    def items(self):
+        '''
+            Iterates over the (key, Q-value) pairs, as Python int and float
+        '''
+        for key, value in zip(self.keys.tolist(), self.values.tolist()):
+            yield key, self.overlay.get(key, value)
+        for key, value in self.overlay.items():
+            if self.find(key) < 0:
+                yield key, value
+
+    def __iter__(self):
+        return (key for key,value in self.items())
+
+    def get_many(self, keys, default = 0):
+        '''
+            Looks up the Q-values of many keys with one vectorized binary search
+            Arguments:
+                keys: uint64 array of keys
+                default: Q-value of the keys that are not in the table
+            Returns:
+                values: float32 array of the Q-values
+        '''
+        keys = np.asarray(keys, dtype=np.uint64)
+        values = np.full(len(keys), default, dtype=np.float32)
+        if self.n > 0:
+            i = np.minimum(np.searchsorted(self.keys, keys), self.n-1)
+            found = self.keys[i] == keys
+            values[found] = self.values[i[found]]
+        if self.overlay:
+            for j, key in enumerate(keys.tolist()):
+                if key in self.overlay:
+                    values[j] = self.overlay[key]
+        return values
+
+    def nbytes(self):
+        '''
+            Returns the size of the mapped file in bytes (only the pages that are read are loaded in memory)
+        '''
+        return self.keys.nbytes + self.values.nbytes
@@ -0,0 +1,310 @@
+import numpy as np
+import sys
+from contextlib import contextmanager
+from gameEnv import gameEnv, zobrist_table, cell_windows
+
+class bitboardEnv:
+    '''
+        Implements a bitboard backed environment class over which the Connect 4 game can be played.
+        It exposes the same interface as gameEnv, so the agents can play on either environment.
+
+        Every column is stored in (height+1) consecutive bits of a Python integer, the extra bit on top
+        of each column is a sentinel that is always 0 so that shifted lines never wrap around columns.
+        Bit (c*(height+1) + r) represents the cell in row r and column c (row 0 is the bottom row).
+    '''
+    def __init__(self, env_copy = None, height = None, width = None, win_streak = 4):
+        '''
+            Initializes the bitboardEnv object
+            Arguments:
+                env_copy: If not None, the object copies the 'env_copy' bitboardEnv object
+                height: Number of rows in the Connect 4 board
+                width: Number of columns in the Connect 4 board
+                win_streak: Continuous number of beads that is considered a victory in the game
+        '''
+        if (env_copy == None):
+            self.win_streak = win_streak
+            self.h = height
+            self.w = width
+            self.boards = [0, 0]                #Bitmasks of the beads of player 1 and player 2
+            self.heights = [0]*width            #Number of beads in each column
+            self.moves = 0                      #Number of beads on the board
+            self.action_space = tuple(range(1, width+1))
+            self.move_stack = []                #Actions performed on the board, used to undo moves
+            self.key = sum(1 << (c*(height+1)) for c in range(width))
+            self.hash = 0
+            self.mirror_key = self.key
+            self.mirror_hash = 0
+        else:
+            #Copies the env_copy bitboardEnv object
+            self.h = env_copy.h
+            self.w = env_copy.w
+            self.win_streak = env_copy.win_streak
+            self.boards = env_copy.boards.copy()
+            self.heights = env_copy.heights.copy()
+            self.moves = env_copy.moves
+            self.action_space = env_copy.action_space
+            self.move_stack = env_copy.move_stack.copy()
+            self.key = env_copy.key
+            self.hash = env_copy.hash
+            self.mirror_key = env_copy.mirror_key
+            self.mirror_hash = env_copy.mirror_hash
+
+        self.H1 = self.h + 1
+        #Shifts along the vertical, horizontal and the two diagonal directions
+        self.shifts = (1, self.H1, self.H1 + 1, self.H1 - 1)
+
+        #Exact keys and Zobrist hashes of the board and its reflection, with the same encoding as gameEnv
+        self.zobrist = zobrist_table(self.h, self.w)
+        self.windows = cell_windows(self.h, self.w, self.win_streak)
+
+        self.history = []                   #Used to store the history of the game for debugging purposes
+        self.action_history = []            #Used to store the action history of the game for debugging purposes
+
+    @property
+    def grid(self):
+        '''
+            Returns the board as a (height x width) NumPy grid in the same format as gameEnv.grid
+        '''
+        grid = np.zeros((self.h, self.w), dtype=int)
+        for c in range(self.w):
+            for r in range(self.heights[c]):
+                bit = 1 << (c*self.H1 + r)
+                grid[r][c] = 1 if (self.boards[0] & bit) else 2
+        return grid
+
+    def check_valid_move(self, action, debug = False):
+        '''
+            Function to check the validity of a move
+            Arguments:
+                action: Move whose validity has to be verified
+                debug: if set, runs the function in debug mode
+            Returns:
+                valid: boolean value representing if the action is valid
+        '''
+        if (action < 1 or action > self.w):
+            if (debug):
+                print("Illegal action command")
+            return False
+
+        if (self.heights[action-1] == self.h):
+            if (debug):
+                print(f"Column already filled: {self.h-1}")
+                self.print_grid()
+            return False
+
+        return True
+
+    def get_action_space(self):
+        '''
+            Returns the current action space of the game environment
+            The tuple is cached and only rebuilt when a column gets filled
+            Returns:
+                actions: tuple containing the valid actions
+        '''
+        return self.action_space
+
+    def make_move(self, action, player, track_history = False):
+        '''
+            Performs the action by the specified player on the game
+            Arguments:
+                action: Action to be performed on the board
+                player: player id of the player performing the move
+                track_history: if True, stores the history of actions and state grids (for debugging)
+            Returns:
+                status: Status of the board:
+                            0: Transient State
+                            1: Victory
+                            2: Stalemate
+        '''
+
+        TRANSIENT_STATE_STATUS = 0
+        VICTORY_STATUS = 1
+        STALEMATE_STATUS = 2
+
+        #Actions sampled with NumPy are converted, so that the keys stay Python integers
+        action = int(action)
+
+        #Check if the action is valid
+        if not(self.check_valid_move(action, debug=True)):
+            sys.exit(f"Move {action} is not a valid move by player {player}")
+
+        col = action - 1
+        pos = col*self.H1 + self.heights[col]
+        self.boards[player-1] |= 1 << pos
+        self.key += 1 << (pos+1) if player==1 else 1 << pos
+        self.hash ^= self.zobrist[player-1][pos]
+        mpos = (self.w-1-col)*self.H1 + self.heights[col]
+        self.mirror_key += 1 << (mpos+1) if player==1 else 1 << mpos
+        self.mirror_hash ^= self.zobrist[player-1][mpos]
+        self.heights[col] += 1
+        self.moves += 1
+        self.move_stack.append(action)
+        if (self.heights[col] == self.h):
+            self.action_space = tuple(a for a in self.action_space if a != action)
+
+        if (track_history):
+            self.history.append(self.grid)
+            self.action_history.append(action)
+
+        #Check if the board is in a terminal victory state
+        if (self.victory_board(self.boards[player-1])):
+            return VICTORY_STATUS
+
+        #Check if the board is in a transient state
+        if self.moves < self.h*self.w:
+            return TRANSIENT_STATE_STATUS
+
+        return STALEMATE_STATUS
+
+    def undo_move(self):
+        '''
+            Undoes the last move performed on the board (the debugging history is not modified)
+            Returns:
+                action: Action that has been undone
+        '''
+        action = self.move_stack.pop()
+        col = action-1
+        self.heights[col] -= 1
+        self.moves -= 1
+        pos = col*self.H1 + self.heights[col]
+        player = 1 if (self.boards[0] >> pos) & 1 else 2
+        self.boards[player-1] ^= 1 << pos
+        self.key -= 1 << (pos+1) if player==1 else 1 << pos
+        self.hash ^= self.zobrist[player-1][pos]
+        mpos = (self.w-1-col)*self.H1 + self.heights[col]
+        self.mirror_key -= 1 << (mpos+1) if player==1 else 1 << mpos
+        self.mirror_hash ^= self.zobrist[player-1][mpos]
+
+        if (self.heights[col] == self.h-1):
+            #The column was filled, rebuild the action space
+            self.action_space = tuple(a for a in range(1, self.w+1) if self.heights[a-1] < self.h)
+        return action
+
+    def undo_until(self, moves):
+        '''
+            Undoes the moves performed on the board until only 'moves' beads are left on it
+            Arguments:
+                moves: number of beads on the board after undoing the moves
+        '''
+        while self.moves > moves:
+            self.undo_move()
+
+    @contextmanager
+    def try_move(self, action, player):
+        '''
+            Context manager that performs a move on the board and undoes it on exit
+            Arguments:
+                action: Action to be performed on the board
+                player: player id of the player performing the move
+            Returns:
+                status: Status of the board after the move (same as make_move)
+        '''
+        status = self.make_move(action, player)
+        try:
+            yield status
+        finally:
+            self.undo_move()
+
+    #Key, symmetry and threat helpers only depend on the keys, boards and heights, they are shared with gameEnv
+    key_after = gameEnv.key_after
+    afterstate_keys = gameEnv.afterstate_keys
+    winning_moves = gameEnv.winning_moves
+    load_key = gameEnv.load_key
+    canonical_key = gameEnv.canonical_key
+    canonical_hash = gameEnv.canonical_hash
+    is_mirrored = gameEnv.is_mirrored
+    is_symmetric = gameEnv.is_symmetric
+    mirror_action = gameEnv.mirror_action
+    canonical_action = gameEnv.canonical_action
+
+    def victory_board(self, board):
+        '''
+            Function that checks if a bitmask contains a line of 'win_streak' beads
+            Arguments:
+                board: bitmask of the beads of a player
+            Returns:
+                True: Victory state
+                False: Not a victory state
+        '''
+        for shift in self.shifts:
+            #After the loop, a bit is set in 'line' only if 'win_streak' consecutive beads start at it
+            line = board
+            for i in range(1, self.win_streak):
+                line &= board >> (i*shift)
+                if not line:
+                    break
+            if line:
+                return True
+        return False
+
+    def print_grid(self):
+        '''
+            Prints the game grid
+        '''
+        grid = self.grid
+        for i in range(self.h-1,-1,-1):
+            for j in range(self.w):
+                print(grid[i][j], end = " ")
+            print()
+        pass
+
+    def generate_string(self):
+        '''
+            Serialize the grid into a single string (for debugging, the agents use the integer key)
+            Returns:
+                s: String that encodes the grid in row-major format
+        '''
+        return ''.join(str(cell) for row in self.grid for cell in row)
+
+    def print_history(self):
+        '''
+            Function that prints the history of the game grid over the course of the game
+        '''
+        for curr_grid in self.history:
+            for i in range(self.h-1,-1,-1):
+                for j in range(self.w):
+                    print(curr_grid[i][j], end = " ")
+                print()
+            print("\n\n")
+        print(self.action_history)
+        pass
+
+    def reset_game(self):
+        '''
+            Function to reset the environment
+        '''
+        self.boards = [0, 0]
+        self.heights = [0]*self.w
+        self.moves = 0
+        self.action_space = tuple(range(1, self.w+1))
+        self.move_stack = []
+        self.key = sum(1 << (c*self.H1) for c in range(self.w))
+        self.hash = 0
+        self.mirror_key = self.key
+        self.mirror_hash = 0
+        self.history = []
+        self.action_history = []
+
+
+if __name__=='__main__':
+
+    game = bitboardEnv(height = 4,width = 3, win_streak=3)
+    game.print_grid()
+
+    player = 0
+    while True:
+
+        print(f"Player {player+1}, choose a move:")
+        move = int(input())
+
+        state = game.make_move(move, player+1)
+        game.print_grid()
+
+        if (state==1):
+            print(f"Player {player+1} has won the game")
+            break
+        elif (state==2):
+            print("Stalemate")
+            break
+
+        player = (player+1)%2
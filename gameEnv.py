@@ -1,5 +1,87 @@
 import numpy as np
 import sys
+from contextlib import contextmanager
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def zobrist_table(height, width):
+    '''
+        Returns the Zobrist hashing table of a board. The table is generated from a fixed seed, so the
+        hashes are the same across runs and processes
+        Arguments:
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+        Returns:
+            table: table[player-1][c*(height+1) + r] is the random 64-bit integer of a bead of
+                   'player' placed in row r and column c
+    '''
+    rng = np.random.default_rng([height, width])
+    cells = width*(height+1)
+    return tuple(tuple(int(z) for z in rng.integers(0, 2**64, size=cells, dtype=np.uint64)) for player in range(2))
+
+@lru_cache(maxsize=None)
+def cell_windows(height, width, win_streak):
+    '''
+        Returns the lines of 'win_streak' cells that go through every cell of a board, as bitmasks
+        in the layout of the keys (bit c*(height+1) + r for the cell in row r and column c)
+        Arguments:
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            windows: windows[c*(height+1) + r] is the tuple of the masks of the other (win_streak-1) 
+                     cells of the lines through the cell in row r and column c
+    '''
+    H1 = height+1
+    windows = [[] for i in range(width*H1)]
+    for dr, dc in ((1, 0), (0, 1), (1, 1), (1, -1)):
+        for r in range(height):
+            for c in range(width):
+                #Line starting at (r,c) along the direction (dr,dc)
+                cells = [(r + i*dr, c + i*dc) for i in range(win_streak)]
+                if not all(0 <= y < height and 0 <= x < width for y,x in cells):
+                    continue
+                line = sum(1 << (x*H1 + y) for y,x in cells)
+                for y,x in cells:
+                    pos = x*H1 + y
+                    windows[pos].append(line ^ (1 << pos))
+    return tuple(tuple(masks) for masks in windows)
+
+def grid_key(grid):
+    '''
+        Computes the exact key of a board grid (see gameEnv.key)
+        Arguments:
+            grid: (height x width) grid of the board, with row 0 as the bottom row
+        Returns:
+            key: exact integer key of the board
+    '''
+    h, w = grid.shape
+    key = 0
+    for c in range(w):
+        r = 0
+        while r < h and grid[r][c] != 0:
+            if (grid[r][c] == 1):
+                key |= 1 << (c*(h+1) + r)
+            r += 1
+        key |= 1 << (c*(h+1) + r)
+    return key
+
+def mirror_key(key, height, width):
+    '''
+        Computes the key of the left-right reflection of a board from its key
+        Arguments:
+            key: exact integer key of the board (see gameEnv.key)
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+        Returns:
+            mirrored_key: exact integer key of the reflected board
+    '''
+    H1 = height+1
+    column_mask = (1 << H1) - 1
+    mirrored_key = 0
+    for c in range(width):
+        mirrored_key |= ((key >> (c*H1)) & column_mask) << ((width-1-c)*H1)
+    return mirrored_key
 
 class gameEnv:
     '''
@@ -20,14 +102,40 @@ class gameEnv:
             self.h = height 
             self.w = width
             self.grid = np.zeros((height, width), dtype=int)
+            self.heights = [0]*width            #Number of beads in each column
+            self.moves = 0                      #Number of beads on the board
+            self.action_space = tuple(range(1, width+1))
+            self.move_stack = []                #Actions performed on the board, used to undo moves
+            self.key = sum(1 << (c*(height+1)) for c in range(width))
+            self.hash = 0
+            self.mirror_key = self.key
+            self.mirror_hash = 0
+            self.boards = [0, 0]                #Bitmasks of the beads of player 1 and player 2, in the layout of the key
         else:
             self.h = env_copy.h
             self.w = env_copy.w
             self.grid = env_copy.grid.copy()
             self.win_streak = env_copy.win_streak
+            self.heights = env_copy.heights.copy()
+            self.moves = env_copy.moves
+            self.action_space = env_copy.action_space
+            self.move_stack = env_copy.move_stack.copy()
+            self.key = env_copy.key
+            self.hash = env_copy.hash
+            self.mirror_key = env_copy.mirror_key
+            self.mirror_hash = env_copy.mirror_hash
+            self.boards = env_copy.boards.copy()
         
         self.history = []                   #Used to store the history of the game for debugging purposes
         self.action_history = []            #Used to store the action history of the game for debugging purposes
+
+        #Both keys are updated incrementally in make_move and undo_move
+        #key: exact integer encoding of the board. Each column uses (h+1) bits, the beads of player 1 are set bits,
+        #     and a marker bit is set just above the top bead of the column. Fits in 64 bits for boards up to 7x8
+        #hash: 64-bit Zobrist hash of the board, to be used by transposition tables
+        #mirror_key, mirror_hash: key and hash of the left-right reflection of the board
+        self.zobrist = zobrist_table(self.h, self.w)
+        self.windows = cell_windows(self.h, self.w, self.win_streak)
     
     def check_valid_move(self, action, debug = False):
         '''
@@ -38,12 +146,12 @@ class gameEnv:
             Returns:
                 valid: boolean value representing if the action is valid
         '''
-        if (action > self.w):
+        if (action < 1 or action > self.w):
             if (debug):
                 print("Illegal action command")
             return False
         
-        if (self.grid[self.h-1][action-1] != 0):
+        if (self.heights[action-1] == self.h):
             if (debug):
                 print(f"Column already filled: {self.h-1}")
                 self.print_grid()
@@ -54,14 +162,11 @@ class gameEnv:
     def get_action_space(self):
         '''
             Returns the current action space of the game environment
+            The tuple is cached and only rebuilt when a column gets filled
             Returns:
-                actions: array containing the valid actions
+                actions: tuple containing the valid actions
         '''
-        actions = []
-        for i in range(1,self.w+1):
-            if self.check_valid_move(i):
-                actions.append(i)
-        return actions
+        return self.action_space
     
     def make_move(self,action, player, track_history = False):
         '''
@@ -81,18 +186,30 @@ class gameEnv:
         VICTORY_STATUS = 1
         STALEMATE_STATUS = 2
 
+        #Actions sampled with NumPy are converted, so that the keys stay Python integers
+        action = int(action)
+
         #Check if the action is valid
         if not(self.check_valid_move(action, debug=True)):
             sys.exit(f"Move {action} is not a valid move by player {player}")
         
-        insert_pos = -1
-
         #Update state grid
-        for i in range(self.h):
-            if(self.grid[i][action-1]==0):
-              self.grid[i][action-1] = player
-              insert_pos = i
-              break
+        insert_pos = self.heights[action-1]
+        self.grid[insert_pos][action-1] = player
+        self.heights[action-1] += 1
+        self.moves += 1
+        self.move_stack.append(action)
+
+        #Update the keys
+        pos = (action-1)*(self.h+1) + insert_pos
+        self.boards[player-1] |= 1 << pos
+        self.key += 1 << (pos+1) if player==1 else 1 << pos
+        self.hash ^= self.zobrist[player-1][pos]
+        mpos = (self.w-action)*(self.h+1) + insert_pos
+        self.mirror_key += 1 << (mpos+1) if player==1 else 1 << mpos
+        self.mirror_hash ^= self.zobrist[player-1][mpos]
+        if (self.heights[action-1] == self.h):
+            self.action_space = tuple(a for a in self.action_space if a != action)
         
         if (track_history):
             self.history.append(self.grid.copy())
@@ -103,12 +220,154 @@ class gameEnv:
             return VICTORY_STATUS
 
         #Check if the board is in a transient state    
-        for i in range(self.w):
-            if self.grid[self.h-1][i] == 0:
-                return TRANSIENT_STATE_STATUS
+        if self.moves < self.h*self.w:
+            return TRANSIENT_STATE_STATUS
         
         return STALEMATE_STATUS
 
+    def undo_move(self):
+        '''
+            Undoes the last move performed on the board (the debugging history is not modified)
+            Returns:
+                action: Action that has been undone
+        '''
+        action = self.move_stack.pop()
+        col = action-1
+        self.heights[col] -= 1
+        self.moves -= 1
+        player = int(self.grid[self.heights[col]][col])
+        self.grid[self.heights[col]][col] = 0
+
+        pos = col*(self.h+1) + self.heights[col]
+        self.boards[player-1] ^= 1 << pos
+        self.key -= 1 << (pos+1) if player==1 else 1 << pos
+        self.hash ^= self.zobrist[player-1][pos]
+        mpos = (self.w-1-col)*(self.h+1) + self.heights[col]
+        self.mirror_key -= 1 << (mpos+1) if player==1 else 1 << mpos
+        self.mirror_hash ^= self.zobrist[player-1][mpos]
+
+        if (self.heights[col] == self.h-1):
+            #The column was filled, rebuild the action space
+            self.action_space = tuple(a for a in range(1, self.w+1) if self.heights[a-1] < self.h)
+        return action
+
+    def undo_until(self, moves):
+        '''
+            Undoes the moves performed on the board until only 'moves' beads are left on it
+            Arguments:
+                moves: number of beads on the board after undoing the moves
+        '''
+        while self.moves > moves:
+            self.undo_move()
+
+    @contextmanager
+    def try_move(self, action, player):
+        '''
+            Context manager that performs a move on the board and undoes it on exit. 
+            Used to evaluate after-states in place without copying the board
+                with game.try_move(action, player) as status:
+                    ...
+            Arguments:
+                action: Action to be performed on the board
+                player: player id of the player performing the move
+            Returns:
+                status: Status of the board after the move (same as make_move)
+        '''
+        status = self.make_move(action, player)
+        try:
+            yield status
+        finally:
+            self.undo_move()
+
+    def key_after(self, action, player):
+        '''
+            Computes the key of the board after a move, without performing the move
+            Arguments:
+                action: valid action
+                player: player id of the player performing the move
+            Returns:
+                key: exact integer key of the after-state
+        '''
+        pos = (int(action)-1)*(self.h+1) + self.heights[action-1]
+        return self.key + (1 << (pos+1) if player==1 else 1 << pos)
+
+    def afterstate_keys(self, player, canonical = False):
+        '''
+            Computes the keys of the after-states of all the valid actions in one pass, from the key 
+            and the column heights of the board, without performing the moves
+            Arguments:
+                player: player id of the player performing the move
+                canonical: if True, the canonical keys (see canonical_key) of the after-states are returned
+            Returns:
+                actions: tuple containing the valid actions
+                keys: list of the exact integer keys of the after-states, in the order of the actions
+        '''
+        H1 = self.h+1
+        bit = 2 if player==1 else 1
+        keys = []
+        for a in self.action_space:
+            key = self.key + (bit << ((a-1)*H1 + self.heights[a-1]))
+            if canonical:
+                mirror = self.mirror_key + (bit << ((self.w-a)*H1 + self.heights[a-1]))
+                if mirror < key:
+                    key = mirror
+            keys.append(key)
+        return self.action_space, keys
+
+    def winning_moves(self, player):
+        '''
+            Returns the actions that win the game immediately, using the lines precomputed for every cell
+            Arguments:
+                player: player id of the player to move
+            Returns:
+                actions: list of the winning actions
+        '''
+        board = self.boards[player-1]
+        H1 = self.h+1
+        actions = []
+        for a in self.action_space:
+            for mask in self.windows[(a-1)*H1 + self.heights[a-1]]:
+                if (board & mask) == mask:
+                    actions.append(a)
+                    break
+        return actions
+
+    def canonical_key(self):
+        '''
+            Returns the key shared by the board and its left-right reflection (the smaller of the two keys)
+        '''
+        return self.key if self.key <= self.mirror_key else self.mirror_key
+
+    def canonical_hash(self):
+        '''
+            Returns the Zobrist hash shared by the board and its left-right reflection
+        '''
+        return self.hash if self.key <= self.mirror_key else self.mirror_hash
+
+    def is_mirrored(self):
+        '''
+            Returns True if the canonical key of the board is the key of its reflection
+        '''
+        return self.mirror_key < self.key
+
+    def is_symmetric(self):
+        '''
+            Returns True if the board is equal to its left-right reflection
+        '''
+        return self.key == self.mirror_key
+
+    def mirror_action(self, action):
+        '''
+            Maps an action to the equivalent action on the reflected board
+        '''
+        return self.w + 1 - action
+
+    def canonical_action(self, action):
+        '''
+            Maps an action on the board to the equivalent action in the canonical orientation of the board
+        '''
+        return self.mirror_action(action) if self.is_mirrored() else action
+
     def victory_move(self, x, y, player):
         '''
             Function that checks if the current action has resulted in a victory move
@@ -190,16 +449,11 @@ class gameEnv:
 
     def generate_string(self):
         '''
-            Serialize the grid into a single string
+            Serialize the grid into a single string (for debugging, the agents use the integer key)
             Returns: 
                 s: String that encodes the grid in row-major format
         '''
-
-        s = ""
-        for i in self.grid:
-            for j in i:
-                s = s + str(i)
-        return s
+        return ''.join(str(cell) for row in self.grid for cell in row)
 
     def print_history(self):
         '''
@@ -214,11 +468,34 @@ class gameEnv:
         print(self.action_history)
         pass
 
+    def load_key(self, key):
+        '''
+            Resets the environment and sets the board encoded by a key (see gameEnv.key).
+            The beads are dropped column by column, so the move stack does not follow the order of the game
+            Arguments:
+                key: exact integer key of the board
+        '''
+        self.reset_game()
+        for c in range(self.w):
+            column = (key >> (c*(self.h+1))) & ((1 << (self.h+1)) - 1)
+            for r in range(column.bit_length()-1):          #The marker bit is the highest set bit
+                self.make_move(c+1, 1 if (column >> r) & 1 else 2)
+        pass
+
     def reset_game(self):
         '''
             Function to reset the environment 
         '''
         self.grid = np.zeros((self.h, self.w), dtype=int)
+        self.heights = [0]*self.w
+        self.moves = 0
+        self.action_space = tuple(range(1, self.w+1))
+        self.move_stack = []
+        self.key = sum(1 << (c*(self.h+1)) for c in range(self.w))
+        self.hash = 0
+        self.mirror_key = self.key
+        self.mirror_hash = 0
+        self.boards = [0, 0]
         self.history = []
         self.action_history = []
 
@@ -38,7 +38,7 @@ if __name__=='__main__':
         print(f"\nPlaying Connect-4 ( 5 columns x 4 rows): MCTS_n vs Q agent")
         player1 = MCTS_agent(player=1, playouts=25, C=1)
         player1_name = "MCTS agent with n playouts"
-        player2 = Q_learn_agent(player=2)
+        player2 = Q_learn_agent(player=2, frozen=True)     #The evaluation game does not grow the Q-table
         player2.load_Q_table(qlearn_filename)
         player2_name = "Q-learning agent"
         game = gameEnv(height=game_rows, width = game_cols, win_streak= win_streak)
@@ -83,6 +83,9 @@ if __name__=='__main__':
         print("Stalemate")
     
     print(f"Total moves played = {moves}")
+    if (choice==2):
+        hits, misses = player2.get_lookup_stats()
+        print(f"Q-table lookups: {hits} hits, {misses} misses")
     
 
 
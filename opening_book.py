@@ -0,0 +1,183 @@
+'''
+    Opening book of the MCTS agent: the root statistics of deep searches of the first plies of the game,
+    stored in a compact binary file that is read with a memory map.
+
+    File format (little endian):
+        header: magic b'C4OB', version, height, width, win_streak, number of positions n (struct '<4sIIIII')
+        keys: uint64[n], canonical Zobrist hashes of the positions (see gameEnv.canonical_hash), sorted
+        visits: uint32[n, width], visits of the root children, indexed by canonical action - 1
+        rewards: float32[n, width], rewards of the root children (for the player to move at the position)
+
+    Run 'python opening_book.py' to precompute a book with the parameters below.
+'''
+
+import numpy as np
+import struct
+import time
+from gameEnv import gameEnv
+from MCTS import MCTS_agent
+
+#### Parameters ######################################################
+
+board_rows = 6
+board_cols = 7
+win_streak = 4
+book_plies = 3                  #Positions with less than book_plies beads are searched
+book_playouts = 2000            #Playouts of the search of every position
+book_file = "opening_book_6x7.bin"
+
+######################################################################
+
+BOOK_MAGIC = b'C4OB'
+BOOK_VERSION = 1
+BOOK_HEADER = struct.Struct('<4sIIIII')
+
+class OpeningBook:
+    '''
+        Read-only opening book, the arrays are memory-mapped so that opening a book is immediate
+        and processes that open the same book share its pages
+    '''
+
+    def __init__(self, filename):
+        '''
+            Arguments:
+                filename: file name of the opening book
+        '''
+        with open(filename, 'rb') as f:
+            magic, version, self.h, self.w, self.win_streak, self.n = BOOK_HEADER.unpack(f.read(BOOK_HEADER.size))
+        if magic != BOOK_MAGIC or version != BOOK_VERSION:
+            raise ValueError(f"{filename} is not a version {BOOK_VERSION} opening book")
+
+        offset = BOOK_HEADER.size
+        self.keys = np.memmap(filename, dtype='<u8', mode='r', offset=offset, shape=(self.n,))
+        offset += self.keys.nbytes
+        self.visits = np.memmap(filename, dtype='<u4', mode='r', offset=offset, shape=(self.n, self.w))
+        offset += self.visits.nbytes
+        self.rewards = np.memmap(filename, dtype='<f4', mode='r', offset=offset, shape=(self.n, self.w))
+
+    def matches(self, game_env):
+        '''
+            Returns True if the book was computed for the board size and win streak of the game environment
+        '''
+        return (self.h, self.w, self.win_streak) == (game_env.h, game_env.w, game_env.win_streak)
+
+    def lookup(self, game_env):
+        '''
+            Looks up the statistics of the position of a game environment
+            Arguments:
+                game_env: game environment
+            Returns:
+                stats: dictionary action -> (visits, reward) of the actions of the position, None if the position is not in the book
+        '''
+        if (self.n == 0) or not self.matches(game_env):
+            return None
+        key = game_env.canonical_hash()
+        #The key is searched as a uint64, a Python int would convert the whole key array to float64
+        i = int(self.keys.searchsorted(np.uint64(key)))
+        if (i == self.n) or (self.keys.item(i) != key):
+            return None
+
+        visits = self.visits[i]
+        rewards = self.rewards[i]
+        stats = {}
+        for a in game_env.get_action_space():
+            c = game_env.canonical_action(a) - 1
+            stats[a] = (int(visits[c]), float(rewards[c]))
+        return stats
+
+    def best_action(self, game_env):
+        '''
+            Returns the most visited action of the position of a game environment, None if the position is not in the book
+        '''
+        stats = self.lookup(game_env)
+        if not stats:
+            return None
+        return max(stats, key=lambda a: stats[a][0])
+
+
+def write_opening_book(filename, height, width, win_streak, positions):
+    '''
+        Writes an opening book file
+        Arguments:
+            filename: file name of the opening book
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+            positions: dictionary canonical hash -> (visits, rewards) arrays of length width, indexed by canonical action - 1
+    '''
+    keys = np.array(sorted(positions), dtype='<u8')
+    visits = np.array([positions[int(k)][0] for k in keys], dtype='<u4').reshape(len(keys), width)
+    rewards = np.array([positions[int(k)][1] for k in keys], dtype='<f4').reshape(len(keys), width)
+
+    with open(filename, 'wb') as f:
+        f.write(BOOK_HEADER.pack(BOOK_MAGIC, BOOK_VERSION, height, width, win_streak, len(keys)))
+        f.write(keys.tobytes())
+        f.write(visits.tobytes())
+        f.write(rewards.tobytes())
+    pass
+
+
+def build_opening_book(filename, height, width, win_streak = 4, plies = 2, playouts = 2000, verbose = False):
+    '''
+        Searches every position with less than 'plies' beads with MCTS and writes the root statistics to an opening book.
+        Mirrored positions are searched once
+        Arguments:
+            filename: file name of the opening book
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+            plies: positions with less than 'plies' beads are searched
+            playouts: playouts of the search of every position
+            verbose: if True, prints the progress
+        Returns:
+            n: number of positions in the book
+    '''
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    positions = {}
+    frontier = [[]]                 #Move sequences of the positions of the current ply
+
+    for ply in range(plies):
+        next_frontier = []
+        for moves in frontier:
+            game.reset_game()
+            for i,action in enumerate(moves):
+                game.make_move(action, 1 + i%2)
+            key = game.canonical_hash()
+            if key in positions:
+                continue
+
+            #The player to move is the root of the search, the book positions are searched without the depth limit of the first move
+            agent = MCTS_agent(player=1 + ply%2, playouts=playouts)
+            agent.first_move = True
+            agent.get_next_action(game)
+
+            visits = np.zeros(width, dtype=np.int64)
+            rewards = np.zeros(width)
+            for action,child in agent.root_node.children.items():
+                c = game.canonical_action(action) - 1
+                visits[c] = child.total_trials
+                rewards[c] = child.reward
+            positions[key] = (visits, rewards)
+
+            for action in game.get_action_space():
+                with game.try_move(action, 1 + ply%2) as status:
+                    if status == 0:
+                        next_frontier.append(moves + [action])
+        frontier = next_frontier
+        if verbose:
+            print(f"Ply {ply}: {len(positions)} positions")
+
+    write_opening_book(filename, height, width, win_streak, positions)
+    return len(positions)
+
+
+if __name__=='__main__':
+
+    start = time.perf_counter()
+    n = build_opening_book(book_file, board_rows, board_cols, win_streak, book_plies, book_playouts, verbose=True)
+    print(f"{book_file}: {n} positions searched in {time.perf_counter()-start:.1f} s")
+
+    book = OpeningBook(book_file)
+    game = gameEnv(height=board_rows, width=board_cols, win_streak=win_streak)
+    print(f"Book move on the empty board: {book.best_action(game)}")
+    print(book.lookup(game))
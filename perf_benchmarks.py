@@ -0,0 +1,960 @@
+'''
+    Python script to benchmark the performance of the game environments and the agents
+'''
+
+from gameEnv import gameEnv
+from bitboardEnv import bitboardEnv
+from vecGameEnv import VecGameEnv
+from MCTS import MCTS_agent, Node
+from MCTS_tree import MCTS_array_agent
+from MCTS_parallel import MCTS_root_parallel_agent, MCTS_threaded_agent
+from Q_learn import Q_learn_agent, convert_Q_table_to_binary, Q_TABLE_DIR
+from Q_learn_parallel import train_parallel
+from Q_table import HashQTable, MmapQTable
+from opening_book import OpeningBook, build_opening_book
+import numpy as np
+import multiprocessing as mp
+import os
+import sys
+import time
+import tracemalloc
+
+#Parameters #############################################
+
+board_rows = 6
+board_cols = 7
+win_streak = 4
+random_games = 2000
+vec_envs = 4096
+mcts_playouts = 200
+mcts_batch_sizes = [1, 16, 64]
+match_games = 20
+tree_playouts = 5000
+parallel_workers = [1, 2, 4]
+decision_time = 100                 #Time budget per decision in milliseconds
+tree_max_nodes = 2000               #Node budget of the bounded tree
+budget_empty_cells = 5              #Empty cells of the endgames searched with a node budget
+decision_nodes = 1000               #Node budget per decision
+endgame_boards = [(4, 5), (6, 5)]
+endgame_empty_cells = 10
+endgame_playouts = 5000
+rollout_policies = ['heavy', 'centre']
+rave_playouts = [25, 40]
+rave_boards = [(4, 5), (6, 7)]
+rave_games = 100
+early_stop_playouts = 1000
+early_stop_positions = 50
+prior_playouts = [10, 20, 40, 80]
+prior_opponent_playouts = 100
+prior_target_win_rate = 0.25
+book_file = "opening_book_6x7.bin"
+book_plies = 3
+book_playouts = 2000
+Q_table_file = "Q_learn_v3.dat.gz"
+Q_table_binary_file = "Q_learn_v3.bin"
+Q_table_workers = 4
+Q_table_test_games = 50
+training_actors = [1, 2, 4]
+training_episodes = 200
+Q_table_rows = 4
+Q_table_cols = 5
+
+#########################################################
+
+def benchmark_random_games(env_class, games = 1000, height = 6, width = 7, win_streak = 4):
+    '''
+        Plays random games on an environment and measures the moves performed per second
+        Arguments:
+            env_class: environment class to be benchmarked (gameEnv or bitboardEnv)
+            games: total number of random games played
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            moves_per_sec: moves performed per second (including the action space queries)
+    '''
+    np.random.seed(0)
+    game = env_class(height=height, width=width, win_streak=win_streak)
+    moves = 0
+
+    start = time.perf_counter()
+    for g in range(games):
+        game.reset_game()
+        player = 1
+        state = 0
+        while state==0:
+            action = np.random.choice(game.get_action_space())
+            state = game.make_move(action, player)
+            player = 3 - player
+            moves+=1
+    elapsed = time.perf_counter() - start
+
+    return moves/elapsed
+
+
+def benchmark_vec_random_games(num_envs = 4096, steps = 200, height = 6, width = 7, win_streak = 4):
+    '''
+        Plays random games on a VecGameEnv and measures the games completed per minute
+        Arguments:
+            num_envs: Number of boards played simultaneously
+            steps: Number of vectorized steps performed
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            games_per_min: games completed per minute
+    '''
+    np.random.seed(0)
+    vec_game = VecGameEnv(num_envs, height=height, width=width, win_streak=win_streak)
+    games = 0
+
+    start = time.perf_counter()
+    for s in range(steps):
+        status = vec_game.step(vec_game.sample_random_actions())
+        games += np.count_nonzero(status)
+    elapsed = time.perf_counter() - start
+
+    return games/elapsed*60
+
+
+def benchmark_mcts_allocations(env_class, playouts = 200, height = 6, width = 5, win_streak = 4):
+    '''
+        Measures the allocations performed by a single MCTS decision on an empty board
+        Arguments:
+            env_class: environment class on which the game is played
+            playouts: playouts performed by the MCTS agent
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            env_copies: number of game environments created during the decision
+            peak_memory: peak memory traced during the decision (in bytes)
+    '''
+
+    class counting_env(env_class):
+        created = 0
+        def __init__(self, *args, **kwargs):
+            counting_env.created += 1
+            super().__init__(*args, **kwargs)
+
+    np.random.seed(0)
+    game = counting_env(height=height, width=width, win_streak=win_streak)
+    agent = MCTS_agent(player=1, playouts=playouts, C=1)
+    counting_env.created = 0
+
+    tracemalloc.start()
+    agent.get_next_action(game)
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return counting_env.created, peak_memory
+
+
+def play_match(agent1, agent2, game, games = 10):
+    '''
+        Plays games between two agents, the agents swap the first move after half of the games
+        Arguments:
+            agent1: first agent
+            agent2: second agent
+            game: game environment
+            games: total number of games
+        Returns:
+            wins1: wins of agent1
+            wins2: wins of agent2
+            stalemates: stalemates
+    '''
+    wins = {agent1: 0, agent2: 0}
+    stalemates = 0
+    player1_id, player2_id = agent1.player, agent2.player
+
+    for g in range(games):
+        #agent1 plays first in the first half of the games
+        first, second = (agent1, agent2) if g < games//2 else (agent2, agent1)
+        first.player, second.player = 1, 2
+
+        game.reset_game()
+        first.reset_agent()
+        second.reset_agent()
+        turn = 1
+        game_status = 0
+        while game_status == 0:
+            agent = first if turn==1 else second
+            action = agent.get_next_action(game)
+            game_status = game.make_move(action, turn)
+            first.update_agent_state(action)
+            second.update_agent_state(action)
+            turn = 3 - turn
+
+        if game_status == 1:
+            wins[first if turn==2 else second] += 1
+        else:
+            stalemates += 1
+
+    agent1.player, agent2.player = player1_id, player2_id
+    return wins[agent1], wins[agent2], stalemates
+
+
+def benchmark_mcts_playouts(env_class, playouts = 200, batch_size = 1, decisions = 5, height = 6, width = 5, win_streak = 4):
+    '''
+        Measures the playouts per second of MCTS decisions on an empty board
+        Arguments:
+            env_class: environment class on which the game is played
+            playouts: playouts performed by the MCTS agent per decision
+            batch_size: number of leaves simulated together by the MCTS agent
+            decisions: number of decisions timed
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            playouts_per_sec: playouts performed per second
+    '''
+    np.random.seed(0)
+    game = env_class(height=height, width=width, win_streak=win_streak)
+
+    start = time.perf_counter()
+    for d in range(decisions):
+        agent = MCTS_agent(player=1, playouts=playouts, C=1, batch_size=batch_size)
+        agent.get_next_action(game)
+    elapsed = time.perf_counter() - start
+
+    return playouts*decisions/elapsed
+
+
+class DictNode:
+    '''
+        Node of MCTS_agent with a __dict__ instead of __slots__, the baseline of benchmark_tree_storage
+    '''
+
+    def __init__(self, node):
+        for name in Node.__slots__:
+            setattr(self, name, getattr(node, name))
+        self.children = {action: DictNode(child) for action, child in node.children.items()}
+
+
+def benchmark_tree_storage(agent_class, playouts = 5000, selections = 5000, height = 6, width = 7, win_streak = 4, dict_nodes = False):
+    '''
+        Builds a search tree on an empty board and measures its memory and the speed of the selection step
+        Arguments:
+            agent_class: MCTS_agent (Node objects) or MCTS_array_agent (ArrayTree)
+            playouts: playouts performed to build the tree
+            selections: number of root-to-leaf selections timed on the built tree
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+            dict_nodes: if True, the Node objects of MCTS_agent are copied to DictNode objects before the measures
+        Returns:
+            nodes: number of nodes in the tree
+            bytes_per_node: memory used per node (statistics stored as small Python ints/floats are not counted)
+            selections_per_sec: root-to-leaf selections per second
+    '''
+    np.random.seed(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    agent = agent_class(player=1, playouts=playouts, C=1)
+    agent.get_next_action(game)
+    nodes = agent.size_of_tree(agent.root_node)
+    if dict_nodes:
+        agent.root_node = DictNode(agent.root_node)
+
+    if agent_class == MCTS_array_agent:
+        #Preallocated memory of the arrays, including the unused capacity
+        memory = agent.tree.nbytes()
+    else:
+        #Node objects and their children dictionaries
+        memory = 0
+        stack = [agent.root_node]
+        while stack:
+            node = stack.pop()
+            memory += sys.getsizeof(node) + sys.getsizeof(node.children)
+            if dict_nodes:
+                memory += sys.getsizeof(node.__dict__)
+            stack.extend(node.children.values())
+
+    start = time.perf_counter()
+    for s in range(selections):
+        agent.selection(agent.root_node, game)
+        game.undo_until(0)
+    elapsed = time.perf_counter() - start
+
+    return nodes, memory/nodes, selections/elapsed
+
+
+def benchmark_root_parallel(workers = 4, time_budget = 100, decisions = 10, games = 10, height = 6, width = 5, win_streak = 4):
+    '''
+        Measures the playouts per second of the root-parallel MCTS agent, and its results against a 
+        single process MCTS agent with the same time budget per decision
+        Arguments:
+            workers: number of worker processes
+            time_budget: time budget per decision in milliseconds
+            decisions: number of decisions timed on an empty board
+            games: number of games played against the single process agent
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            playouts_per_sec: playouts per second of all the workers together
+            results: (wins, losses, stalemates) against the single process agent
+    '''
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    agent = MCTS_root_parallel_agent(player=1, workers=workers, playouts=None, C=1, time_budget=time_budget)
+
+    playouts = 0
+    start = time.perf_counter()
+    for d in range(decisions):
+        agent.reset_agent()
+        agent.get_next_action(game)
+        playouts += agent.last_playouts
+    elapsed = time.perf_counter() - start
+
+    results = play_match(agent, MCTS_agent(2, playouts=None, C=1, time_budget=time_budget), game, games)
+    agent.close()
+
+    return playouts/elapsed, results
+
+
+def benchmark_tree_budget(max_nodes = 2000, playouts = 2000, games = 10, height = 6, width = 7, win_streak = 4):
+    '''
+        Plays a bounded-memory MCTS agent against an unbounded one and records the largest trees of both agents
+        Arguments:
+            max_nodes: node budget of the bounded agent
+            playouts: playouts per decision of both agents
+            games: number of games played
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            peak_nodes: (bounded, unbounded) largest number of nodes after a decision
+            peak_memory: (bounded, unbounded) largest estimated tree memory in bytes
+            results: (wins, losses, stalemates) of the bounded agent
+    '''
+    np.random.seed(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    bounded = MCTS_agent(1, playouts=playouts, max_nodes=max_nodes)
+    unbounded = MCTS_agent(2, playouts=playouts)
+
+    peak_nodes = [0, 0]
+    peak_memory = [0, 0]
+    for agent_id, agent in enumerate((bounded, unbounded)):
+        #Records the tree after every decision of the agent
+        def get_next_action(game_env, agent=agent, agent_id=agent_id, search=agent.get_next_action):
+            action = search(game_env)
+            peak_nodes[agent_id] = max(peak_nodes[agent_id], agent.size_of_tree(agent.root_node))
+            peak_memory[agent_id] = max(peak_memory[agent_id], agent.memory_usage())
+            return action
+        agent.get_next_action = get_next_action
+
+    results = play_match(bounded, unbounded, game, games)
+    return tuple(peak_nodes), tuple(peak_memory), results
+
+
+def benchmark_node_budget_endgames(positions = 20, empty_cells = 5, node_budget = 1000, height = 4, width = 5, win_streak = 4):
+    '''
+        Searches endgames whose tree is smaller than the node budget with node-budgeted agents (without a playout
+        or time budget), to check that the searches end once the tree is fully expanded
+        Arguments:
+            positions: number of random endgame positions
+            empty_cells: number of empty cells of the positions
+            node_budget: node budget per decision
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            stats: dictionary agent name -> (average playouts per decision, longest decision in seconds)
+    '''
+    agents = {'MCTS': lambda player: MCTS_agent(player, playouts=None, node_budget=node_budget),
+              'MCTS-Solver': lambda player: MCTS_agent(player, playouts=None, node_budget=node_budget, solver=True),
+              'MCTS batch size 16': lambda player: MCTS_agent(player, playouts=None, node_budget=node_budget, batch_size=16),
+              'Threaded MCTS': lambda player: MCTS_threaded_agent(player, threads=4, playouts=None, node_budget=node_budget)}
+
+    stats = {}
+    for name, make_agent in agents.items():
+        rng = np.random.default_rng(0)
+        game = gameEnv(height=height, width=width, win_streak=win_streak)
+        playouts = []
+        longest = 0
+        while len(playouts) < positions:
+            player = random_position(game, empty_cells, rng)
+            if player is None:
+                continue
+            agent = make_agent(player)
+            agent.first_move = True
+            start = time.perf_counter()
+            agent.get_next_action(game)
+            longest = max(longest, time.perf_counter() - start)
+            playouts.append(agent.last_playouts)
+        stats[name] = (np.mean(playouts), longest)
+    return stats
+
+
+def benchmark_rollout_policy(rollout_policy, time_budget = 100, games = 20, height = 6, width = 7, win_streak = 4):
+    '''
+        Measures the playouts per second of an MCTS agent with a rollout policy, and its results against 
+        an MCTS agent with random rollouts with the same time budget per decision
+        Arguments:
+            rollout_policy: rollout policy of the MCTS agent ('heavy' or 'centre')
+            time_budget: time budget per decision in milliseconds
+            games: number of games played
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            playouts_per_sec: (rollout policy, random rollouts) playouts per second on the empty board
+            results: (wins, losses, stalemates) against the agent with random rollouts
+    '''
+    np.random.seed(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    agents = [MCTS_agent(1, playouts=None, time_budget=time_budget, rollout_policy=rollout_policy),
+              MCTS_agent(2, playouts=None, time_budget=time_budget)]
+
+    playouts_per_sec = []
+    for agent in agents:
+        agent.get_next_action(game)
+        playouts_per_sec.append(agent.last_playouts*1000/time_budget)
+        agent.reset_agent()
+
+    results = play_match(agents[0], agents[1], game, games)
+    return tuple(playouts_per_sec), results
+
+
+def benchmark_rave(playouts = 40, games = 100, height = 6, width = 7, win_streak = 4):
+    '''
+        Plays an MCTS agent with RAVE against a plain UCB1 MCTS agent with the same number of playouts
+        Arguments:
+            playouts: playouts per decision of both agents
+            games: number of games played
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            results: (wins, losses, stalemates) of the RAVE agent
+    '''
+    np.random.seed(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    return play_match(MCTS_agent(1, playouts=playouts, rave=True), MCTS_agent(2, playouts=playouts), game, games)
+
+
+def benchmark_early_stopping(playouts = 1000, positions = 50, stop_confidence = None, height = 6, width = 7, win_streak = 4):
+    '''
+        Searches random positions with and without early stopping, from the same random state
+        Arguments:
+            playouts: playout budget per decision
+            positions: number of positions searched
+            stop_confidence: confidence of the optional confidence-based criterion (None: only the visit criterion)
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            decision_time: (early stopping, full budget) average decision time in seconds
+            playouts_saved: average playouts saved per decision
+            same_moves: number of positions where both searches chose the same move
+    '''
+    rng = np.random.default_rng(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+
+    decision_time = [0, 0]
+    playouts_saved = 0
+    same_moves = 0
+    p = 0
+    while p < positions:
+        empty_cells = rng.integers(height*width//2, height*width)
+        player = random_position(game, empty_cells, rng)
+        if player is None:
+            continue
+        p += 1
+
+        actions = []
+        for i, agent in enumerate((MCTS_agent(player, playouts=playouts, early_stop=True, stop_confidence=stop_confidence),
+                                   MCTS_agent(player, playouts=playouts))):
+            agent.first_move = True
+            np.random.seed(p)
+            start = time.perf_counter()
+            actions.append(agent.get_next_action(game))
+            decision_time[i] += time.perf_counter() - start
+            if i == 0:
+                playouts_saved += agent.playouts_saved
+        same_moves += actions[0] == actions[1]
+
+    return (decision_time[0]/positions, decision_time[1]/positions), playouts_saved/positions, same_moves
+
+
+def benchmark_priors(filename, playouts = [10, 20, 40, 80], opponent_playouts = 100, target_win_rate = 0.25, games = 60, height = 4, width = 5, win_streak = 4):
+    '''
+        Plays MCTS agents with and without Q-table priors (PUCT) against a stronger MCTS agent, and finds 
+        the playouts needed to reach a target win rate
+        Arguments:
+            filename: file name of the Q-table in the directory Q_learn_dat
+            playouts: playouts per decision of the agents that are compared
+            opponent_playouts: playouts per decision of the opponent
+            target_win_rate: target win rate against the opponent
+            games: number of games played for every number of playouts
+            height: Number of rows of the board the Q-table was trained on
+            width: Number of columns of the board the Q-table was trained on
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            win_rates: (without priors, with priors) lists of the win rates for every number of playouts
+            needed: (without priors, with priors) smallest number of playouts that reaches the target (None if not reached)
+    '''
+    prior_agent = Q_learn_agent(player=2)
+    prior_agent.load_Q_table(filename)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+
+    win_rates = ([], [])
+    for p in playouts:
+        for i, agent_args in enumerate(({}, {'prior_agent': prior_agent})):
+            np.random.seed(0)
+            wins, losses, stalemates = play_match(MCTS_agent(1, playouts=p, **agent_args), MCTS_agent(2, playouts=opponent_playouts), game, games)
+            win_rates[i].append(wins/games)
+
+    needed = tuple(next((p for p,rate in zip(playouts, rates) if rate >= target_win_rate), None) for rates in win_rates)
+    return win_rates, needed
+
+
+def benchmark_opening_book(filename, playouts = 200, games = 20, height = 6, width = 7, win_streak = 4):
+    '''
+        Measures the time needed to open an opening book, and plays an MCTS agent warm-started from the book
+        against an MCTS agent without it
+        Arguments:
+            filename: file name of the opening book
+            playouts: playouts per decision of both agents
+            games: number of games played
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            open_time: time needed to open the book in seconds
+            positions: number of positions in the book
+            results: (wins, losses, stalemates) of the agent with the book
+    '''
+    start = time.perf_counter()
+    book = OpeningBook(filename)
+    open_time = time.perf_counter() - start
+
+    np.random.seed(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    results = play_match(MCTS_agent(1, playouts=playouts, opening_book=book), MCTS_agent(2, playouts=playouts), game, games)
+    return open_time, book.n, results
+
+
+def random_position(game, empty_cells, rng):
+    '''
+        Plays random moves on an empty board until only 'empty_cells' cells are left
+        Arguments:
+            game: game environment, it is reset
+            empty_cells: number of empty cells of the position
+            rng: random number generator
+        Returns:
+            player: player id of the player to move, None if the game ended before the position was reached
+    '''
+    game.reset_game()
+    player = 1
+    while game.moves < game.h*game.w - empty_cells:
+        if game.make_move(rng.choice(game.get_action_space()), player) != 0:
+            return None
+        player = 3 - player
+    return player
+
+
+def benchmark_solver_endgames(positions = 20, empty_cells = 10, playouts = 5000, height = 4, width = 5, win_streak = 4):
+    '''
+        Searches random endgame positions with MCTS-Solver and with plain MCTS
+        Arguments:
+            positions: number of endgame positions
+            empty_cells: number of empty cells of the positions
+            playouts: maximum number of playouts per position
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            solved: number of positions solved by MCTS-Solver
+            solver_playouts: average playouts of MCTS-Solver on the solved positions
+            blunders: number of positions where plain MCTS chose a move proven to lose by MCTS-Solver, while another move did not lose
+    '''
+    rng = np.random.default_rng(0)
+    np.random.seed(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+
+    solved = 0
+    solver_playouts = 0
+    blunders = 0
+    p = 0
+    while p < positions:
+        player = random_position(game, empty_cells, rng)
+        if player is None:
+            continue
+        p += 1
+
+        agents = [MCTS_agent(player, playouts=playouts, solver=True), MCTS_agent(player, playouts=playouts)]
+        actions = []
+        for agent in agents:
+            #Endgame positions are reached in the middle of a game, the search depth is not limited
+            agent.first_move = True
+            actions.append(agent.get_next_action(game))
+
+        solver = agents[0]
+        if solver.root_node.proven != 0:
+            solved += 1
+            solver_playouts += solver.last_playouts
+        #A proven losing move is a blunder unless all the moves lose
+        child = solver.root_node.children.get(actions[1])
+        if (child is not None) and (child.proven == -1) and (solver.root_node.proven != 1):
+            blunders += 1
+
+    return solved, solver_playouts/max(solved, 1), blunders
+
+
+def Q_table_memory(Q_table):
+    '''
+        Estimates the memory used by a dictionary Q-table (dictionary, keys and values) in bytes
+    '''
+    return sys.getsizeof(Q_table) + sum(sys.getsizeof(k) + sys.getsizeof(v) for k,v in Q_table.items())
+
+
+def benchmark_Q_table_backends(filename, lookups = 200000):
+    '''
+        Compares the memory and the lookup rate of the dictionary Q-table and the HashQTable
+        Arguments:
+            filename: file name of the Q-table in the directory Q_learn_dat
+            lookups: number of keys looked up (half of them stored in the table, half missing)
+        Returns:
+            stats: dictionary backend name -> (memory in bytes, scalar lookups/sec, batched lookups/sec)
+                   (batched lookups are only measured for the HashQTable)
+    '''
+    agent = Q_learn_agent(player=2)
+    agent.load_Q_table(filename)
+    tables = {'dict': agent.Q_table, 'HashQTable': HashQTable.from_dict(agent.Q_table)}
+
+    rng = np.random.default_rng(0)
+    stored = np.array(list(agent.Q_table.keys()), dtype=np.uint64)
+    missing = stored[rng.integers(len(stored), size=lookups//2)] | np.uint64(1 << 62)
+    keys = np.concatenate((stored[rng.integers(len(stored), size=lookups - lookups//2)], missing))
+    rng.shuffle(keys)
+    key_list = keys.tolist()
+
+    stats = {}
+    for name, table in tables.items():
+        memory = Q_table_memory(table) if name == 'dict' else table.nbytes()
+
+        start = time.perf_counter()
+        for key in key_list:
+            table.get(key, 0)
+        scalar_rate = lookups/(time.perf_counter() - start)
+
+        batched_rate = None
+        if name == 'HashQTable':
+            start = time.perf_counter()
+            table.get_many(keys)
+            batched_rate = lookups/(time.perf_counter() - start)
+        stats[name] = (memory, scalar_rate, batched_rate)
+
+    return stats
+
+
+def process_memory():
+    '''
+        Returns the resident and the peak resident memory of the current process in bytes (read from /proc, Linux only)
+    '''
+    memory = {}
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith(('VmRSS:', 'VmHWM:')):
+                name, value, unit = line.split()
+                memory[name] = int(value)*1024
+    return memory['VmRSS:'], memory['VmHWM:']
+
+
+def Q_table_startup_worker(filename, lookups):
+    '''
+        Loads a Q-table in a fresh process and answers a few lookups, used by benchmark_Q_table_startup
+        Arguments:
+            filename: file name of the Q-table in the directory Q_learn_dat
+            lookups: number of random boards looked up after the load
+        Returns:
+            load_time: time to load the Q-table in seconds
+            lookup_time: time of the lookups in seconds
+            rss: resident memory added by the load and the lookups in bytes
+            peak: peak resident memory added by the load and the lookups in bytes
+    '''
+    rss_before, peak_before = process_memory()
+    agent = Q_learn_agent(player=2)
+    start = time.perf_counter()
+    agent.load_Q_table(filename)
+    load_time = time.perf_counter() - start
+
+    np.random.seed(0)
+    game = gameEnv(height=Q_table_rows, width=Q_table_cols, win_streak=win_streak)
+    start = time.perf_counter()
+    for i in range(lookups):
+        if game.moves == 0 or np.random.rand() < 0.1:
+            game.reset_game()
+        action_space = game.get_action_space()
+        agent.get_action_value(game, np.random.choice(action_space))
+        if game.make_move(np.random.choice(action_space), 1 + game.moves%2) != 0:
+            game.reset_game()
+    lookup_time = time.perf_counter() - start
+
+    rss_after, peak_after = process_memory()
+    return load_time, lookup_time, rss_after - rss_before, peak_after - peak_before
+
+
+def benchmark_Q_table_startup(filenames, lookups = 1000):
+    '''
+        Compares the startup cost of the Q-table files: every file is loaded in a new process,
+        so that the resident memory is measured without the tables loaded before
+        Arguments:
+            filenames: file names of the Q-tables in the directory Q_learn_dat (.dat.gz or .bin)
+            lookups: number of random boards looked up after the load
+        Returns:
+            stats: dictionary file name -> (load time, lookup time, resident memory, peak resident memory)
+    '''
+    stats = {}
+    ctx = mp.get_context('spawn')
+    for filename in filenames:
+        with ctx.Pool(1) as pool:
+            stats[filename] = pool.apply(Q_table_startup_worker, (filename, lookups))
+    return stats
+
+
+def private_memory():
+    '''
+        Returns the private dirty resident memory of the current process in bytes (read from /proc, Linux only).
+        Pages inherited from a forked parent become private dirty pages when they are copied on write,
+        clean pages of a read-only file map are not counted
+    '''
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            if line.startswith('Private_Dirty:'):
+                return int(line.split()[1])*1024
+    return 0
+
+
+#Frozen agent inherited by the forked workers of benchmark_shared_Q_table
+shared_agent = None
+
+def shared_Q_table_worker(games):
+    '''
+        Plays evaluation games with the frozen agent inherited from the parent process, used by benchmark_shared_Q_table
+        Returns:
+            copied: private memory added while playing in bytes (pages of the parent copied on write)
+            size: size of the Q-table after the games
+            hits: Q-table lookups that found the after-state
+            misses: Q-table lookups that did not find the after-state
+    '''
+    np.random.seed(os.getpid())
+    before = private_memory()
+    game = gameEnv(height=Q_table_rows, width=Q_table_cols, win_streak=win_streak)
+    shared_agent.test(games, MCTS_agent(player=1, playouts=25), game)
+    hits, misses = shared_agent.get_lookup_stats()
+    return private_memory() - before, shared_agent.get_Q_table_size(), hits, misses
+
+
+def benchmark_shared_Q_table(filenames, workers = 4, games = 50):
+    '''
+        Loads every Q-table file in a frozen agent, forks worker processes that play evaluation games
+        against MCTS_25 with it, and measures how much of the table the workers copy on write
+        Arguments:
+            filenames: file names of the Q-tables in the directory Q_learn_dat (.dat.gz or .bin)
+            workers: number of forked worker processes
+            games: evaluation games of every worker
+        Returns:
+            stats: dictionary file name -> (initial Q-table size, list of the worker results of shared_Q_table_worker)
+    '''
+    global shared_agent
+    stats = {}
+    ctx = mp.get_context('fork')
+    for filename in filenames:
+        shared_agent = Q_learn_agent(player=2, frozen=True)
+        shared_agent.load_Q_table(filename)
+        size = shared_agent.get_Q_table_size()
+        with ctx.Pool(workers) as pool:
+            stats[filename] = (size, pool.map(shared_Q_table_worker, [games]*workers))
+        shared_agent = None
+    return stats
+
+
+def benchmark_parallel_training(actors = [1, 2, 4], episodes = 200, height = 4, width = 5, win_streak = 4):
+    '''
+        Compares the episodes per hour of the sequential Q_learn_agent.train and of train_parallel,
+        both against MCTS adversaries with 0 to 25 playouts that change every 10 episodes
+        Arguments:
+            actors: numbers of actor processes of train_parallel
+            episodes: training episodes of every run
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            sequential_rate: episodes per hour of the sequential training
+            parallel_rates: episodes per hour of train_parallel for every number of actors
+    '''
+    np.random.seed(0)
+    Q_agent = Q_learn_agent(player=2)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    start = time.perf_counter()
+    for e in range(episodes//10):
+        Q_agent.train(epoch=10, agent=MCTS_agent(playouts=np.random.randint(0, 26), player=1, C=1), game=game)
+    sequential_rate = episodes/(time.perf_counter() - start)*3600
+
+    parallel_rates = []
+    for n in actors:
+        outcomes, episodes_per_hour = train_parallel(Q_learn_agent(player=2), episodes, n, height, width, win_streak, sync_episodes=50)
+        parallel_rates.append(episodes_per_hour)
+    return sequential_rate, parallel_rates
+
+
+def benchmark_afterstate_evaluation(filename, binary_filename, positions = 3000, height = 4, width = 5, win_streak = 4):
+    '''
+        Compares the greedy action selection of Q_learn_agent with one get_Qvalue call per action
+        (every call performs and undoes the move) and with the batched get_best_action
+        Arguments:
+            filename: file name of the Q-table in the directory Q_learn_dat
+            binary_filename: file name of the same Q-table in the binary format
+            positions: number of random positions with player 2 to move
+            height: Number of rows in the Connect 4 board
+            width: Number of columns in the Connect 4 board
+            win_streak: Continuous number of beads that is considered a victory in the game
+        Returns:
+            stats: dictionary Q-table class name -> (time per decision of the loop, time per decision batched, same actions)
+    '''
+    agent = Q_learn_agent(player=2, frozen=True)
+    agent.load_Q_table(filename)
+    tables = {'dict': agent.Q_table, 'HashQTable': HashQTable.from_dict(agent.Q_table),
+              'MmapQTable': MmapQTable(os.path.join(Q_TABLE_DIR, binary_filename))}
+
+    rng = np.random.default_rng(0)
+    games = []
+    while len(games) < positions:
+        game = gameEnv(height=height, width=width, win_streak=win_streak)
+        player = 1
+        while game.make_move(rng.choice(game.get_action_space()), player) == 0:
+            player = 3 - player
+            if player == 2:
+                games.append(gameEnv(env_copy=game))
+    games = games[:positions]
+
+    stats = {}
+    for name, table in tables.items():
+        agent.Q_table = table
+        start = time.perf_counter()
+        loop_actions = []
+        for game in games:
+            Q_values = [agent.get_Qvalue(game, a, 2) for a in game.get_action_space()]
+            loop_actions.append(game.get_action_space()[int(np.argmax(Q_values))])
+        loop_time = (time.perf_counter() - start)/len(games)
+
+        start = time.perf_counter()
+        batched_actions = [agent.get_best_action(game, 2)[0] for game in games]
+        batched_time = (time.perf_counter() - start)/len(games)
+        stats[name] = (loop_time, batched_time, sum(a == b for a, b in zip(loop_actions, batched_actions)))
+
+    return stats
+
+
+def benchmark_Q_table_symmetry(filename, height = 4, width = 5):
+    '''
+        Compares the size of a Q-table before and after merging the mirrored boards
+        Arguments:
+            filename: file name of the Q-table in the directory Q_learn_dat
+            height: Number of rows of the board the Q-table was trained on
+            width: Number of columns of the board the Q-table was trained on
+        Returns:
+            sizes: (entries, memory in bytes) of the Q-table before and after canonicalization
+    '''
+    agent = Q_learn_agent(player=2)
+    agent.load_Q_table(filename)
+    before = (agent.get_Q_table_size(), Q_table_memory(agent.Q_table))
+
+    agent.canonicalize_Q_table(height, width)
+    after = (agent.get_Q_table_size(), Q_table_memory(agent.Q_table))
+
+    return before, after
+
+
+if __name__=='__main__':
+
+    for env_class in (gameEnv, bitboardEnv):
+        moves_per_sec = benchmark_random_games(env_class, random_games, board_rows, board_cols, win_streak)
+        print(f"{env_class.__name__}: {moves_per_sec:.0f} moves/sec")
+
+    games_per_min = benchmark_vec_random_games(vec_envs, 200, board_rows, board_cols, win_streak)
+    print(f"VecGameEnv with {vec_envs} boards: {games_per_min:.0f} random games/min")
+
+    for env_class in (gameEnv, bitboardEnv):
+        env_copies, peak = benchmark_mcts_allocations(env_class, mcts_playouts)
+        print(f"MCTS_{mcts_playouts} decision on {env_class.__name__}: {env_copies} environment copies, peak traced memory {peak/1024:.1f} KiB")
+
+    for batch_size in mcts_batch_sizes:
+        playouts_per_sec = benchmark_mcts_playouts(gameEnv, 1024, batch_size, 2)
+        print(f"MCTS_1024 with batch size {batch_size}: {playouts_per_sec:.0f} playouts/sec")
+
+    game = gameEnv(height=6, width=5, win_streak=win_streak)
+    wins1, wins2, stalemates = play_match(MCTS_agent(1, playouts=200, batch_size=16), MCTS_agent(2, playouts=200), game, match_games)
+    print(f"MCTS_200 batch size 16 vs MCTS_200: {wins1} wins, {wins2} losses, {stalemates} stalemates")
+
+    wins1, wins2, stalemates = play_match(MCTS_agent(1, playouts=200, transpositions=True), MCTS_agent(2, playouts=200), game, match_games)
+    print(f"MCTS_200 with transpositions vs MCTS_200: {wins1} wins, {wins2} losses, {stalemates} stalemates")
+
+    for workers in parallel_workers:
+        playouts_per_sec, (wins, losses, stalemates) = benchmark_root_parallel(workers, decision_time, 10, match_games)
+        print(f"Root-parallel MCTS with {workers} workers: {playouts_per_sec:.0f} playouts/sec, {wins} wins, {losses} losses, {stalemates} stalemates against single process MCTS ({decision_time} ms/move)")
+
+    for agent_class in (MCTS_agent, MCTS_array_agent):
+        nodes, bytes_per_node, selections_per_sec = benchmark_tree_storage(agent_class, tree_playouts)
+        print(f"{agent_class.__name__} tree: {nodes} nodes, {bytes_per_node:.0f} bytes/node, {selections_per_sec:.0f} selections/sec")
+    nodes, bytes_per_node, selections_per_sec = benchmark_tree_storage(MCTS_agent, tree_playouts, dict_nodes=True)
+    print(f"MCTS_agent tree with __dict__ nodes: {nodes} nodes, {bytes_per_node:.0f} bytes/node, {selections_per_sec:.0f} selections/sec")
+
+    peak_nodes, peak_memory, (wins, losses, stalemates) = benchmark_tree_budget(tree_max_nodes, 2000, match_games, board_rows, board_cols, win_streak)
+    print(f"MCTS_2000 with at most {tree_max_nodes} nodes: peak {peak_nodes[0]} nodes ({peak_memory[0]/1024:.0f} KiB) vs {peak_nodes[1]} nodes ({peak_memory[1]/1024:.0f} KiB) unbounded, {wins} wins, {losses} losses, {stalemates} stalemates")
+
+    for name, (playouts, longest) in benchmark_node_budget_endgames(match_games, budget_empty_cells, decision_nodes, 4, 5, win_streak).items():
+        print(f"{name} with a budget of {decision_nodes} nodes on 4x5 endgames with {budget_empty_cells} empty cells: {playouts:.0f} playouts per decision, longest decision {longest*1000:.0f} ms")
+
+    for rows, cols in endgame_boards:
+        solved, solver_playouts, blunders = benchmark_solver_endgames(match_games, endgame_empty_cells, endgame_playouts, rows, cols, win_streak)
+        print(f"{rows}x{cols} endgames with {endgame_empty_cells} empty cells: MCTS-Solver solved {solved}/{match_games} with {solver_playouts:.0f} playouts on average, MCTS_{endgame_playouts} chose a proven loss in {blunders}")
+
+    for rollout_policy in rollout_policies:
+        playouts_per_sec, (wins, losses, stalemates) = benchmark_rollout_policy(rollout_policy, decision_time, match_games, board_rows, board_cols, win_streak)
+        print(f"MCTS with {rollout_policy} rollouts ({playouts_per_sec[0]:.0f} playouts/sec) vs random rollouts ({playouts_per_sec[1]:.0f} playouts/sec): {wins} wins, {losses} losses, {stalemates} stalemates ({decision_time} ms/move)")
+
+    for rows, cols in rave_boards:
+        for playouts in rave_playouts:
+            wins, losses, stalemates = benchmark_rave(playouts, rave_games, rows, cols, win_streak)
+            print(f"{rows}x{cols} MCTS_{playouts} with RAVE vs MCTS_{playouts}: {wins} wins, {losses} losses, {stalemates} stalemates")
+
+    for stop_confidence in (None, 0.95):
+        decision_time, playouts_saved, same_moves = benchmark_early_stopping(early_stop_playouts, early_stop_positions, stop_confidence, board_rows, board_cols, win_streak)
+        print(f"MCTS_{early_stop_playouts} early stopping (confidence {stop_confidence}): {decision_time[0]*1000:.0f} ms vs {decision_time[1]*1000:.0f} ms per decision, {playouts_saved:.0f} playouts saved, same move in {same_moves}/{early_stop_positions} positions")
+
+    win_rates, needed = benchmark_priors(Q_table_file, prior_playouts, prior_opponent_playouts, prior_target_win_rate, match_games, Q_table_rows, Q_table_cols, win_streak)
+    for p, rate, prior_rate in zip(prior_playouts, win_rates[0], win_rates[1]):
+        print(f"MCTS_{p} vs MCTS_{prior_opponent_playouts}: win rate {rate:.2f} without priors, {prior_rate:.2f} with {Q_table_file} priors")
+    print(f"Playouts needed for a {prior_target_win_rate:.2f} win rate: {needed[0]} without priors, {needed[1]} with priors")
+
+    if not os.path.exists(book_file):
+        build_opening_book(book_file, board_rows, board_cols, win_streak, book_plies, book_playouts)
+    open_time, positions, (wins, losses, stalemates) = benchmark_opening_book(book_file, mcts_playouts, match_games, board_rows, board_cols, win_streak)
+    print(f"{book_file}: {positions} positions opened in {open_time*1000:.2f} ms, MCTS_{mcts_playouts} with the book vs MCTS_{mcts_playouts}: {wins} wins, {losses} losses, {stalemates} stalemates")
+
+    for name, (memory, scalar_rate, batched_rate) in benchmark_Q_table_backends(Q_table_file).items():
+        batched = f", {batched_rate:.0f} batched lookups/sec" if batched_rate is not None else ""
+        print(f"{Q_table_file} as {name}: {memory/2**20:.1f} MiB, {scalar_rate:.0f} lookups/sec{batched}")
+
+    if not os.path.exists(os.path.join(Q_TABLE_DIR, Q_table_binary_file)):
+        convert_Q_table_to_binary(Q_table_file, Q_table_binary_file)
+    for filename, (load_time, lookup_time, rss, peak) in benchmark_Q_table_startup([Q_table_file, Q_table_binary_file]).items():
+        print(f"{filename}: loaded in {load_time*1000:.1f} ms, 1000 lookups in {lookup_time*1000:.1f} ms, resident memory +{rss/2**20:.1f} MiB (peak +{peak/2**20:.1f} MiB)")
+
+    for filename, (size, results) in benchmark_shared_Q_table([Q_table_file, Q_table_binary_file], Q_table_workers, Q_table_test_games).items():
+        copied = sum(result[0] for result in results)/len(results)
+        hits = sum(result[2] for result in results)
+        misses = sum(result[3] for result in results)
+        sizes = set(result[1] for result in results)
+        print(f"{filename} shared by {Q_table_workers} forked workers: {copied/2**20:.1f} MiB copied on write per worker, Q-table size {size} -> {sizes}, {hits} lookup hits, {misses} misses")
+
+    sequential_rate, parallel_rates = benchmark_parallel_training(training_actors, training_episodes, Q_table_rows, Q_table_cols, win_streak)
+    print(f"Q-learning training: {sequential_rate:.0f} episodes/hour sequential, " + ", ".join(f"{rate:.0f} with {n} actors" for n, rate in zip(training_actors, parallel_rates)) + f" ({os.cpu_count()} CPUs)")
+
+    for name, (loop_time, batched_time, same) in benchmark_afterstate_evaluation(Q_table_file, Q_table_binary_file, 3000, Q_table_rows, Q_table_cols, win_streak).items():
+        print(f"Greedy action with {name} Q-table: {loop_time*1e6:.1f} us per decision with a lookup per action, {batched_time*1e6:.1f} us batched, same action in {same}/3000 positions")
+
+    before, after = benchmark_Q_table_symmetry(Q_table_file, Q_table_rows, Q_table_cols)
+    print(f"{Q_table_file}: {before[0]} entries ({before[1]/2**20:.1f} MiB) -> {after[0]} canonical entries ({after[1]/2**20:.1f} MiB)")
@@ -0,0 +1,154 @@
+'''
+    Tests of the MCTS agents: search budgets, pondering, rollout policies, RAVE and early stopping
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv
+from MCTS import MCTS_agent
+from MCTS_parallel import MCTS_threaded_agent
+
+def endgame(empty_cells, seed):
+    '''
+        Returns a random 4x5 position with 'empty_cells' empty cells and the player to move
+    '''
+    rng = np.random.default_rng(seed)
+    game = gameEnv(height=4, width=5, win_streak=4)
+    while True:
+        game.reset_game()
+        player = 1
+        while (game.moves < 20 - empty_cells) and game.make_move(int(rng.choice(game.get_action_space())), player) == 0:
+            player = 3 - player
+        if game.moves == 20 - empty_cells:
+            return game, player
+
+
+@pytest.mark.parametrize("agent_args", [{}, {'solver': True}, {'batch_size': 16}, {'threads': 2}])
+def test_node_budget_ends_on_exhausted_endgames(agent_args):
+    #The trees of the endgames have less nodes than the node budget
+    for seed in range(5):
+        game, player = endgame(5, seed)
+        if 'threads' in agent_args:
+            agent = MCTS_threaded_agent(player, playouts=None, node_budget=1000, **agent_args)
+        else:
+            agent = MCTS_agent(player, playouts=None, node_budget=1000, **agent_args)
+        agent.first_move = True
+        assert agent.get_next_action(game) in game.get_action_space()
+        assert agent.last_playouts <= 1000 + 16
+
+
+def ponder_after_move(agent, game, player):
+    '''
+        Lets the agent move, plays the answer of the opponent on its tree, and returns the pondering thread
+    '''
+    action = int(agent.get_next_action(game))
+    game.make_move(action, player)
+    agent.update_agent_state(action)
+    return agent.ponder_thread
+
+
+def test_pondering_is_capped():
+    game = gameEnv(height=6, width=7, win_streak=4)
+    np.random.seed(0)
+    agent = MCTS_agent(1, playouts=50, ponder=True, ponder_nodes=2000)
+    thread = ponder_after_move(agent, game, 1)
+    assert thread is not None
+    thread.join(timeout=30)
+    #The thread stopped by itself once the tree reached ponder_nodes nodes
+    assert not thread.is_alive()
+    assert agent.ponder_playouts > 0
+    assert agent.root_node.size >= 2000
+
+    agent.stop_pondering()
+    assert agent.ponder_thread is None
+
+
+@pytest.mark.parametrize("solver", [False, True])
+def test_pondering_stops_on_exhausted_endgames(solver):
+    #The tree of the endgame is fully expanded, or its root node is solved, long before ponder_nodes nodes
+    for seed in range(5):
+        game, player = endgame(3, seed)
+        np.random.seed(seed)
+        agent = MCTS_agent(player, playouts=20, ponder=True, solver=solver)
+        agent.first_move = True
+        thread = ponder_after_move(agent, game, player)
+        if thread is None:
+            continue
+        thread.join(timeout=30)
+        assert not thread.is_alive()
+        assert agent.root_node.size < 100
+        agent.stop_pondering()
+
+
+def threats():
+    '''
+        Returns a 6x7 board where player 1 wins in column 4 and player 2 wins in column 7
+    '''
+    game = gameEnv(height=6, width=7, win_streak=4)
+    for action in (1, 7, 2, 7, 3, 7):
+        game.make_move(action, 1 + game.moves%2)
+    return game
+
+
+@pytest.mark.parametrize("rollout_policy", ['heavy', 'centre'])
+def test_heavy_rollout_plays_wins_then_blocks(rollout_policy):
+    agent = MCTS_agent(1, rollout_policy=rollout_policy)
+    game = threats()
+    for i in range(20):
+        assert agent.rollout_action(game, 1) == 4
+        assert agent.rollout_action(game, 2) == 7
+
+    #Player 2 has no immediate win, it blocks the win of player 1
+    game.undo_move()
+    for i in range(20):
+        assert agent.rollout_action(game, 2) == 4
+
+    game.reset_game()
+    assert all(agent.rollout_action(game, 1) in game.get_action_space() for i in range(20))
+
+
+def test_rave_updates_amaf_statistics():
+    game = gameEnv(height=6, width=7, win_streak=4)
+    np.random.seed(0)
+    agent = MCTS_agent(1, playouts=200, rave=True)
+    for i in range(6):
+        action = agent.get_next_action(game)
+        assert action in game.get_action_space()
+        children = agent.root_node.children.values()
+        #A child gets an AMAF trial from its own playouts, and from the playouts where its action is played later
+        assert all(child.amaf_trials >= child.total_trials for child in children)
+        assert sum(child.amaf_trials for child in children) > sum(child.total_trials for child in children)
+        assert all(abs(child.amaf_reward) <= child.amaf_trials for child in children)
+        game.make_move(action, 1 + i%2)
+        agent.update_agent_state(action)
+
+    #The AMAF statistics are only collected with RAVE
+    agent = MCTS_agent(1, playouts=50)
+    agent.get_next_action(game)
+    assert all(child.amaf_trials == 0 for child in agent.root_node.children.values())
+
+
+def test_early_stop_chooses_same_move():
+    rng = np.random.default_rng(4)
+    playouts_saved = 0
+    for p in range(10):
+        game = gameEnv(height=6, width=7, win_streak=4)
+        player = 1
+        for i in range(int(rng.integers(0, 10))):
+            if game.make_move(int(rng.choice(game.get_action_space())), player) != 0:
+                game.undo_move()
+                break
+            player = 3 - player
+
+        #Both searches start from the same random state
+        early_agent = MCTS_agent(player, playouts=300, early_stop=True)
+        agent = MCTS_agent(player, playouts=300)
+        actions = []
+        for a in (early_agent, agent):
+            a.first_move = True
+            np.random.seed(p)
+            actions.append(a.get_next_action(game))
+        assert actions[0] == actions[1]
+        assert early_agent.last_playouts + early_agent.playouts_saved == 300
+        playouts_saved += early_agent.playouts_saved
+    assert playouts_saved > 0
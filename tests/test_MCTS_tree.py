@@ -0,0 +1,86 @@
+'''
+    Tests of the array-backed MCTS tree against MCTS_agent
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv
+from MCTS import MCTS_agent
+from MCTS_tree import MCTS_array_agent
+
+def play_game(agent1, agent2, game):
+    '''
+        Plays one game and returns the actions played
+    '''
+    game.reset_game()
+    agents = {1: agent1, 2: agent2}
+    player = 1
+    actions = []
+    while True:
+        action = int(agents[player].get_next_action(game))
+        actions.append(action)
+        status = game.make_move(action, player)
+        agent1.update_agent_state(action)
+        agent2.update_agent_state(action)
+        if status != 0:
+            return actions
+        player = 3 - player
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_array_agent_plays_same_games(seed):
+    game = gameEnv(height=6, width=5, win_streak=4)
+    np.random.seed(seed)
+    actions = play_game(MCTS_agent(1, playouts=30), MCTS_agent(2, playouts=30), game)
+    np.random.seed(seed)
+    array_actions = play_game(MCTS_array_agent(1, playouts=30), MCTS_array_agent(2, playouts=30), game)
+    assert array_actions == actions
+
+
+def test_array_agent_action_values():
+    game = gameEnv(height=6, width=5, win_streak=4)
+    for i in range(6):
+        game.make_move(1, 1 + i%2)
+    np.random.seed(0)
+    agent = MCTS_array_agent(1, playouts=50)
+    assert agent.get_action_value(game, 2) == 0
+    agent.get_next_action(game)
+    #Column 1 is full and column 9 does not exist
+    assert agent.get_action_value(game, 1) == 0
+    assert agent.get_action_value(game, 9) == 0
+    for action in game.get_action_space():
+        assert -1 <= agent.get_action_value(game, action) <= 1
+
+
+def test_update_agent_state_compacts_tree():
+    game = gameEnv(height=6, width=7, win_streak=4)
+    np.random.seed(0)
+    agent = MCTS_array_agent(1, playouts=200)
+    player = 1
+    created = 1
+    for i in range(10):
+        size = 1 if agent.tree is None else agent.tree.size
+        action = int(agent.get_next_action(game))
+        tree = agent.tree
+        created += tree.size - size
+        child = tree.children[agent.root_node, action-1]
+        trials, reward = tree.total_trials[child], tree.reward[child]
+        subtree = agent.size_of_tree(child)
+
+        game.make_move(action, player)
+        agent.update_agent_state(action)
+        player = 3 - player
+        #Only the subtree of the new root node is kept, with its statistics
+        assert agent.root_node == 0
+        assert tree.size == subtree == agent.size_of_tree(0)
+        assert (tree.total_trials[0], tree.reward[0]) == (trials, reward)
+        assert (tree.children[:tree.size] < tree.size).all()
+    #The freed nodes are reused by the next decisions
+    assert tree.capacity() < created
+
+
+def test_array_agent_needs_playout_budget():
+    with pytest.raises(ValueError):
+        MCTS_array_agent(1, playouts=None)
+    with pytest.raises(TypeError):
+        MCTS_array_agent(1, playouts=20, node_budget=100)
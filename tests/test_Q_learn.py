@@ -0,0 +1,143 @@
+'''
+    Tests of the inference mode of Q_learn_agent, of its batched after-state evaluation and of the parallel training
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv
+from MCTS import MCTS_agent
+from Q_learn import Q_learn_agent
+from Q_learn_parallel import train_parallel
+from Q_table import HashQTable, MmapQTable, write_Q_table_file
+
+def random_positions(n, seed = 0):
+    '''
+        Returns random 4x5 positions with player 2 to move
+    '''
+    rng = np.random.default_rng(seed)
+    positions = []
+    while len(positions) < n:
+        game = gameEnv(height=4, width=5, win_streak=4)
+        player = 1
+        while game.make_move(int(rng.choice(game.get_action_space())), player) == 0:
+            player = 3 - player
+            if player == 2:
+                positions.append(gameEnv(env_copy=game))
+    return positions[:n]
+
+
+def test_frozen_agent_does_not_grow_Q_table():
+    positions = random_positions(100)
+    agent = Q_learn_agent(player=2, frozen=True)
+    for game in positions:
+        agent.get_next_action(game)
+    hits, misses = agent.get_lookup_stats()
+    assert agent.get_Q_table_size() == 0
+    assert hits == 0 and misses == sum(len(game.get_action_space()) for game in positions)
+    with pytest.raises(ValueError):
+        agent.update_Qvalue(positions[0].key, 0, [])
+
+    agent.frozen = False
+    for game in positions:
+        agent.get_next_action(game)
+    assert agent.get_Q_table_size() > 0
+
+
+def test_freeze_over_mapped_file(tmp_path):
+    filename = str(tmp_path / "frozen.bin")
+    positions = random_positions(100)
+    agent = Q_learn_agent(player=2)
+    for game in positions[:50]:
+        agent.get_next_action(game)
+    agent.freeze(filename)
+    assert isinstance(agent.Q_table, MmapQTable)
+    Q_table = dict(agent.Q_table.items())
+
+    #Another agent maps the file while the first one learns more after-states and is frozen to the same file
+    reader = Q_learn_agent(player=2, frozen=True)
+    reader.load_Q_table(filename)
+    agent.frozen = False
+    for game in positions[50:]:
+        agent.get_next_action(game)
+    agent.freeze(filename)
+
+    assert agent.frozen and agent.get_Q_table_size() > len(Q_table)
+    assert dict(reader.Q_table.items()) == Q_table
+    for game in positions:
+        assert reader.get_best_action(game, 2)[0] in game.get_action_space()
+
+
+
+@pytest.mark.parametrize("table_class", ['dict', 'HashQTable', 'MmapQTable'])
+@pytest.mark.parametrize("symmetric", [False, True])
+def test_batched_afterstate_evaluation(tmp_path, table_class, symmetric):
+    positions = random_positions(300)
+
+    #Q-values with many ties (integers in [-2, 2]) for half of the after-states, the others are missing
+    rng = np.random.default_rng(1)
+    agent = Q_learn_agent(player=2, symmetric=symmetric, frozen=True)
+    Q_table = {}
+    for game in positions:
+        for key in game.afterstate_keys(2, symmetric)[1]:
+            if rng.random() < 0.5:
+                Q_table[key] = float(rng.integers(-2, 3))
+    if table_class == 'HashQTable':
+        agent.Q_table = HashQTable.from_dict(Q_table)
+    elif table_class == 'MmapQTable':
+        write_Q_table_file(str(tmp_path / "Q_table.bin"), Q_table)
+        agent.Q_table = MmapQTable(str(tmp_path / "Q_table.bin"))
+    else:
+        agent.Q_table = Q_table
+
+    for game in positions:
+        #Loop of the per-action lookups, the first maximum is the leftmost column
+        Q_values = [agent.get_Qvalue(game, a, 2) for a in game.get_action_space()]
+        best = int(np.argmax(Q_values))
+        action, value = agent.get_best_action(game, 2)
+        assert action == game.get_action_space()[best]
+        assert value == Q_values[best]
+        assert agent.get_next_action(game) == action
+    assert agent.get_Q_table_size() == len(Q_table)
+
+
+class FailingAgent(MCTS_agent):
+    '''
+        Adversary that fails after a few moves
+    '''
+
+    def get_next_action(self, game_env):
+        if game_env.moves >= 4:
+            raise RuntimeError("adversary failed")
+        return super().get_next_action(game_env)
+
+
+def test_test_restores_frozen_flag():
+    agent = Q_learn_agent(player=2)
+    game = gameEnv(height=4, width=5, win_streak=4)
+    wins, losses, stalemates = agent.test(epoch=5, agent=MCTS_agent(1, playouts=5), game=game)
+    assert wins + losses + stalemates == 5
+    assert not agent.frozen
+    with pytest.raises(RuntimeError):
+        agent.test(epoch=5, agent=FailingAgent(1, playouts=5), game=game)
+    assert not agent.frozen
+
+
+def test_train_parallel_checkpoints(tmp_path):
+    checkpoint_file = str(tmp_path / "checkpoint.bin")
+    agent = Q_learn_agent(player=2)
+    agent.save_Q_table(checkpoint_file)
+    #The learner maps the file it checkpoints to
+    agent.load_Q_table(checkpoint_file)
+
+    outcomes, episodes_per_hour = train_parallel(agent, episodes=30, actors=2, n_max=5, batch_episodes=5,
+                                                 sync_episodes=5, checkpoint_episodes=10, checkpoint_file=checkpoint_file)
+    assert len(outcomes) == 30
+    assert set(outcomes) <= {-1, 0, 1}
+    assert episodes_per_hour > 0
+    assert agent.get_Q_table_size() > 0
+
+    #The last checkpoint holds the final Q-table, and no snapshot or temporary file is left
+    checkpoint = Q_learn_agent(player=2)
+    checkpoint.load_Q_table(checkpoint_file)
+    assert dict(checkpoint.Q_table.items()) == dict(agent.Q_table.items())
+    assert [f.name for f in tmp_path.iterdir()] == ["checkpoint.bin"]
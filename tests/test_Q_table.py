@@ -0,0 +1,140 @@
+'''
+    Tests of the Q-table backends (HashQTable, MmapQTable) against the dictionary Q-table, and of the binary Q-table files
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv
+from Q_learn import Q_learn_agent
+from Q_table import HashQTable, MmapQTable, write_Q_table_file, check_board_size
+
+def random_Q_table(n, seed = 0):
+    '''
+        Returns a dictionary of n random keys (spread over the whole uint64 range, with runs of consecutive
+        keys above 2^53 that are not distinct as float64) and float32-representable values
+    '''
+    rng = np.random.default_rng(seed)
+    keys = rng.integers(1, 2**63, size=n//2, dtype=np.uint64).tolist()
+    base = 2**64 - 4*n
+    keys += [base + i for i in range(n - n//2)]
+    values = rng.normal(0, 50, size=n).astype(np.float32).tolist()
+    return dict(zip(keys, values))
+
+
+def missing_keys(Q_table, n, seed = 1):
+    '''
+        Returns random keys that are not in the Q-table, including the largest uint64 and the neighbours of the stored keys
+    '''
+    rng = np.random.default_rng(seed)
+    keys = rng.integers(1, 2**63, size=n, dtype=np.uint64).tolist() + [2**64 - 1, max(Q_table) + 1, min(Q_table) - 1]
+    return [key for key in keys if key not in Q_table]
+
+
+def test_HashQTable_matches_dict():
+    Q_table = random_Q_table(5000)
+    table = HashQTable(capacity=16)
+    for key, value in Q_table.items():
+        table[key] = value
+    assert len(table) == len(Q_table)
+    assert dict(table.items()) == Q_table
+
+    for key, value in Q_table.items():
+        assert key in table
+        assert table[key] == value
+    missing = missing_keys(Q_table, 1000)
+    for key in missing:
+        assert key not in table
+        assert table.get(key) is None
+
+    keys = list(Q_table) + missing
+    values = table.get_many(np.array(keys, dtype=np.uint64), default=-1)
+    assert values.tolist() == [Q_table.get(key, -1) for key in keys]
+    assert table.get_many(np.array(keys[:5], dtype=np.uint64), default=-1).tolist() == [Q_table.get(key, -1) for key in keys[:5]]
+
+    #set_many updates the stored keys and inserts the new ones
+    new_values = np.arange(len(keys), dtype=np.float32)
+    table.set_many(np.array(keys, dtype=np.uint64), new_values)
+    assert len(table) == len(keys)
+    assert dict(table.items()) == dict(zip(keys, new_values.tolist()))
+    assert dict(HashQTable.from_dict(Q_table).items()) == Q_table
+
+
+def test_board_size_of_HashQTable():
+    check_board_size(7, 8)
+    with pytest.raises(ValueError):
+        check_board_size(8, 8)
+
+    #The keys of a 7x8 board have 64 bits, the ones of an 8x8 board do not fit
+    for height, table_class, fits in ((7, HashQTable, True), (8, HashQTable, False), (8, dict, True)):
+        game = gameEnv(height=height, width=8, win_streak=4)
+        for i in range(height):
+            game.make_move(8, 1 + i%2)
+        agent = Q_learn_agent(player=1, Q_table_class=table_class)
+        if fits:
+            assert agent.get_best_action(game, 1)[0] == 1
+            assert agent.get_Qvalue(game, 1, 1) == 0
+        else:
+            with pytest.raises(ValueError):
+                agent.get_best_action(game, 1)
+            with pytest.raises(ValueError):
+                agent.get_Qvalue(game, 1, 1)
+
+
+def test_MmapQTable_matches_dict(tmp_path):
+    Q_table = random_Q_table(5000)
+    filename = str(tmp_path / "Q_table.bin")
+    write_Q_table_file(filename, Q_table)
+    table = MmapQTable(filename)
+
+    assert len(table) == len(Q_table)
+    assert dict(table.items()) == Q_table
+    for key, value in Q_table.items():
+        assert key in table
+        assert table[key] == value
+    missing = missing_keys(Q_table, 1000)
+    for key in missing:
+        assert key not in table
+        assert table.get(key) is None
+
+    keys = list(Q_table) + missing
+    values = table.get_many(np.array(keys, dtype=np.uint64), default=-1)
+    assert values.tolist() == [Q_table.get(key, -1) for key in keys]
+
+    #The values set after opening the file are kept in the overlay
+    stored = next(iter(Q_table))
+    table[stored] = 1.5
+    table[missing[0]] = 2.5
+    assert len(table) == len(Q_table) + 1
+    assert table[stored] == 1.5 and table[missing[0]] == 2.5
+    assert table.get_many(np.array([stored, missing[0]], dtype=np.uint64)).tolist() == [1.5, 2.5]
+    assert dict(table.items()) == {**Q_table, stored: 1.5, missing[0]: 2.5}
+
+
+def test_save_over_mapped_Q_table(tmp_path):
+    Q_table = random_Q_table(5000)
+    filename = str(tmp_path / "agent.bin")
+    agent = Q_learn_agent(player=2)
+    agent.Q_table = dict(Q_table)
+    agent.save_Q_table(filename)
+    agent.load_Q_table(filename)
+    assert isinstance(agent.Q_table, MmapQTable)
+    assert dict(agent.Q_table.items()) == Q_table
+    reader = MmapQTable(filename)
+
+    #The agent saves its own mapped table with new and updated Q-values to the same file
+    new_key = missing_keys(Q_table, 1)[0]
+    stored = next(iter(Q_table))
+    agent.Q_table[new_key] = 3.5
+    agent.Q_table[stored] = -3.5
+    agent.save_Q_table(filename)
+    expected = {**Q_table, new_key: 3.5, stored: -3.5}
+
+    #The table was reopened on the new file
+    assert agent.Q_table.overlay == {}
+    assert len(agent.Q_table) == len(expected)
+    assert all(agent.Q_table.get(key) == value for key, value in expected.items())
+    assert dict(MmapQTable(filename).items()) == expected
+
+    #A table that mapped the old file keeps reading it
+    assert dict(reader.items()) == Q_table
+    assert [f.name for f in tmp_path.iterdir()] == ["agent.bin"]
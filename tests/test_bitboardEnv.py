@@ -0,0 +1,33 @@
+'''
+    Tests of bitboardEnv against the reference gameEnv
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv
+from bitboardEnv import bitboardEnv
+
+@pytest.mark.parametrize("height,width,win_streak", [(6, 7, 4), (4, 5, 4), (5, 5, 3)])
+def test_bitboard_matches_gameEnv(height, width, win_streak):
+    rng = np.random.default_rng(0)
+    game = gameEnv(height=height, width=width, win_streak=win_streak)
+    bitboard = bitboardEnv(height=height, width=width, win_streak=win_streak)
+
+    for g in range(100):
+        game.reset_game()
+        bitboard.reset_game()
+        player = 1
+        status = 0
+        while status == 0:
+            action = int(rng.choice(game.get_action_space()))
+            assert bitboard.check_valid_move(action)
+            status = game.make_move(action, player)
+            assert bitboard.make_move(action, player) == status
+            assert (bitboard.grid == game.grid).all()
+            assert bitboard.generate_string() == game.generate_string()
+            assert tuple(bitboard.get_action_space()) == tuple(game.get_action_space())
+            player = 3 - player
+
+        #Full columns are not valid moves
+        for action in range(1, width+1):
+            assert bitboard.check_valid_move(action) == game.check_valid_move(action)
@@ -0,0 +1,130 @@
+'''
+    Tests of the incremental state of gameEnv and bitboardEnv against the values recomputed from the grid
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv, grid_key, mirror_key, zobrist_table
+from bitboardEnv import bitboardEnv
+
+def random_games(env, games, seed = 0):
+    '''
+        Plays random games on an environment and yields after every move
+    '''
+    rng = np.random.default_rng(seed)
+    for g in range(games):
+        env.reset_game()
+        player = 1
+        status = 0
+        while status == 0:
+            status = env.make_move(int(rng.choice(env.get_action_space())), player)
+            player = 3 - player
+            yield status
+
+
+@pytest.mark.parametrize("env_class", [gameEnv, bitboardEnv])
+def test_heights_and_action_space(env_class):
+    env = env_class(height=5, width=6, win_streak=4)
+    for status in random_games(env, 100):
+        grid = env.grid
+        assert list(env.heights) == [int(np.count_nonzero(grid[:,c])) for c in range(env.w)]
+        assert tuple(env.get_action_space()) == tuple(a for a in range(1, env.w+1) if grid[env.h-1][a-1] == 0)
+        assert env.moves == int(np.count_nonzero(grid))
+
+
+def board_state(env):
+    '''
+        Returns the state of an environment that make_move and undo_move have to keep consistent
+    '''
+    return (env.grid.tolist(), list(env.heights), env.moves, tuple(env.get_action_space()), list(env.move_stack),
+            env.key, env.hash, env.mirror_key, env.mirror_hash)
+
+
+@pytest.mark.parametrize("env_class", [gameEnv, bitboardEnv])
+def test_undo_restores_board(env_class):
+    env = env_class(height=6, width=7, win_streak=4)
+    empty = board_state(env)
+    for status in random_games(env, 50):
+        before = board_state(env)
+        for action in env.get_action_space():
+            with env.try_move(action, 1 + env.moves%2):
+                pass
+            assert board_state(env) == before
+        if status != 0:
+            env.undo_until(0)
+            assert board_state(env) == empty
+
+
+def grid_hash(grid, height, width):
+    '''
+        Recomputes the Zobrist hash of a grid
+    '''
+    zobrist = zobrist_table(height, width)
+    value = 0
+    for r in range(height):
+        for c in range(width):
+            if grid[r][c] != 0:
+                value ^= zobrist[grid[r][c]-1][c*(height+1) + r]
+    return value
+
+
+@pytest.mark.parametrize("env_class", [gameEnv, bitboardEnv])
+def test_keys_and_hashes(env_class):
+    env = env_class(height=6, width=7, win_streak=4)
+    other = env_class(height=6, width=7, win_streak=4)
+    for status in random_games(env, 50):
+        assert env.key == grid_key(env.grid)
+        assert env.hash == grid_hash(env.grid, env.h, env.w)
+        for action in env.get_action_space():
+            for player in (1, 2):
+                key = env.key_after(action, player)
+                with env.try_move(action, player):
+                    assert key == env.key
+
+        #load_key rebuilds the same board
+        other.load_key(env.key)
+        assert (other.grid == env.grid).all()
+        assert other.hash == env.hash
+
+
+@pytest.mark.parametrize("env_class", [gameEnv, bitboardEnv])
+def test_mirror_keys(env_class):
+    env = env_class(height=6, width=7, win_streak=4)
+    for status in random_games(env, 50):
+        mirrored = env.grid[:, ::-1]
+        assert env.mirror_key == grid_key(mirrored) == mirror_key(env.key, env.h, env.w)
+        assert env.mirror_hash == grid_hash(mirrored, env.h, env.w)
+        assert env.canonical_key() == min(env.key, env.mirror_key)
+        assert env.is_symmetric() == (env.grid == mirrored).all()
+        for action in env.get_action_space():
+            assert env.canonical_action(action) == (env.w+1-action if env.is_mirrored() else action)
+
+
+@pytest.mark.parametrize("env_class", [gameEnv, bitboardEnv])
+def test_winning_moves(env_class):
+    env = env_class(height=6, width=7, win_streak=4)
+    for status in random_games(env, 50, seed=1):
+        if status != 0:
+            continue
+        for p in (1, 2):
+            wins = []
+            for action in env.get_action_space():
+                with env.try_move(action, p) as result:
+                    if result == 1:
+                        wins.append(action)
+            assert env.winning_moves(p) == wins
+
+
+@pytest.mark.parametrize("env_class", [gameEnv, bitboardEnv])
+def test_afterstate_keys(env_class):
+    env = env_class(height=6, width=7, win_streak=4)
+    for status in random_games(env, 30, seed=2):
+        if status != 0:
+            continue
+        for p in (1, 2):
+            for canonical in (False, True):
+                actions, keys = env.afterstate_keys(p, canonical)
+                assert actions == env.get_action_space()
+                for action, key in zip(actions, keys):
+                    with env.try_move(action, p):
+                        assert key == (env.canonical_key() if canonical else env.key)
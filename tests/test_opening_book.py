@@ -0,0 +1,53 @@
+'''
+    Tests of the opening book lookups
+'''
+
+import numpy as np
+from gameEnv import gameEnv
+from opening_book import OpeningBook, build_opening_book, write_opening_book
+
+def test_opening_book_lookup(tmp_path):
+    filename = str(tmp_path / "book.bin")
+    np.random.seed(0)
+    n = build_opening_book(filename, 4, 5, 4, plies=2, playouts=50)
+    book = OpeningBook(filename)
+    assert book.n == n == 4             #Empty board, and columns 1-3 (4 and 5 are mirrors of 2 and 1)
+
+    game = gameEnv(height=4, width=5, win_streak=4)
+    stats = book.lookup(game)
+    assert sorted(stats) == [1, 2, 3, 4, 5]
+    assert sum(visits for visits, reward in stats.values()) == 50
+
+    #Mirrored positions share their entry, with the actions mirrored
+    for action in (1, 2):
+        game.reset_game()
+        game.make_move(action, 1)
+        stats = book.lookup(game)
+        game.reset_game()
+        game.make_move(6 - action, 1)
+        mirrored = book.lookup(game)
+        assert stats is not None
+        assert all(mirrored[6 - a] == stats[a] for a in stats)
+
+    #Positions that are not in the book, or boards of another size
+    game.reset_game()
+    game.make_move(3, 1)
+    game.make_move(3, 2)
+    assert book.lookup(game) is None
+    assert book.lookup(gameEnv(height=6, width=7, win_streak=4)) is None
+
+
+def test_opening_book_large_keys(tmp_path):
+    #Consecutive keys above 2^53 are equal as float64, they have to be told apart
+    filename = str(tmp_path / "book.bin")
+    key = 2**64 - 2**12
+    positions = {key + i: (np.full(5, i+1), np.zeros(5)) for i in range(4)}
+    write_opening_book(filename, 4, 5, 4, positions)
+    book = OpeningBook(filename)
+
+    game = gameEnv(height=4, width=5, win_streak=4)
+    for i in range(4):
+        game.canonical_hash = lambda: key + i
+        assert book.lookup(game)[1] == (i+1, 0.0)
+    game.canonical_hash = lambda: key + 4
+    assert book.lookup(game) is None
@@ -0,0 +1,56 @@
+'''
+    Tests of VecGameEnv against the reference gameEnv
+'''
+
+import numpy as np
+import pytest
+from gameEnv import gameEnv
+from vecGameEnv import VecGameEnv
+
+@pytest.mark.parametrize("height,width,win_streak", [(6, 7, 4), (4, 5, 4), (5, 5, 3)])
+def test_VecGameEnv_matches_gameEnv(height, width, win_streak):
+    rng = np.random.default_rng(2)
+    n = 32
+    vec_env = VecGameEnv(n, height, width, win_streak, auto_reset=False)
+    games = [gameEnv(height=height, width=width, win_streak=win_streak) for i in range(n)]
+    players = [1]*n
+    active = list(range(n))
+
+    while active:
+        #The boards are stepped with a list of ids
+        actions = vec_env.sample_random_actions(np.array(active), rng)
+        status = vec_env.step(actions, active)
+        for i, action, s in zip(active, actions, status):
+            assert games[i].make_move(int(action), players[i]) == s
+            players[i] = 3 - players[i]
+            assert (vec_env.grid[i] == games[i].grid).all()
+            assert vec_env.heights[i].tolist() == list(games[i].heights)
+        active = [i for i, s in zip(active, status) if s == 0]
+
+
+def test_VecGameEnv_auto_reset():
+    vec_env = VecGameEnv(2, 4, 5, 4)
+    for i in range(3):
+        status = vec_env.step(np.array([1, 2]))
+        assert status.tolist() == [0, 0]
+        vec_env.step(np.array([5, 5]))
+    #The fourth bead of player 1 in column 1 wins, the board is reset
+    status = vec_env.step(np.array([1, 3]), range(2))
+    assert status.tolist() == [1, 0]
+    assert vec_env.moves.tolist() == [0, 7]
+
+
+def test_VecGameEnv_random_rollout():
+    rng = np.random.default_rng(3)
+    vec_env = VecGameEnv(64, 6, 7, 4, auto_reset=False)
+    game = gameEnv(height=6, width=7, win_streak=4)
+    game.make_move(4, 1)
+    for i in range(64):
+        vec_env.set_board(i, game, 2)
+
+    status, last_player = vec_env.random_rollout(range(64), rng)
+    assert set(status.tolist()) <= {1, 2}
+    assert set(last_player.tolist()) <= {1, 2}
+    #Stalemates only happen on full boards
+    assert (vec_env.moves[status == 2] == 6*7).all()
+    assert (vec_env.moves >= 7).all()
@@ -0,0 +1,214 @@
+import numpy as np
+import sys
+
+class VecGameEnv:
+    '''
+        Implements a vectorized environment that plays N Connect 4 games simultaneously.
+        The boards are stored in a single (N x height x width) NumPy array and every call to step
+        performs one move on each of the selected boards with NumPy operations.
+    '''
+    def __init__(self, num_envs, height, width, win_streak = 4, auto_reset = True):
+        '''
+            Initializes the VecGameEnv object
+            Arguments:
+                num_envs: Number of boards played simultaneously
+                height: Number of rows in the Connect 4 board
+                width: Number of columns in the Connect 4 board
+                win_streak: Continuous number of beads that is considered a victory in the game
+                auto_reset: if True, boards that reach a terminal state are reset at the end of the step
+        '''
+        self.n = num_envs
+        self.h = height
+        self.w = width
+        self.win_streak = win_streak
+        self.auto_reset = auto_reset
+
+        #The boards are padded with (win_streak-1) empty cells on every side, grid is a view of the boards without padding
+        pad = win_streak-1
+        self.padded_grid = np.zeros((num_envs, height + 2*pad, width + 2*pad), dtype=np.int8)
+        self.grid = self.padded_grid[:, pad:pad+height, pad:pad+width]
+        self.heights = np.zeros((num_envs, width), dtype=np.int64)      #Number of beads in each column of each board
+        self.moves = np.zeros(num_envs, dtype=np.int64)                 #Number of beads on each board
+        self.player = np.ones(num_envs, dtype=np.int8)                  #Player id of the player to move on each board
+
+        #Offsets (in the padded grid) of the cells that form a line with a bead, along the vertical, horizontal 
+        #and the two diagonal directions. For every direction, the first (win_streak-1) offsets go forward 
+        #from the bead and the last (win_streak-1) go backward
+        directions = np.array([(1, 0), (0, 1), (1, 1), (1, -1)])
+        steps = np.concatenate((np.arange(1, win_streak), -np.arange(1, win_streak)))
+        self.line_rows = pad + directions[:,0,None]*steps[None,:]
+        self.line_cols = pad + directions[:,1,None]*steps[None,:]
+        self.all_envs = np.arange(num_envs)
+
+    def reset(self, env_ids = None):
+        '''
+            Resets the selected boards
+            Arguments:
+                env_ids: indices of the boards to reset, all the boards are reset if None
+        '''
+        if env_ids is None:
+            env_ids = self.all_envs
+        self.grid[env_ids] = 0
+        self.heights[env_ids] = 0
+        self.moves[env_ids] = 0
+        self.player[env_ids] = 1
+
+    def set_board(self, env_id, game_env, player):
+        '''
+            Copies the board of a gameEnv (or bitboardEnv) into one of the boards
+            Arguments:
+                env_id: index of the board to overwrite
+                game_env: game environment that is copied
+                player: player id of the player to move on the board
+        '''
+        self.grid[env_id] = game_env.grid
+        self.heights[env_id] = game_env.heights
+        self.moves[env_id] = game_env.moves
+        self.player[env_id] = player
+
+    def get_action_masks(self, env_ids = None):
+        '''
+            Returns the valid actions of the selected boards
+            Arguments:
+                env_ids: indices of the boards, all the boards if None
+            Returns:
+                masks: (len(env_ids) x width) boolean array, masks[i][a-1] is True if action a is valid
+        '''
+        if env_ids is None:
+            env_ids = self.all_envs
+        return self.heights[env_ids] < self.h
+
+    def sample_random_actions(self, env_ids = None, rng = np.random):
+        '''
+            Samples a uniformly random valid action on each of the selected boards
+            Arguments:
+                env_ids: indices of the boards, all the boards if None
+                rng: random number generator (np.random or a np.random.Generator)
+            Returns:
+                actions: array containing a valid action for each board
+        '''
+        masks = self.get_action_masks(env_ids)
+        #The valid action with the largest random key is a uniform sample of the valid actions
+        keys = rng.random(masks.shape) + masks
+        return np.argmax(keys, axis=1) + 1
+
+    def step(self, actions, env_ids = None):
+        '''
+            Performs one move on each of the selected boards, by the player to move on the board
+            Arguments:
+                actions: array of the actions to be performed, aligned with env_ids
+                env_ids: indices of the boards on which the actions are performed, all the boards if None
+            Returns:
+                status: array containing the status of each board after the move:
+                            0: Transient State
+                            1: Victory
+                            2: Stalemate
+        '''
+
+        TRANSIENT_STATE_STATUS = 0
+        VICTORY_STATUS = 1
+        STALEMATE_STATUS = 2
+
+        if env_ids is None:
+            env_ids = self.all_envs
+        else:
+            env_ids = np.asarray(env_ids)           #Lists and ranges are indexed with masks below
+        cols = np.asarray(actions) - 1
+
+        #Check if the actions are valid
+        valid = (cols >= 0) & (cols < self.w)
+        valid[valid] &= self.heights[env_ids[valid], cols[valid]] < self.h
+        if not valid.all():
+            invalid = np.flatnonzero(~valid)[0]
+            sys.exit(f"Move {cols[invalid]+1} is not a valid move on board {env_ids[invalid]}")
+
+        rows = self.heights[env_ids, cols]
+        players = self.player[env_ids]
+        self.grid[env_ids, rows, cols] = players
+        self.heights[env_ids, cols] += 1
+        self.moves[env_ids] += 1
+
+        victory = self.victory_moves(env_ids, rows, cols, players)
+
+        status = np.full(len(env_ids), TRANSIENT_STATE_STATUS, dtype=np.int8)
+        status[self.moves[env_ids] == self.h*self.w] = STALEMATE_STATUS
+        status[victory] = VICTORY_STATUS
+
+        self.player[env_ids] = 3 - players
+
+        if self.auto_reset:
+            self.reset(env_ids[status != TRANSIENT_STATE_STATUS])
+
+        return status
+
+    def random_rollout(self, env_ids = None, rng = np.random):
+        '''
+            Plays uniformly random moves on the selected boards until all of them reach a terminal state
+            Arguments:
+                env_ids: indices of the boards, all the boards if None
+                rng: random number generator (np.random or a np.random.Generator)
+            Returns:
+                status: terminal status of each board (1: Victory, 2: Stalemate)
+                last_player: player id of the player that performed the last move on each board
+        '''
+        if env_ids is None:
+            env_ids = self.all_envs
+        else:
+            env_ids = np.asarray(env_ids)
+        status = np.zeros(len(env_ids), dtype=np.int8)
+        last_player = np.zeros(len(env_ids), dtype=np.int8)
+
+        active = np.arange(len(env_ids))
+        while len(active):
+            ids = env_ids[active]
+            last_player[active] = self.player[ids]
+            active_status = self.step(self.sample_random_actions(ids, rng), ids)
+            status[active] = active_status
+            active = active[active_status == 0]
+
+        return status, last_player
+
+    def victory_moves(self, env_ids, rows, cols, players):
+        '''
+            Checks if the last beads dropped on the selected boards resulted in victories
+            Arguments:
+                env_ids: indices of the boards
+                rows: rows of the last beads dropped
+                cols: columns of the last beads dropped
+                players: player ids of the players that dropped the beads
+            Returns:
+                victory: boolean array, True for the boards in a terminal victory state
+        '''
+        k = self.win_streak
+
+        #Cells on both sides of the last bead along the 4 directions, shape (boards x 4 x 2*(win_streak-1)).
+        #The padding of the board ensures that the indices never go out of bounds
+        cells = self.padded_grid[env_ids[:,None,None], rows[:,None,None] + self.line_rows, cols[:,None,None] + self.line_cols]
+        same = cells == players[:,None,None]
+
+        #Number of consecutive beads of the player next to the last bead, on each side
+        forward = np.cumprod(same[:,:,:k-1], axis=2).sum(axis=2)
+        backward = np.cumprod(same[:,:,k-1:], axis=2).sum(axis=2)
+
+        return ((1 + forward + backward) >= k).any(axis=1)
+
+if __name__=='__main__':
+
+    #Random self-play on many boards at once
+    total_envs = 4096
+    steps = 200
+    vec_game = VecGameEnv(total_envs, height=6, width=7, win_streak=4)
+
+    games = 0
+    results = np.zeros(3, dtype=np.int64)
+    for s in range(steps):
+        movers = vec_game.player.copy()
+        status = vec_game.step(vec_game.sample_random_actions())
+        finished = status != 0
+        games += finished.sum()
+        results[0] += (finished & (status == 1) & (movers == 1)).sum()
+        results[1] += (finished & (status == 1) & (movers == 2)).sum()
+        results[2] += (status == 2).sum()
+
+    print(f"Games played: {games}")
+    print(f"Player 1 wins: {results[0]}\t Player 2 wins: {results[1]}\t Stalemates: {results[2]}")